@@ -2,6 +2,9 @@ import backtrader as bt
 import talib
 import numpy as np
 
+# 与 bt.indicators 同名同结果，runonce 模式下用 NumPy 一次算出
+from backtrader_binance_futures import indicators as btind
+
 class BollingerBandRSI(bt.Strategy):
     params = (
         ('len_rsi', 14),
@@ -18,11 +21,11 @@ class BollingerBandRSI(bt.Strategy):
 
     def __init__(self):
         # 计算 RSI
-        self.rsi = bt.indicators.RSI(self.data.close, period=self.params.len_rsi)
+        self.rsi = btind.RSI(self.data.close, period=self.params.len_rsi)
 
         # 计算 Bollinger Bands (如果想用 Backtrader 自带的 BollingerBands 可以直接用 bt.indicators.BollingerBands)
-        self.bb_basis = bt.indicators.SMA(self.data.close, period=self.params.bb_len)
-        self.bb_std = bt.indicators.StandardDeviation(self.data.close, period=self.params.bb_len)
+        self.bb_basis = btind.SMA(self.data.close, period=self.params.bb_len)
+        self.bb_std = btind.StandardDeviation(self.data.close, period=self.params.bb_len)
         self.bb_upper = self.bb_basis + self.params.bb_mult * self.bb_std
         self.bb_lower = self.bb_basis - self.params.bb_mult * self.bb_std
         
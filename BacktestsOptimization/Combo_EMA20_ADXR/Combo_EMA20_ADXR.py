@@ -1,6 +1,59 @@
 import datetime
 import backtrader as bt
+import numpy as np
 import talib
+from talib import abstract
+
+from backtrader_binance_futures.indicator_cache import cached_call, ctalib
+from backtrader_binance_futures.indicators import WarmupPeriod
+from backtrader_binance_futures.numpy_feed import feed_values
+
+
+def _hold_signal(raw):
+    """把 0（保持上一 bar 信号）替换为之前最近的非 0 信号，开头没有信号时为 0"""
+    index = np.where(raw != 0, np.arange(len(raw)), -1)
+    np.maximum.accumulate(index, out=index)
+    return np.where(index >= 0, raw[np.maximum(index, 0)], 0)
+
+
+def compute_targets(high, low, close, ema, adx, start, adxr_offset, signal1, signal2, reverse):
+    """
+    按 next() 的逻辑一次性计算每根 bar 的目标仓位（1.0 / -1.0 / 0.0），start 之前的 bar 不运行 next()，为 NaN
+
+    EMA20 和 ADXR 的"保持上一 bar 信号"用前向填充实现
+    """
+    n = len(close)
+    targets = np.full(n, np.nan)
+    start = max(start, 1)  # 至少需要前一根 bar
+    if start >= n:
+        return targets
+    i = np.arange(start, n)
+
+    # ----- EMA20 信号 -----
+    nHH = np.maximum(high[i], high[i - 1])
+    nLL = np.minimum(low[i], low[i - 1])
+    nXS = np.where((nLL > ema[i]) | (nHH < ema[i]), nLL, nHH)
+    prev_close = close[i - 1]
+    ema20_signal = _hold_signal(np.where(nXS > prev_close, -1, np.where(nXS < prev_close, 1, 0)))
+
+    # ----- ADXR 信号 -----
+    # adxr_offset 根前的 ADX 还不存在时保持信号（下标为负的取值在 clip 后被丢弃）
+    xADXR = (adx[i] + adx[np.maximum(i - adxr_offset, 0)]) / 2.0
+    raw = np.where(xADXR < signal1, 1, np.where(xADXR > signal2, -1, 0))
+    raw[i < adxr_offset] = 0
+    adxr_signal = _hold_signal(raw)
+
+    pos = np.where((ema20_signal == 1) & (adxr_signal == 1), 1.0,
+                   np.where((ema20_signal == -1) & (adxr_signal == -1), -1.0, 0.0))
+    targets[start:] = -pos if reverse else pos
+    return targets + 0.0  # 去掉 -0.0
+
+
+def _talib_lookback(name, **kwargs):
+    function = abstract.Function(name)
+    function.set_function_args(**kwargs)
+    return function.lookback
+
 
 class Combo_EMA20_ADXR(bt.Strategy):
     params = (
@@ -14,19 +67,61 @@ class Combo_EMA20_ADXR(bt.Strategy):
         ('signal2', 45.0),
         # 是否反转信号
         ('reverse', False),
+        # 预加载+runonce 时用 NumPy 一次性计算指标和目标仓位
+        ('precompute', True),
     )
 
     def __init__(self):
+        # 上一次下单的目标仓位，目标不变时不再重复下单
+        self.last_target = None
+
+        self.precomputed = self.p.precompute and self.env._dopreload and self.env._dorunonce
+        if self.precomputed:
+            self._precompute()
+            return
+
         # 使用 TA-Lib 计算 EMA 作为中间指标
-        self.ema = bt.talib.EMA(self.data.close, timeperiod=self.params.ema_length)
+        self.ema = ctalib.EMA(self.data.close, timeperiod=self.params.ema_length)
         # 使用 TA-Lib 计算 ADX，用于后续构造 ADXR 信号
-        self.adx = bt.talib.ADX(self.data.high, self.data.low, self.data.close, timeperiod=self.params.adx_length)
+        self.adx = ctalib.ADX(self.data.high, self.data.low, self.data.close, timeperiod=self.params.adx_length)
         
         # 用于记录 EMA20 与 ADXR 的历史信号状态
         self.ema20_signal = 0
         self.adxr_signal = 0
 
+    def _precompute(self):
+        """对预加载的完整数据一次性计算 EMA/ADX（与 bt.talib 的 once() 相同的调用，结果逐位一致）和目标仓位"""
+        # 不复制: NumpyData 预加载时是共享数组的只读切片，各试验的输入指纹记忆可以命中
+        close = feed_values(self.data, 'close')
+        high = feed_values(self.data, 'high')
+        low = feed_values(self.data, 'low')
+
+        ema = cached_call(talib.EMA, close, timeperiod=self.p.ema_length)
+        adx = cached_call(talib.ADX, high, low, close, timeperiod=self.p.adx_length)
+
+        # 策略的最小周期与使用 bt.talib 指标时相同
+        minperiod = max(_talib_lookback('EMA', timeperiod=self.p.ema_length),
+                        _talib_lookback('ADX', timeperiod=self.p.adx_length)) + 1
+        self._targets = compute_targets(high, low, close, ema, adx, minperiod - 1, self.p.adxr_offset,
+                                        self.p.signal1, self.p.signal2, self.p.reverse).tolist()
+        self.warmup = WarmupPeriod(self.data, period=minperiod)
+
+    def _order_target(self, target):
+        """目标仓位变化时才下单"""
+        if target != self.last_target:
+            self.order_target_percent(target=target)
+            self.last_target = target
+
+    def notify_order(self, order):
+        # 被拒绝、保证金不足或取消的订单没有成交，清除记录，下一根K线按目标重新下单（与每根K线都下单时一致）
+        if order.status in (order.Canceled, order.Margin, order.Rejected):
+            self.last_target = None
+
     def next(self):
+        if self.precomputed:
+            self._order_target(self._targets[len(self.data) - 1])
+            return
+
         # 确保至少存在2根 bar，便于取前一 bar 数据
         if len(self.data) < 2:
             return
@@ -63,8 +158,9 @@ class Combo_EMA20_ADXR(bt.Strategy):
         self.ema20_signal = ema20_signal_new
 
         # ----- 计算 ADXR 信号 -----
-        # 当数据长度不足 adxr_offset 时，保持上一 bar 的 ADXR 信号
-        if len(self.data) < self.params.adxr_offset:
+        # 还没有 adxr_offset 根前的 bar 时，保持上一 bar 的 ADXR 信号
+        # （len == adxr_offset 时 self.adx[-adxr_offset] 会越过第一根，runonce 下取到数组末尾，逐根模式下取到当前值）
+        if len(self.data) <= self.params.adxr_offset:
             adxr_signal_new = self.adxr_signal
         else:
             # 当前 ADX 值与 adxr_offset 根前的 ADX 值均值作为 ADXR
@@ -109,8 +205,8 @@ class Combo_EMA20_ADXR(bt.Strategy):
         # 空头信号：目标仓位 -100%（-1.0）
         # 平仓信号：目标仓位 0%
         if possig == 1:
-            self.order_target_percent(target=1.0)
+            self._order_target(1.0)
         elif possig == -1:
-            self.order_target_percent(target=-1.0)
+            self._order_target(-1.0)
         else:
-            self.order_target_percent(target=0.0)
\ No newline at end of file
+            self._order_target(0.0)
\ No newline at end of file
@@ -1,7 +1,8 @@
 import backtrader as bt
 import backtrader.indicators as btind
 import math
-from collections import deque
+
+from backtrader_binance_futures.indicators import MonotonicWindow
 
 class ConnorsReversal(bt.Strategy):
     params = (
@@ -23,10 +24,9 @@ class ConnorsReversal(bt.Strategy):
         self.open_trades = 0
         self.unit_ratio = 1 / self.p.dca_parts
         
-        # 数据窗口
-        self.max_window = min(self.p.lowest_point_bars * self.p.dca_parts, self.p.max_lookback)
-        self.closes = deque(maxlen=self.max_window)
-        self.min_price_window = deque(maxlen=self.p.lowest_point_bars)
+        # 最近 lowest_point_bars 根有效K线（价格非 0、非 NaN）收盘价的滚动最低值（单调队列，每根K线均摊 O(1)）
+        # 只在 next() 中推入有效价格: 无效K线不进入窗口也不计数，窗口从策略开始运行的K线算起
+        self.lowest = MonotonicWindow(self.p.lowest_point_bars)
         
         # 状态标志 - 简化初始化逻辑
         self.debug_mode = False
@@ -42,20 +42,14 @@ class ConnorsReversal(bt.Strategy):
         """检查当前价格是否为局部最低点"""
         try:
             # 只有窗口填满时才进行检测
-            if len(self.min_price_window) < self.p.lowest_point_bars:
+            if self.lowest.count < self.p.lowest_point_bars:
                 return False
 
             current_price = self.data.close[0]
             if math.isnan(current_price):
                 return False
 
-            # 直接遍历队列副本，过滤 NaN
-            valid_prices = [p for p in list(self.min_price_window) if not math.isnan(p)]
-            # 确保当前价格也参与检测（避免因NaN而遗漏）
-            if not valid_prices or current_price != valid_prices[-1]:
-                valid_prices.append(current_price)
-            min_price = min(valid_prices)
-            return current_price <= min_price
+            return current_price <= self.lowest.value
 
         except Exception as e:
             self.log(f"最低点检查错误: {str(e)}", debug=True)
@@ -69,8 +63,7 @@ class ConnorsReversal(bt.Strategy):
             self.log("警告: 当前价格无效（为0或NaN），跳过此bar", debug=True)
             return
 
-        self.closes.append(current_price)
-        self.min_price_window.append(current_price)
+        self.lowest.push(current_price)
 
         try:
             is_lowest = self.is_local_minimum()
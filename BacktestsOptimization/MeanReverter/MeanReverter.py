@@ -1,5 +1,46 @@
 import backtrader as bt
 import math
+import numpy as np
+import talib
+from talib import abstract
+
+from backtrader_binance_futures.batch_eval import BatchPortfolio
+from backtrader_binance_futures.indicator_cache import cached_call, ctalib
+from backtrader_binance_futures.indicators import WarmupPeriod
+from backtrader_binance_futures.numpy_feed import feed_values
+
+
+def _talib_lookback(name, **kwargs):
+    function = abstract.Function(name)
+    function.set_function_args(**kwargs)
+    return function.lookback
+
+
+def compute_indicators(close, high, low, rsiFrequency, frequency, avgDownATRSum):
+    """
+    计算 RSI、RSI 的 SMA 和 ATR 的滚动求和，返回 (rsi, rsi_slow, atr_sum, minperiod)
+
+    - ATR 求和按与 sum(self.atr.get(size=n)) 相同的顺序从旧到新累加
+    - minperiod 与使用 bt.talib 指标时策略的最小周期相同: 指标取 max(输入的最小周期, lookback + 1)，策略取各指标的最大值
+    """
+    # 同一数据上的各个试验共用相同参数的指标数组
+    rsi = cached_call(talib.RSI, close, timeperiod=rsiFrequency)
+    rsi_slow = cached_call(talib.SMA, rsi, timeperiod=frequency)
+    atr = cached_call(talib.ATR, high, low, close, timeperiod=20)
+
+    n = avgDownATRSum
+    atr_sum = np.full(len(atr), np.nan)
+    if len(atr) >= n:
+        acc = np.zeros(len(atr) - n + 1)
+        for k in range(n):
+            acc = acc + atr[k:len(atr) - n + 1 + k]
+        atr_sum[n - 1:] = acc
+
+    rsi_minperiod = _talib_lookback('RSI', timeperiod=rsiFrequency) + 1
+    sma_minperiod = max(rsi_minperiod, _talib_lookback('SMA', timeperiod=frequency) + 1)
+    atr_minperiod = _talib_lookback('ATR', timeperiod=20) + 1
+    return rsi, rsi_slow, atr_sum, max(rsi_minperiod, sma_minperiod, atr_minperiod)
+
 
 class MeanReverter(bt.Strategy):
     params = (
@@ -10,37 +51,77 @@ class MeanReverter(bt.Strategy):
         ('useAbsoluteRSIBarrier', True),
         ('barrierLevel', 50),       # RSI阈值
         ('pyramiding', 6),          # 最大加仓次数
+        ('precompute', True),       # 预加载+runonce 时用 NumPy 一次性计算指标和信号
     )
 
     def __init__(self):
         self.opentrades = 0
         self.unit_ratio = 1.0 / self.p.pyramiding
 
-        self.rsi = bt.talib.RSI(self.data.close, timeperiod=self.p.rsiFrequency)
-        self.rsi_slow = bt.talib.SMA(self.rsi, timeperiod=self.p.frequency)
-        self.atr = bt.talib.ATR(self.data.high, self.data.low, self.data.close, timeperiod=20)
+        # 预计算需要完整的数据数组，并且只在 runonce 模式下与 bt.talib 指标的结果逐位一致
+        # （非 runonce 模式下 bt.talib 按窗口逐根计算，SMA 的累加顺序不同）
+        self.precomputed = self.p.precompute and self.env._dopreload and self.env._dorunonce
+        if self.precomputed:
+            self._precompute()
+        else:
+            # ctalib 与 bt.talib 相同，只是 runonce 模式下跨试验缓存计算结果
+            self.rsi = ctalib.RSI(self.data.close, timeperiod=self.p.rsiFrequency)
+            self.rsi_slow = ctalib.SMA(self.rsi, timeperiod=self.p.frequency)
+            self.atr = ctalib.ATR(self.data.high, self.data.low, self.data.close, timeperiod=20)
+
+    def _precompute(self):
+        """
+        对预加载的完整数据一次性计算指标，并生成买入区域和平仓信号
+
+        与 bt.talib 的 once() 一样直接对整个数据数组调用 TA-Lib，结果逐位一致
+        """
+        # 不复制: NumpyData 预加载时是共享数组的只读切片，各试验的输入指纹记忆可以命中
+        close = feed_values(self.data, 'close')
+        high = feed_values(self.data, 'high')
+        low = feed_values(self.data, 'low')
+
+        rsi, rsi_slow, atr_sum, minperiod = compute_indicators(
+            close, high, low, self.p.rsiFrequency, self.p.frequency, self.p.avgDownATRSum)
+
+        buy_zone = rsi < rsi_slow * (1 - self.p.buyZoneDistance / 100.0)
+        is_close = (rsi > rsi_slow) & ((rsi > self.p.barrierLevel) | (not self.p.useAbsoluteRSIBarrier))
+
+        # 逐根读取时 list 比 ndarray 索引快
+        self._close = close.tolist()
+        self._atr_sum = atr_sum.tolist()
+        self._buy_zone = buy_zone.tolist()
+        self._is_close = is_close.tolist()
+
+        self.warmup = WarmupPeriod(self.data, period=minperiod)
 
     def next(self):
         if len(self) < self.p.avgDownATRSum:
             return  # 等待足够的数据点
 
-        current_price = self.data.close[0]
-        rsi_val = self.rsi[0]
-        rsi_slow_val = self.rsi_slow[0]
-        atr_sum = sum(self.atr.get(size=self.p.avgDownATRSum))
+        if self.precomputed:
+            i = len(self.data) - 1
+            current_price = self._close[i]
+            atr_sum = self._atr_sum[i]
+            cond_buy_zone = self._buy_zone[i]
+            isClose = self._is_close[i]
+        else:
+            current_price = self.data.close[0]
+            rsi_val = self.rsi[0]
+            rsi_slow_val = self.rsi_slow[0]
+            atr_sum = sum(self.atr.get(size=self.p.avgDownATRSum))
+
+            cond_buy_zone = rsi_val < rsi_slow_val * (1 - self.p.buyZoneDistance / 100.0)
+            # 平仓条件
+            isClose = (rsi_val > rsi_slow_val) and (rsi_val > self.p.barrierLevel or not self.p.useAbsoluteRSIBarrier)
 
         price_condition = True
         if self.position:
             avg_price = self.position.price
             price_condition = (avg_price - atr_sum * self.opentrades) > current_price
 
-        cond_buy_zone = rsi_val < rsi_slow_val * (1 - self.p.buyZoneDistance / 100.0)
         cond_max = self.opentrades < self.p.pyramiding
         isBuy = cond_buy_zone and price_condition and cond_max
 
-        # 平仓条件
-        isClose = (rsi_val > rsi_slow_val) and (rsi_val > self.p.barrierLevel or not self.p.useAbsoluteRSIBarrier)
-
         if isBuy:
             target_percent = self.unit_ratio * (self.opentrades + 1)
             self.order_target_percent(target=target_percent)
@@ -49,3 +130,64 @@ class MeanReverter(bt.Strategy):
         if self.position and isClose:
             self.order_target_percent(target=0.0)
             self.opentrades = 0
+
+
+def batch_evaluate(arrays, param_sets, cash=10000.0, commission=0.0, slippage=0.0):
+    """
+    一次评估一批参数组（每组一列），结果与逐个 cerebro.run() 的 MeanReverter 一致
+
+    指标按列取自缓存（指标参数相同的列共用同一份数组），买入区域/平仓信号用广播一次算出
+    (K线 × 参数组) 的二维数组；仓位逻辑与 next() 相同，只在有信号的K线上对所有列一起计算。
+
+    Args:
+        arrays: 含 open/high/low/close 的数组字典（例如 batch_eval.preload_arrays 的返回值）
+        param_sets: 参数字典列表，缺少的参数取策略默认值
+
+    Returns:
+        dict: BatchPortfolio.result()，每项为与 param_sets 等长的数组
+    """
+    defaults = MeanReverter.params._getpairs()
+    params = [dict(defaults, **p) for p in param_sets]
+    close = np.asarray(arrays['close'], dtype=np.float64)
+    high = np.asarray(arrays['high'], dtype=np.float64)
+    low = np.asarray(arrays['low'], dtype=np.float64)
+    n, k = len(close), len(params)
+
+    rsi = np.empty((n, k))
+    rsi_slow = np.empty((n, k))
+    atr_sum = np.empty((n, k))
+    start = np.empty(k, dtype=np.int64)
+    for j, p in enumerate(params):
+        rsi[:, j], rsi_slow[:, j], atr_sum[:, j], minperiod = compute_indicators(
+            close, high, low, p['rsiFrequency'], p['frequency'], p['avgDownATRSum'])
+        # next() 从第 minperiod 根开始调用，且要求 len(self) >= avgDownATRSum
+        start[j] = max(minperiod, p['avgDownATRSum']) - 1
+
+    def column(name, dtype):
+        return np.array([p[name] for p in params], dtype=dtype)
+
+    active = np.arange(n)[:, None] >= start
+    buy_zone = active & (rsi < rsi_slow * (1 - column('buyZoneDistance', np.float64) / 100.0))
+    is_close = active & (rsi > rsi_slow) & ((rsi > column('barrierLevel', np.float64)) |
+                                            ~column('useAbsoluteRSIBarrier', bool))
+
+    pyramiding = column('pyramiding', np.float64)
+    unit_ratio = 1.0 / pyramiding
+    opentrades = np.zeros(k)
+    portfolio = BatchPortfolio(arrays, k, cash=cash, commission=commission, slippage=slippage)
+
+    for i in np.flatnonzero((buy_zone | is_close).any(axis=1)).tolist():
+        portfolio.settle(i)
+        has_position = portfolio.size != 0
+        price_condition = ~has_position | ((portfolio.price - atr_sum[i] * opentrades) > close[i])
+        is_buy = buy_zone[i] & price_condition & (opentrades < pyramiding)
+        closing = has_position & is_close[i]
+
+        if is_buy.any():
+            portfolio.order_target_percent(i, unit_ratio * (opentrades + 1), is_buy)
+            opentrades = opentrades + is_buy
+        if closing.any():
+            portfolio.order_target_percent(i, 0.0, closing)
+            opentrades = np.where(closing, 0.0, opentrades)
+
+    return portfolio.result()
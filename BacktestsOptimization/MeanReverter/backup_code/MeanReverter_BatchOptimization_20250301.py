@@ -1,5 +1,6 @@
 # 导入必要的库...
 import os
+import time
 import pandas as pd
 from datetime import datetime
 from glob import glob
@@ -8,14 +9,22 @@ import optuna
 import warnings
 import quantstats as qs
 warnings.filterwarnings('ignore')
-from IPython.display import clear_output
 from pathlib import Path  # 使用pathlib代替os
 
 # 在此处添加全局缓存字典，用于缓存数据加载结果和数据完整性检查结果
 _data_feed_cache = {}
 _data_completeness_cache = {}
 
-from MeanReverter import MeanReverter
+from MeanReverter import MeanReverter, batch_evaluate
+from backtrader_binance_futures.history_loader import load_resampled_pyramid
+from backtrader_binance_futures.numpy_feed import NumpyData, bars_to_arrays
+from backtrader_binance_futures.batch_eval import preload_arrays
+from backtrader_binance_futures.process_optimizer import optimize_in_processes
+from backtrader_binance_futures.analyzers import LeanScore
+from backtrader_binance_futures.pruning import add_pruning, make_pruner, raise_if_pruned
+from backtrader_binance_futures.trial_memo import open_memo
+from backtrader_binance_futures.job_scheduler import JobQueue, run_jobs
+from backtrader_binance_futures.manifest import list_symbols, find_missing_days
 
 # 在 CONFIG 中添加所有需要动态配置的参数
 CONFIG = {
@@ -29,6 +38,17 @@ CONFIG = {
     # 如果 selected_symbols 为空，则通过 get_all_symbols 自动获取所有交易对
     'selected_symbols': [],
     'data_path': r'..\\futures',
+    # Parquet 列式存储根目录（由 csv_to_parquet 转换生成），为 None 时直接读取按日CSV
+    'store_path': None,
+    # SQLite 历史库路径（由 csv_to_sqlite 生成），优先级在列式存储之后、按日CSV之前
+    'db_path': None,
+    # 重采样结果磁盘缓存目录（跨会话/进程共享），为 None 时不使用；超过容量上限按最近使用时间淘汰
+    'cache_path': r'..\\resample_cache',
+    'cache_max_bytes': 5 * 1024 ** 3,
+    # 并发读取按日CSV的线程数（网络共享目录上可适当调大）
+    'io_workers': 16,
+    # 为 True 时K线边界按 UTC 纪元对齐（与币安K线一致）
+    'binance_aligned': False,
     'start_date': '2024-01-01',
     'end_date': '2025-02-08',
     'source_timeframe': '1m',
@@ -63,7 +83,20 @@ CONFIG = {
         'n_trials': 240,       # 可根据需要调整试验次数
         'min_trades': 50,
         'timeout': 3600,
-        'n_jobs': 80           # -1 表示使用所有 CPU 核心; 也可以设置为具体的数量
+        'n_jobs': 80,          # -1 表示使用所有 CPU 核心; 也可以设置为具体的数量
+        'batch_size': 0,       # >0 时每次向 Optuna 取这么多组参数，用 batch_evaluate 一次评估（不经过 cerebro）；0 为逐个试验回测
+        'executor': 'process', # 'process': n_jobs 个工作进程并行（不受 GIL 限制）；'thread': Optuna 自带的线程并行
+        'study_storage_dir': 'optuna_studies', # 多进程模式下研究的日志文件目录（每次优化一个文件）
+        # 剪枝: 在 checkpoints 个等分检查点上报告阶段得分，明显落后的试验提前结束回测；None 为不剪枝（批量评估模式不支持）
+        'pruner': {'type': 'median', 'n_startup_trials': 10, 'n_warmup_steps': 2, 'checkpoints': 10},
+        # 试验得分记忆表: 相同策略、数据和参数已评估过时直接返回得分，跨重启保留，与 walk-forward 共用；None 为不记忆
+        'memo_path': '../trial_memo.sqlite'
+    },
+    
+    # 批量优化调度: workers 个组合同时优化（每个组合内部还有 n_jobs 个试验进程，两者之积不宜超过 CPU 核数）
+    'scheduler_settings': {
+        'workers': 4,
+        'retry_failed': False  # 为 True 时重新运行上次失败的组合（数据不完整、优化出错等）
     },
 
 }
@@ -85,182 +118,64 @@ def get_timeframe_params(timeframe_str):
 
 def load_and_resample_data(symbol, start_date, end_date, source_timeframe='1m', target_timeframe='30min', data_path=r'..\\futures'):
     """
-    加载并重采样期货数据，并缓存已经重采样后的 DataFrame 以避免重复 I/O 操作
+    加载并重采样期货数据，并缓存重采样后的 NumPy 数组以避免重复 I/O 和 DataFrame 拷贝
     """
     # 构造缓存键
     key = (symbol, start_date, end_date, source_timeframe, target_timeframe, data_path)
-    if key in _data_feed_cache:
-        # 如果缓存中有，返回新的数据馈送对象（注意拷贝，防止被修改）
-        cached_df = _data_feed_cache[key]
-        timeframe, compression = get_timeframe_params(target_timeframe)
-        data_feed = bt.feeds.PandasData(
-            dataname=cached_df.copy(),
-            open='Open',
-            high='High',
-            low='Low',
-            close='Close',
-            volume='Volume',
-            openinterest=-1,
-            timeframe=timeframe,
-            compression=compression,
-            fromdate=pd.to_datetime(start_date),
-            todate=pd.to_datetime(end_date)
+    if key not in _data_feed_cache:
+        # 只读取一次源K线，按 细->粗 的金字塔方式同时生成 CONFIG 中的所有目标周期；
+        # 命中磁盘缓存时跳过 读取-合并-重采样 步骤
+        timeframes = [target_timeframe] + [tf for tf in CONFIG.get('target_timeframes', []) if tf != target_timeframe]
+        frames = load_resampled_pyramid(
+            symbol, start_date, end_date,
+            source_timeframe=source_timeframe,
+            target_timeframes=timeframes,
+            data_path=data_path,
+            store_path=CONFIG.get('store_path'),
+            cache_path=CONFIG.get('cache_path'),
+            cache_max_bytes=CONFIG.get('cache_max_bytes', 5 * 1024 ** 3),
+            io_workers=CONFIG.get('io_workers', 16),
+            binance_aligned=CONFIG.get('binance_aligned', False),
+            db_path=CONFIG.get('db_path')
         )
-        
-        # 添加clone方法，这样可以快速创建数据副本而不需要重新执行IO
-        data_feed.clone = lambda: bt.feeds.PandasData(
-            dataname=cached_df.copy(),
-            open='Open',
-            high='High',
-            low='Low',
-            close='Close',
-            volume='Volume',
-            openinterest=-1,
+        # 转换为只读 NumPy 数组后缓存，所有试验共享同一份数组，不再每次拷贝 DataFrame
+        for tf, backtesting_df in frames.items():
+            _data_feed_cache[(symbol, start_date, end_date, source_timeframe, tf, data_path)] = bars_to_arrays(backtesting_df)
+    
+    arrays = _data_feed_cache[key]
+    timeframe, compression = get_timeframe_params(target_timeframe)
+    
+    def make_feed():
+        return NumpyData(
+            dataname=arrays,
             timeframe=timeframe,
             compression=compression,
             fromdate=pd.to_datetime(start_date),
             todate=pd.to_datetime(end_date)
         )
-        
-        return data_feed
     
-    # 生成日期范围
-    date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-    all_data = []
-    
-    # 标准化交易对名称
-    formatted_symbol = symbol.replace('/', '_').replace(':', '_')
-    if not formatted_symbol.endswith('USDT'):
-        formatted_symbol = f"{formatted_symbol}USDT"
-    
-    # 遍历每一天
-    for date in date_range:
-        date_str = date.strftime('%Y-%m-%d')
-        # 构建文件路径
-        file_path = os.path.join(data_path, date_str, f"{date_str}_{formatted_symbol}_USDT_{source_timeframe}.csv")
-        
-        try:
-            if os.path.exists(file_path):
-                # 读取数据
-                df = pd.read_csv(file_path)
-                # 确保datetime列不带时区信息
-                df['datetime'] = pd.to_datetime(df['datetime'], utc=False)
-                all_data.append(df)
-            else:
-                print(f"文件不存在: {file_path}")
-        except Exception as e:
-            print(f"读取文件出错 {file_path}: {str(e)}")
-            continue
-    
-    if not all_data:
-        raise ValueError(f"未找到 {symbol} 在指定日期范围内的数据")
-    
-    # 合并、排序，以及重采样数据
-    combined_df = pd.concat(all_data, ignore_index=True)
-    combined_df = combined_df.sort_values('datetime')
-    # 确保索引不带时区信息
-    combined_df.set_index('datetime', inplace=True)
-    # 移除任何时区信息
-    if combined_df.index.tz is not None:
-        combined_df.index = combined_df.index.tz_localize(None)
-    
-    resampled = combined_df.resample(target_timeframe).agg({
-        'open': 'first',
-        'high': 'max',
-        'low': 'min',
-        'close': 'last',
-        'volume': 'sum'
-    }).dropna()  # 立即删除NaN值
-    
-    backtesting_df = pd.DataFrame({
-        'Open': resampled['open'],
-        'High': resampled['high'],
-        'Low': resampled['low'],
-        'Close': resampled['close'],
-        'Volume': resampled['volume']
-    })
-    
-    # 确保所有数据都是数值类型并删除任何无效值
-    for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
-        backtesting_df[col] = pd.to_numeric(backtesting_df[col], errors='coerce')
-    backtesting_df = backtesting_df.dropna()
-    
-    # 将结果缓存在全局变量中（使用拷贝，以免后续被修改）
-    _data_feed_cache[key] = backtesting_df.copy()
-    
-    timeframe, compression = get_timeframe_params(target_timeframe)
-    data_feed = bt.feeds.PandasData(
-        dataname=backtesting_df,
-        open='Open',
-        high='High',
-        low='Low',
-        close='Close',
-        volume='Volume',
-        openinterest=-1,
-        timeframe=timeframe,
-        compression=compression,
-        fromdate=pd.to_datetime(start_date),
-        todate=pd.to_datetime(end_date)
-    )
-    
-    # 添加clone方法
-    data_feed.clone = lambda: bt.feeds.PandasData(
-        dataname=backtesting_df.copy(),
-        open='Open',
-        high='High',
-        low='Low',
-        close='Close',
-        volume='Volume',
-        openinterest=-1,
-        timeframe=timeframe,
-        compression=compression,
-        fromdate=pd.to_datetime(start_date),
-        todate=pd.to_datetime(end_date)
-    )
+    data_feed = make_feed()
+    # 添加clone方法：新的数据馈送直接引用共享数组，预加载时整块填充 lines 缓冲区
+    data_feed.clone = make_feed
     
     return data_feed
 
 def get_all_symbols(data_path, date_str):
-    """获取指定日期目录下的所有交易对"""
-    daily_path = os.path.join(data_path, date_str)
-    if not os.path.exists(daily_path):
-        return []
-    
-    files = glob(os.path.join(daily_path, f"{date_str}_*_USDT_1m.csv"))
-    symbols = set()  # 使用 set 进行去重
-    for file in files:
-        filename = os.path.basename(file)
-        symbol = filename.split('_')[1]
-        symbols.add(symbol)
-    return list(symbols)
+    """获取指定日期目录下的所有交易对（有清单索引时直接查询索引）"""
+    return list_symbols(data_path, date_str)
 
 def verify_data_completeness(symbol, start_date, end_date, data_path):
-    """验证数据完整性"""
+    """验证数据完整性（有清单索引时直接查询索引，否则逐日检查文件）"""
     # 构造缓存键
     key = (symbol, start_date, end_date, data_path)
     if key in _data_completeness_cache:
         return _data_completeness_cache[key]
     
-    date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-    
-    # 标准化交易对名称
-    formatted_symbol = symbol.replace('/', '_').replace(':', '_')
-    if not formatted_symbol.endswith('USDT'):
-        formatted_symbol = f"{formatted_symbol}USDT"
-    
-    for date in date_range:
-        date_str = date.strftime('%Y-%m-%d')
-        file_path = os.path.join(
-            data_path,
-            date_str,
-            f"{date_str}_{formatted_symbol}_USDT_1m.csv"  # 文件名格式保持不变
-        )
-        if not os.path.exists(file_path):
-            print(f"文件不存在: {file_path}")
-            _data_completeness_cache[key] = False
-            return False
-    _data_completeness_cache[key] = True
-    return True
+    missing_days = find_missing_days(symbol, start_date, end_date, data_path, stop_at_first=True)
+    if missing_days:
+        print(f"{symbol} 缺失 {len(missing_days)} 天数据，首个缺失日期: {missing_days[0]}")
+    _data_completeness_cache[key] = not missing_days
+    return _data_completeness_cache[key]
 
 # 添加自定义评分函数
 def custom_score(strat):
@@ -268,13 +183,13 @@ def custom_score(strat):
     自定义评分函数 - 以最大化回报率为主要目标
     保留最低交易次数要求作为基本约束
     """
-    # 获取交易次数
-    trades = strat.analyzers.trades.get_analysis()
-    total_trades = trades.get('total', {}).get('total', 0)
-    
-    # 从returns分析器获取总回报率
-    returns = strat.analyzers.returns.get_analysis()
-    total_return = returns.get('rtot', 0) * 100  # 转为百分比
+    # 交易次数和对数总收益都来自精简分析器 LeanScore（与 TradeAnalyzer 的 total.total、Returns 的 rtot 相同）
+    stats = strat.analyzers.score.get_analysis()
+    return score_from_stats(stats.trades, stats.rtot)
+
+def score_from_stats(total_trades, rtot):
+    """由交易次数和对数总收益计算得分（custom_score 与批量评估共用）"""
+    total_return = rtot * 100  # 转为百分比
     
     # 交易次数惩罚 - 确保策略至少有足够的交易
     min_trades = CONFIG['optimization_settings'].get('min_trades', 50)
@@ -286,6 +201,129 @@ def custom_score(strat):
     
     return score
 
+def suggest_params(trial):
+    """按 CONFIG['optimization_params'] 向 Optuna 取一组参数"""
+    params = {}
+    for param_name, param_range in CONFIG['optimization_params'].items():
+        if isinstance(param_range, range):
+            params[param_name] = trial.suggest_int(
+                param_name,
+                param_range.start,
+                param_range.stop - 1,
+                step=param_range.step
+            )
+        else:
+            params[param_name] = trial.suggest_categorical(param_name, param_range)
+    return params
+
+def configure_broker(broker):
+    """按 CONFIG 设置优化回测的初始资金和手续费（逐个试验回测与批量评估使用相同设置），返回 broker"""
+    broker.setcash(CONFIG['initial_capital'])
+    broker.setcommission(commission=CONFIG['commission'])
+    return broker
+
+def memo_context():
+    """影响得分但不在策略参数和 broker 设置中的内容，作为试验记忆表键的一部分"""
+    return {
+        'min_trades': CONFIG['optimization_settings'].get('min_trades', 50),
+        'score': 'rtot_trade_penalty'
+    }
+
+def optimize_in_batches(study, preloaded_data, batch_size):
+    """
+    批量优化: 每次 ask 出 batch_size 个试验，用 batch_evaluate 一次算完所有参数组，再逐个 tell
+
+    结果与逐个试验跑 cerebro（CONFIG 中的初始资金和手续费，LeanScore 分析器）完全一致。
+    """
+    settings = CONFIG['optimization_settings']
+    arrays = preload_arrays(preloaded_data.clone())
+    memo = open_memo(settings.get('memo_path'))
+    strategy_cls = CONFIG['strategy']['class']
+    context = memo_context()
+    # 没有 cerebro，按相同设置构造一个 broker 计算记忆表的键
+    broker = configure_broker(bt.brokers.BackBroker())
+    deadline = time.time() + settings['timeout'] if settings.get('timeout') else None
+    remaining = settings['n_trials']
+    while remaining > 0 and (deadline is None or time.time() < deadline):
+        trials = [study.ask() for _ in range(min(batch_size, remaining))]
+        param_sets = [suggest_params(trial) for trial in trials]
+        remaining -= len(trials)
+        
+        # 记忆表中已有得分的参数组直接 tell，只批量评估其余的
+        pending = []
+        for trial, params in zip(trials, param_sets):
+            key = memo.make_key(strategy_cls, preloaded_data, params, context, broker=broker)
+            score = memo.get(key)
+            if score is not None:
+                study.tell(trial, score)
+            else:
+                pending.append((trial, params, key))
+        if not pending:
+            continue
+        
+        try:
+            stats = batch_evaluate(arrays, [params for _, params, _ in pending],
+                                   cash=CONFIG['initial_capital'], commission=CONFIG['commission'])
+        except Exception as e:
+            print(f"Batch encountered an error: {e}")
+            for trial, _, _ in pending:
+                study.tell(trial, state=optuna.trial.TrialState.FAIL)
+        else:
+            for j, (trial, params, key) in enumerate(pending):
+                score = score_from_stats(int(stats['num_trades'][j]), float(stats['rtot'][j]))
+                memo.put(key, score, strategy_cls, params, context)
+                study.tell(trial, score)
+
+def run_objective(trial, preloaded_data):
+    """
+    单个试验: 取参数、用预加载数据的克隆回测并打分
+
+    模块级函数，可以被多进程优化的工作进程 pickle 引用
+    """
+    try:
+        params = suggest_params(trial)
+        
+        cerebro = bt.Cerebro(
+                    optdatas=True,    # 启用数据优化
+                    optreturn=True,   # 仅返回必要结果
+                    runonce=True,     # 批处理模式
+                    preload=True      # 预加载数据
+        )
+        configure_broker(cerebro.broker)
+        
+        # 相同参数、相同 broker 设置在同一份数据上已经回测过时直接返回记忆的得分
+        memo = open_memo(CONFIG['optimization_settings'].get('memo_path'))
+        memo_key = memo.make_key(CONFIG['strategy']['class'], preloaded_data, params, memo_context(),
+                                 broker=cerebro.broker)
+        cached_score = memo.get(memo_key)
+        if cached_score is not None:
+            return cached_score
+        
+        # 2. 使用预加载数据的克隆而不是重新加载数据
+        data = preloaded_data.clone()
+        cerebro.adddata(data)
+        cerebro.addstrategy(CONFIG['strategy']['class'], **params)
+        
+        # 只使用精简分析器（交易次数、对数收益、最大回撤等标量），跳过PyFolio分析器避免时区问题
+        # cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe')
+        # cerebro.addanalyzer(bt.analyzers.SQN, _name='sqn')
+        cerebro.addanalyzer(LeanScore, _name='score')
+        settings = CONFIG['optimization_settings']
+        add_pruning(cerebro, trial, settings.get('pruner'), min_trades=settings.get('min_trades', 50))
+        
+        results = cerebro.run()
+        strat = results[0]
+        raise_if_pruned(strat)
+        score = custom_score(strat)
+        memo.put(memo_key, score, CONFIG['strategy']['class'], params, memo_context())
+        return score
+    except optuna.TrialPruned:
+        raise
+    except Exception as e:
+        print(f"Trial encountered an error: {e}")
+        # 返回极低的分数，确保该试验不会被选中
+        return float('-inf')
+
 def optimize_strategy(symbol, timeframe):
     """
     使用 Optuna 优化策略参数，并返回最优的前 5 个参数组合
@@ -296,62 +334,42 @@ def optimize_strategy(symbol, timeframe):
         target_timeframe=timeframe
     )
     
-    # 使用内存存储而非SQLite数据库
-    study = optuna.create_study(
-        study_name=f"{symbol}_{timeframe}",
-        direction="maximize",
-        storage=None  # 使用内存存储
-    )
-    
-    def objective(trial):
-        try:
-            params = {}
-            for param_name, param_range in CONFIG['optimization_params'].items():
-                if isinstance(param_range, range):
-                    params[param_name] = trial.suggest_int(
-                        param_name,
-                        param_range.start,
-                        param_range.stop - 1,
-                        param_range.step
-                    )
-                else:
-                    params[param_name] = trial.suggest_categorical(param_name, param_range)
-            
-            cerebro = bt.Cerebro(
-                        optdatas=True,    # 启用数据优化
-                        optreturn=True,   # 仅返回必要结果
-                        runonce=True,     # 批处理模式
-                        preload=True      # 预加载数据
+    settings = CONFIG['optimization_settings']
+    study_name = f"{symbol}_{timeframe}"
+    batch_size = settings.get('batch_size', 0)
+    
+    if settings.get('executor', 'thread') == 'process' and not (batch_size > 0 and CONFIG['strategy']['class'] is MeanReverter):
+        # 多进程: 各工作进程挂载共享内存中的K线，通过本地日志文件中的研究领取试验
+        os.makedirs(settings['study_storage_dir'], exist_ok=True)
+        storage = os.path.join(settings['study_storage_dir'],
+                               f"{study_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+        study = optimize_in_processes(
+            study_name, run_objective, preloaded_data, storage,
+            n_trials=settings['n_trials'],
+            n_jobs=settings.get('n_jobs', 1),
+            timeout=settings['timeout'],
+            pruner=make_pruner(settings.get('pruner'))
+        )
+    else:
+        # 使用内存存储而非SQLite数据库
+        study = optuna.create_study(
+            study_name=study_name,
+            direction="maximize",
+            storage=None,  # 使用内存存储
+            pruner=make_pruner(settings.get('pruner'))
+        )
+        
+        if batch_size > 0 and CONFIG['strategy']['class'] is MeanReverter:
+            optimize_in_batches(study, preloaded_data, batch_size)
+        else:
+            # 添加异常捕获
+            study.optimize(
+                lambda trial: run_objective(trial, preloaded_data),
+                n_trials=settings['n_trials'],
+                timeout=settings['timeout'],
+                n_jobs=settings.get('n_jobs', 1),
+                catch=(Exception,)  # 捕获所有异常
             )
-            # 2. 使用预加载数据的克隆而不是重新加载数据
-            data = preloaded_data.clone()
-            cerebro.adddata(data)
-            cerebro.addstrategy(CONFIG['strategy']['class'], **params)
-            
-            # 只使用基本分析器，跳过PyFolio分析器避免时区问题
-            # cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe')
-            # cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
-            cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trades')
-            cerebro.addanalyzer(bt.analyzers.Returns, _name='returns')
-            # cerebro.addanalyzer(bt.analyzers.SQN, _name='sqn')
-            
-            results = cerebro.run()
-            strat = results[0]
-            score = custom_score(strat)
-            return score
-        except Exception as e:
-            print(f"Trial encountered an error: {e}")
-            # 返回极低的分数，确保该试验不会被选中
-            return float('-inf')
-    
-    # 添加异常捕获
-    study.optimize(
-        objective,
-        n_trials=CONFIG['optimization_settings']['n_trials'],
-        timeout=CONFIG['optimization_settings']['timeout'],
-        n_jobs=CONFIG['optimization_settings'].get('n_jobs', 1),
-        catch=(Exception,)  # 捕获所有异常
-    )
     
     # 过滤无效试验
     completed_trials = [
@@ -476,14 +494,11 @@ def run_backtest_with_params(params, symbol, timeframe):
 
     return backtest_results
 
-def load_master_results(config):
-    """
-    加载全局优化结果文件，并提取已完成优化的组合（基于 'Symbol', 'Target Timeframe', 'Rank' 列）。
-    """
-    # 构造 master 文件路径
+def master_results_path(config):
+    """全局优化结果文件路径"""
     start_clean = config['start_date'].replace("-", "")
     end_clean = config['end_date'].replace("-", "")
-    master_file = os.path.join(
+    return os.path.join(
         config['reports_path'], 
         config['results_filename_template'].format(
             strategy_name=config['strategy']['name'],
@@ -491,6 +506,12 @@ def load_master_results(config):
             end_date=end_clean
         )
     )
+
+def load_master_results(config):
+    """
+    加载全局优化结果文件，并提取已完成优化的组合（基于 'Symbol', 'Target Timeframe', 'Rank' 列）。
+    """
+    master_file = master_results_path(config)
     
     if os.path.exists(master_file):
         try:
@@ -517,22 +538,6 @@ def load_master_results(config):
         
     return master_file, master_df, optimized_combinations
 
-def save_master_results(new_results, master_file):
-    """
-    将新的优化结果合并到全局结果文件中，并保存为 CSV 文件。
-    """
-    if os.path.exists(master_file):
-        try:
-            existing_df = pd.read_csv(master_file)
-        except Exception as e:
-            existing_df = pd.DataFrame()
-        combined_df = pd.concat([existing_df, pd.DataFrame(new_results)], ignore_index=True)
-    else:
-        combined_df = pd.DataFrame(new_results)
-    
-    combined_df.to_csv(master_file, index=False)  # 修改为 CSV 写入
-    print(f"优化结果保存到: {master_file}")
-
 def process_symbol_tf(symbol, tf, config):
     """
     针对单个交易对和指定时间周期执行策略参数优化与回测，并赋予 1~5 的排名。
@@ -594,17 +599,30 @@ def clean_incomplete_optuna_db_files(config):
                     print(f"删除文件 {db_file} 出错：{e}")
     print("数据库清理完成。")
 
+def run_combo(symbol, tf, config):
+    """
+    调度器作业（在工作进程中运行）: 验证数据完整性后优化一个交易对-时间周期组合，返回带 1~5 排名的结果
+    """
+    # 工作进程重新导入本模块，模块级 CONFIG 是文件中的默认值；optimize_strategy 等函数读取的是它
+    CONFIG.update(config)
+    if not verify_data_completeness(symbol, config['start_date'], config['end_date'], config['data_path']):
+        raise RuntimeError(f"{symbol} 数据不完整")
+    results = process_symbol_tf(symbol, tf, config)
+    if not results:
+        raise RuntimeError(f"{symbol} 在 {tf} 时间周期下没有获得优化结果")
+    return results
+
 def batch_optimize(config):
     """
     批量优化所有交易对和指定多个时间周期：
     1. 根据配置中的 selected_symbols 获取交易对列表（如果为空则自动获取）。
-    2. 验证每个交易对在指定时间段内数据完整性，跳过数据不完整的。
-    3. 对每个（交易对, 时间周期）组合，若已存在完整5个排名则跳过，否则运行优化与回测。
-    4. 每完成一个交易对-时间周期组合的前五个优化结果，立刻保存到全局结果文件中。
+    2. 每个（交易对, 时间周期）组合作为一个作业加入持久化队列（结果文件旁的 .jobs.db），已有作业保持原状态。
+    3. 由 scheduler_settings['workers'] 个工作进程并行执行作业，每个作业先验证数据完整性，再运行优化与回测。
+    4. 每完成一个组合立刻把前五个结果追加到全局结果文件（不重新读取整个文件）；中断后重新运行即从队列继续。
     """
     os.makedirs(config['reports_path'], exist_ok=True)
-    
-    master_file, master_df, optimized_combinations = load_master_results(config)
+    master_file = master_results_path(config)
+    settings = config.get('scheduler_settings', {})
     
     # 获取交易对列表
     if config.get('selected_symbols'):
@@ -613,47 +631,22 @@ def batch_optimize(config):
         symbols = get_all_symbols(config['data_path'], config['start_date'])
         print(f"总共找到 {len(symbols)} 个交易对")
     
-    total_combinations = [(s, tf) for s in symbols for tf in config['target_timeframes']]
-    remaining_combinations = [combo for combo in total_combinations if combo not in optimized_combinations]
-    print(f"剩余需要优化的组合数量: {len(remaining_combinations)} 个")
-    
-    # 新增变量跟踪已处理组合数
-    processed_count = 0
-    total_remaining = len(remaining_combinations)
-    
-    # 遍历每个交易对
-    for i, symbol in enumerate(symbols, 1):
-        # 更新进度显示，使用剩余组合数作为分母
-        print(f"\n进度: {processed_count}/{total_remaining} ({processed_count/total_remaining*100:.1f}%) - 当前处理: {symbol}")
-        
-        print(f"验证 {symbol} 的数据完整性...")
-        if not verify_data_completeness(symbol, config['start_date'], config['end_date'], config['data_path']):
-            print(f"警告: 跳过 {symbol} - 数据不完整")
-            continue
-        print(f"{symbol} 数据完整性验证通过")
+    queue = JobQueue(os.path.splitext(master_file)[0] + '.jobs.db')
+    try:
+        added = sum(queue.add(f"{symbol}|{tf}", [symbol, tf]) for symbol in symbols for tf in config['target_timeframes'])
+        if settings.get('retry_failed'):
+            added += queue.retry_failed()
+        print(f"新加入队列的组合: {added} 个，当前队列状态: {queue.counts()}")
         
-        # 对每个目标时间周期进行优化
-        for tf in config['target_timeframes']:
-            if (symbol, tf) in optimized_combinations:
-                print(f"组合 {symbol}-{tf} 已完成优化，跳过")
-                continue
-                
-            # 显示更详细的进度信息
-            print(f"\n处理组合: {symbol}-{tf} (进度: {processed_count}/{total_remaining}, 剩余: {total_remaining-processed_count})")
-            
-            results = process_symbol_tf(symbol, tf, config)
-            if results:
-                clear_output(wait=True)
-                save_master_results(results, master_file)
-                optimized_combinations.add((symbol, tf))
-                # 递增已处理计数并更新进度显示
-                processed_count += 1
-                print(f"完成组合 {symbol}-{tf} 的优化，总进度: {processed_count}/{total_remaining} ({processed_count/total_remaining*100:.1f}%)")
-            else:
-                print(f"警告: {symbol} 在 {tf} 时间周期下没有获得优化结果")
+        counts = run_jobs(queue, run_combo, n_workers=settings.get('workers', 1), extra_args=(config,),
+                          results_path=master_file)
+        for key, error in queue.failures():
+            print(f"失败: {key} - {error}")
+    finally:
+        queue.close()
     
     # 显示最终完成消息
-    print(f"批量优化完成。共处理 {processed_count}/{total_remaining} 个组合。")
+    print(f"批量优化完成。作业状态: {counts}，结果保存在: {master_file}")
 
 if __name__ == '__main__':
     # 先清理不完整的 Optuna 数据库文件（不在最终结果 CSV 中的组合）
@@ -2,194 +2,287 @@ import backtrader as bt
 import talib
 import math
 import numpy as np
+from array import array
 
-class PMaxExplorer(bt.Strategy):
+
+class WildersMA(bt.Indicator):
+    """
+    WWMA = (1/length)*src + (1 - 1/length)*WWMA[1]，第一根以 src 作为 WWMA[1]
+
+    next() 只用上一根的值，once() 单次遍历数组
+    """
+    lines = ('ma',)
+    params = (('length', 10),)
+    plotinfo = dict(subplot=False)
+
+    def nextstart(self):
+        self._step(self.data[0])
+
+    def next(self):
+        self._step(self.lines.ma[-1])
+
+    def _step(self, prev):
+        alpha = 1 / self.p.length
+        self.lines.ma[0] = alpha * self.data[0] + (1 - alpha) * prev
+
+    def once(self, start, end):
+        src = self.data.lines[0].array
+        dst = self.lines.ma.array
+        alpha = 1 / self.p.length
+        for i in range(start, end):
+            prev = src[i] if i == self._minperiod - 1 else dst[i - 1]
+            dst[i] = alpha * src[i] + (1 - alpha) * prev
+
+
+class ZeroLagEMA(bt.Indicator):
+    """
+    ZLEMA: 对 src + (src - src[lag]) 做 EMA（alpha = 2/(length+1)），lag = floor(length/2)
+
+    历史不足 lag 根时直接用 src；EMA 以第一根的值作为起点
+    """
+    lines = ('ma',)
+    params = (('length', 10),)
+    plotinfo = dict(subplot=False)
+
+    def _lag(self):
+        return self.p.length // 2
+
+    def nextstart(self):
+        self._step(None)
+
+    def next(self):
+        self._step(self.lines.ma[-1])
+
+    def _step(self, prev):
+        lag = self._lag()
+        src = self.data[0]
+        zxed = src + (src - self.data[-lag]) if len(self.data) > lag else src
+        alpha = 2 / (self.p.length + 1)
+        if prev is None:
+            prev = zxed
+        self.lines.ma[0] = alpha * zxed + (1 - alpha) * prev
+
+    def once(self, start, end):
+        src = self.data.lines[0].array
+        dst = self.lines.ma.array
+        lag = self._lag()
+        alpha = 2 / (self.p.length + 1)
+        for i in range(start, end):
+            zxed = src[i] + (src[i] - src[i - lag]) if i >= lag else src[i]
+            prev = zxed if i == self._minperiod - 1 else dst[i - 1]
+            dst[i] = alpha * zxed + (1 - alpha) * prev
+
+
+class VariableMA(bt.Indicator):
+    """
+    VAR（VIDYA）: 用最近 9 个差分的 CMO 调整 EMA 的平滑系数
+
+    next() 只求和最近 9 个差分；once() 用 NumPy 一次算出全部窗口和（与逐根求和的累加顺序相同），
+    再单次遍历完成递归
+    """
+    lines = ('ma',)
+    params = (('length', 10),)
+    plotinfo = dict(subplot=False)
+
+    CMO_PERIOD = 9
+
+    def nextstart(self):
+        self.lines.ma[0] = self.data[0]
+
+    def next(self):
+        window = self.data.get(size=min(len(self.data), self.CMO_PERIOD + 1))
+        vud_sum = 0.0
+        vdd_sum = 0.0
+        for i in range(1, len(window)):
+            diff = window[i] - window[i - 1]
+            if diff > 0:
+                vud_sum += diff
+            elif diff < 0:
+                vdd_sum += -diff
+        self.lines.ma[0] = self._var(self.data[0], self.lines.ma[-1], vud_sum, vdd_sum)
+
+    def _var(self, src, prev, vud_sum, vdd_sum):
+        denom = vud_sum + vdd_sum
+        vCMO = (vud_sum - vdd_sum) / denom if denom != 0 else 0
+        alpha = 2 / (self.p.length + 1)
+        return alpha * abs(vCMO) * src + (1 - alpha * abs(vCMO)) * prev
+
+    def once(self, start, end):
+        src = self.data.lines[0].array
+        dst = self.lines.ma.array
+        values = np.array(src[:end], dtype=float)
+        diff = np.diff(values)
+        n = self.CMO_PERIOD
+        # 第 j 根的窗口为第 j-8..j 根的差分，前面补零后依次从旧到新相加
+        ups = np.concatenate([np.zeros(n), np.where(diff > 0, diff, 0.0)])
+        downs = np.concatenate([np.zeros(n), np.where(diff < 0, -diff, 0.0)])
+        vud = np.zeros(len(values))
+        vdd = np.zeros(len(values))
+        for k in range(n):
+            vud = vud + ups[k:k + len(values)]
+            vdd = vdd + downs[k:k + len(values)]
+        vud = vud.tolist()
+        vdd = vdd.tolist()
+
+        for i in range(start, end):
+            if i == self._minperiod - 1:
+                dst[i] = src[i]
+            else:
+                dst[i] = self._var(src[i], dst[i - 1], vud[i], vdd[i])
+
+
+class TimeSeriesForecast(bt.Indicator):
+    """
+    TSF: 最近 length 根的线性回归在倒数第二个点上的取值（回归终点值减去斜率）
+
+    next() 只对最近 length 根调用 TA-Lib，once() 对整个数组调用一次，两者结果一致
+    """
+    lines = ('ma',)
+    params = (('length', 10),)
+    plotinfo = dict(subplot=False)
+
+    def __init__(self):
+        self.addminperiod(self.p.length)
+
+    def _tsf(self, values):
+        return talib.LINEARREG(values, timeperiod=self.p.length) - \
+            talib.LINEARREG_SLOPE(values, timeperiod=self.p.length)
+
+    def next(self):
+        values = np.array(self.data.get(size=self.p.length), dtype=float)
+        self.lines.ma[0] = self._tsf(values)[-1]
+
+    def once(self, start, end):
+        values = np.array(self.data.lines[0].array[:end], dtype=float)
+        self.lines.ma.array[start:end] = array('d', self._tsf(values)[start:end])
+
+
+def moving_average(mav, src, length):
+    """按 PMax 的 mav 参数创建移动平均指标，未知类型时直接使用 src"""
+    mav_type = mav.upper()
+    if mav_type == 'EMA':
+        return bt.indicators.EMA(src, period=length)
+    if mav_type == 'SMA':
+        return bt.indicators.SMA(src, period=length)
+    if mav_type == 'WMA':
+        return bt.indicators.WMA(src, period=length)
+    if mav_type == 'TMA':
+        ceil_len = int(math.ceil(length / 2.0))
+        floor_len = int(math.floor(length / 2.0)) + 1
+        return bt.indicators.SMA(bt.indicators.SMA(src, period=ceil_len), period=floor_len)
+    if mav_type == 'VAR':
+        return VariableMA(src, length=length)
+    if mav_type == 'WWMA':
+        return WildersMA(src, length=length)
+    if mav_type == 'ZLEMA':
+        return ZeroLagEMA(src, length=length)
+    if mav_type == 'TSF':
+        return TimeSeriesForecast(src, length=length)
+    return src
+
+
+class PMax(bt.Indicator):
+    """
+    PMax（Profit Maximizer）: 以 (high+low)/2 的移动平均为中轴、ATR 倍数为宽度的追踪止损线
+
+    longstop/shortstop/direction 的递归只依赖上一根的值：next() 为 O(1)，once() 单次遍历数组
+    """
+    lines = ('mavg', 'pmax', 'longstop', 'shortstop', 'direction')
     params = (
         ('Periods', 10),         # ATR周期
         ('Multiplier', 3.0),     # ATR倍数
         ('mav', 'EMA'),          # 移动平均类型，可选：SMA, EMA, WMA, TMA, VAR, WWMA, ZLEMA, TSF
         ('length', 10),          # 移动平均周期
-        ('changeATR', True),     # 是否采用内置 ATR 计算方式
+        ('changeATR', True),     # True 使用 Wilder ATR，False 使用 TrueRange 的 SMA
+    )
+    plotinfo = dict(subplot=False)
+    plotlines = dict(
+        longstop=dict(_plotskip=True),
+        shortstop=dict(_plotskip=True),
+        direction=dict(_plotskip=True),
     )
 
     def __init__(self):
-        # ATR 部分：如果 changeATR 为 True，则调用 TA-Lib.ATR（需传入 high, low, close）
+        src = (self.data.high + self.data.low) / 2.0
+        self.ma = moving_average(self.p.mav, src, self.p.length)
         if self.p.changeATR:
-            self.atr_ind = bt.talib.ATR(self.data.high, self.data.low, self.data.close, timeperiod=self.p.Periods)
-        else:
-            # 否则用 TrueRange 后 SMA 平滑（注意，此处仅为替代方案）
-            self.tr = bt.indicators.TrueRange(self.data)
-            self.atr_ind = bt.talib.SMA(self.tr, timeperiod=self.p.Periods)
-        
-        # 存储 hl2 序列（即 (high+low)/2），用于指标计算
-        self.custom_src = []        
-
-        # 保存上一个 bar 的 MAvg 与 PMax，用于交叉检测（开仓/平仓信号）
-        self.prev_MAvg = None
-        self.prev_PMax = None
-
-        # 用于 PMax 递归计算的变量：longStop、shortStop、方向（dir）、以及当前 PMax
-        self.longStop = None
-        self.shortStop = None
-        self.dir = 1   # 初始方向设为 1（多头）
-        self.PMax = None
-
-        # 如果使用自定义 MA（VAR、WWMA、ZLEMA、TSF），需要保存上次的值：
-        self.var_value = None   # VAR 指标
-        self.wwma = None        # WWMA 指标
-        self.zlema = None       # ZLEMA 指标
-        # TSF 直接滚动计算，无需递归存储
-
-    def next(self):
-        # ---------------------------
-        # 1. 计算指标源 src
-        # ---------------------------
-        current_src = (self.data.high[0] + self.data.low[0]) / 2
-        self.custom_src.append(current_src)
-        
-        # ---------------------------
-        # 2. 根据参数计算 MAvg
-        # ---------------------------
-        mav_type = self.p.mav.upper()
-        if mav_type in ["EMA", "SMA", "WMA", "TMA"]:
-            # 利用 TA-Lib 函数计算：需要把历史 src 转为 numpy 数组
-            src_arr = np.array(self.custom_src, dtype=float)
-            if len(src_arr) < self.p.length:
-                MAvg = current_src
-            else:
-                if mav_type == "EMA":
-                    mavg_series = talib.EMA(src_arr, timeperiod=self.p.length)
-                elif mav_type == "SMA":
-                    mavg_series = talib.SMA(src_arr, timeperiod=self.p.length)
-                elif mav_type == "WMA":
-                    mavg_series = talib.WMA(src_arr, timeperiod=self.p.length)
-                elif mav_type == "TMA":
-                    ceil_len = int(math.ceil(self.p.length / 2.0))
-                    floor_len = int(math.floor(self.p.length / 2.0)) + 1
-                    sma1 = talib.SMA(src_arr, timeperiod=ceil_len)
-                    mavg_series = talib.SMA(sma1, timeperiod=floor_len)
-                MAvg = mavg_series[-1] if not math.isnan(mavg_series[-1]) else current_src
+            self.atr = bt.indicators.ATR(self.data, period=self.p.Periods)
         else:
-            # 自定义计算：VAR、WWMA、ZLEMA、TSF
-            if mav_type == "VAR":
-                # 计算方法：先计算 9 个 bar 内正负差分累加得到 vCMO，再递归更新 VAR
-                if len(self.custom_src) < 2:
-                    MAvg = current_src
-                    self.var_value = current_src
-                else:
-                    n = 9
-                    start_idx = max(1, len(self.custom_src) - n)
-                    vud_sum = 0.0
-                    vdd_sum = 0.0
-                    for i in range(start_idx, len(self.custom_src)):
-                        diff = self.custom_src[i] - self.custom_src[i-1]
-                        if diff > 0:
-                            vud_sum += diff
-                        elif diff < 0:
-                            vdd_sum += -diff
-                    denom = vud_sum + vdd_sum
-                    vCMO = (vud_sum - vdd_sum) / denom if denom != 0 else 0
-                    alpha = 2 / (self.p.length + 1)
-                    if self.var_value is None:
-                        self.var_value = current_src
-                    MAvg = alpha * abs(vCMO) * current_src + (1 - alpha * abs(vCMO)) * self.var_value
-                    self.var_value = MAvg
-            elif mav_type == "WWMA":
-                # WWMA = (1/length)*src + (1 - 1/length)*WWMA[1]
-                alpha = 1 / self.p.length
-                if self.wwma is None:
-                    self.wwma = current_src
-                MAvg = alpha * current_src + (1 - alpha) * self.wwma
-                self.wwma = MAvg
-            elif mav_type == "ZLEMA":
-                # ZLEMA：计算延迟 lag，然后用 EMA 平滑 (src + (src - src[zxLag]))
-                if self.p.length % 2 == 0:
-                    lag = int(self.p.length / 2)
-                else:
-                    lag = int((self.p.length - 1) / 2)
-                if len(self.custom_src) <= lag:
-                    zxed = current_src
-                else:
-                    zxed = current_src + (current_src - self.custom_src[-lag-1])
-                alpha = 2 / (self.p.length + 1)
-                if self.zlema is None:
-                    self.zlema = zxed
-                MAvg = alpha * zxed + (1 - alpha) * self.zlema
-                self.zlema = MAvg
-            elif mav_type == "TSF":
-                # TSF 采用线性回归：TSF = 2*linreg(src, length, 0) - linreg(src, length, 1)
-                if len(self.custom_src) < self.p.length:
-                    MAvg = current_src
-                else:
-                    n = self.p.length
-                    y = np.array(self.custom_src[-n:], dtype=float)
-                    x = np.arange(n, dtype=float)
-                    slope, intercept = np.polyfit(x, y, 1)
-                    forecast0 = slope * (n - 1) + intercept
-                    forecast1 = slope * n + intercept
-                    MAvg = 2 * forecast0 - forecast1
-            else:
-                MAvg = current_src  # 默认回退到当前值
+            self.atr = bt.indicators.SMA(bt.indicators.TrueRange(self.data), period=self.p.Periods)
 
-        # ---------------------------
-        # 3. 根据 MAvg 与 ATR 计算 PMax 相关变量
-        # ---------------------------
-        atr_value = self.atr_ind[0]
+    def _update(self, MAvg, atr_value, prev):
+        """返回 (longStop, shortStop, dir)；prev 为上一根的 (longStop, shortStop, dir)，第一根为 None"""
         mult = self.p.Multiplier
         comp_longStop = MAvg - mult * atr_value
         comp_shortStop = MAvg + mult * atr_value
-        
-        # 第一根K线时，初始化 longStop、shortStop、dir 与 PMax
-        if self.longStop is None:
-            self.longStop = comp_longStop
-            self.shortStop = comp_shortStop
-            self.dir = 1
-            self.PMax = self.longStop
-            self.prev_MAvg = MAvg
-            self.prev_PMax = self.PMax
-            return
-        
-        # 根据前一bar数据进行递归更新（等同于 PineScript 中 nz() 和递归赋值）
-        if MAvg > self.longStop:
-            new_longStop = max(comp_longStop, self.longStop)
-        else:
-            new_longStop = comp_longStop
-        if MAvg < self.shortStop:
-            new_shortStop = min(comp_shortStop, self.shortStop)
-        else:
-            new_shortStop = comp_shortStop
-        
-        # 更新方向：原 PineScript 条件
-        new_dir = self.dir
-        if self.dir == -1 and MAvg > self.shortStop:
+        if prev is None:
+            return comp_longStop, comp_shortStop, 1
+
+        longStop, shortStop, direction = prev
+        new_longStop = max(comp_longStop, longStop) if MAvg > longStop else comp_longStop
+        new_shortStop = min(comp_shortStop, shortStop) if MAvg < shortStop else comp_shortStop
+        new_dir = direction
+        if direction == -1 and MAvg > shortStop:
             new_dir = 1
-        elif self.dir == 1 and MAvg < self.longStop:
+        elif direction == 1 and MAvg < longStop:
             new_dir = -1
+        return new_longStop, new_shortStop, new_dir
+
+    def _set(self, MAvg, state):
+        longStop, shortStop, direction = state
+        self.lines.mavg[0] = MAvg
+        self.lines.longstop[0] = longStop
+        self.lines.shortstop[0] = shortStop
+        self.lines.direction[0] = direction
+        self.lines.pmax[0] = longStop if direction == 1 else shortStop
+
+    def nextstart(self):
+        self._set(self.ma[0], self._update(self.ma[0], self.atr[0], None))
+
+    def next(self):
+        prev = (self.lines.longstop[-1], self.lines.shortstop[-1], self.lines.direction[-1])
+        self._set(self.ma[0], self._update(self.ma[0], self.atr[0], prev))
+
+    def once(self, start, end):
+        ma = self.ma.lines[0].array
+        atr = self.atr.lines[0].array
+        mavg, pmax = self.lines.mavg.array, self.lines.pmax.array
+        longstop, shortstop, direction = self.lines.longstop.array, self.lines.shortstop.array, self.lines.direction.array
+        for i in range(start, end):
+            prev = None if i == self._minperiod - 1 else (longstop[i - 1], shortstop[i - 1], direction[i - 1])
+            longstop[i], shortstop[i], direction[i] = state = self._update(ma[i], atr[i], prev)
+            mavg[i] = ma[i]
+            pmax[i] = state[0] if state[2] == 1 else state[1]
+
+
+class PMaxExplorer(bt.Strategy):
+    params = (
+        ('Periods', 10),         # ATR周期
+        ('Multiplier', 3.0),     # ATR倍数
+        ('mav', 'EMA'),          # 移动平均类型，可选：SMA, EMA, WMA, TMA, VAR, WWMA, ZLEMA, TSF
+        ('length', 10),          # 移动平均周期
+        ('changeATR', True),     # 是否采用内置 ATR 计算方式
+    )
+
+    def __init__(self):
+        # PMax 及其移动平均都是增量计算的指标，runonce 模式下整段数组一次算完
+        self.pmax = PMax(self.data, Periods=self.p.Periods, Multiplier=self.p.Multiplier, mav=self.p.mav,
+                         length=self.p.length, changeATR=self.p.changeATR)
+
+    def next(self):
+        # 交易信号判断：使用 MAvg 与 PMax 的交叉检测
+        # PineScript中用 crossover(MAvg, PMax) 作为多头信号，crossunder(MAvg, PMax) 作为空头信号
+        # 即要求：前一bar MAvg ≤ PMax 且本bar MAvg > PMax，则视作向上交叉，开多仓；
+        #      前一bar MAvg ≥ PMax 且本bar MAvg < PMax，则向下交叉，开空仓。
+        # 第一根时前一bar的值为 NaN，比较结果均为 False，不会产生信号
+        prev_MAvg = self.pmax.mavg[-1]
+        prev_PMax = self.pmax.pmax[-1]
+        MAvg = self.pmax.mavg[0]
+        PMax = self.pmax.pmax[0]
 
-        new_PMax = new_longStop if new_dir == 1 else new_shortStop
-        
-        # ---------------------------
-        # 4. 交易信号判断：使用 MAvg 与 PMax 的交叉检测  
-        #    PineScript中用 crossover(MAvg, PMax) 作为多头信号，
-        #    crossunder(MAvg, PMax) 作为空头信号
-        #    即要求：前一bar MAvg ≤ PMax 且本bar MAvg > 新PMax，则视作向上交叉，开多仓；
-        #         前一bar MAvg ≥ PMax 且本bar MAvg < 新PMax，则向下交叉，开空仓。
-        # ---------------------------
-        if self.prev_MAvg is not None and self.prev_PMax is not None:
-            if (self.prev_MAvg <= self.prev_PMax) and (MAvg > new_PMax):
-                # 多头信号：下单目标仓位设置为 100%
-                self.order_target_percent(target=1.0)
-            elif (self.prev_MAvg >= self.prev_PMax) and (MAvg < new_PMax):
-                # 空头信号：下单目标仓位设置为 -100%
-                self.order_target_percent(target=-1.0)
-        
-        # ---------------------------
-        # 5. 更新递归变量，供下一个 bar 使用
-        # ---------------------------
-        self.longStop = new_longStop
-        self.shortStop = new_shortStop
-        self.dir = new_dir
-        self.PMax = new_PMax
-        
-        self.prev_MAvg = MAvg
-        self.prev_PMax = new_PMax
+        if (prev_MAvg <= prev_PMax) and (MAvg > PMax):
+            # 多头信号：下单目标仓位设置为 100%
+            self.order_target_percent(target=1.0)
+        elif (prev_MAvg >= prev_PMax) and (MAvg < PMax):
+            # 空头信号：下单目标仓位设置为 -100%
+            self.order_target_percent(target=-1.0)
@@ -1,3 +1,5 @@
+import math
+
 import backtrader as bt
 import backtrader.indicators as btind
 from collections import OrderedDict
@@ -39,9 +41,22 @@ class RSIPAPTP(bt.Strategy):
         # RSI指标
         self.rsi = btind.RSI(self.data.close, period=self.p.rsi_length)
 
+        # 入场信号：RSI指标刚从超卖区上穿，同时价格低于均线
+        # 用线运算表达，runonce 模式下整段数组一次算完，逐根模式下逐根计算，两者结果相同
+        self.entry_signal = bt.And(self.rsi > self.p.oversold,
+                                   self.rsi(-1) <= self.p.oversold,
+                                   self.data.close < self.ma)
+
+        # 各层相对首层入场价的下跌百分比（第1层为 0）
+        self.level_offsets = (0.0, self.p.ps2, self.p.ps3, self.p.ps4, self.p.ps5, self.p.ps6, self.p.ps7, self.p.ps8)
+
         # 用于保存各层入场价格，共8层
         self.long_entries = [0.0] * 8
 
+        # 各层止盈价格的前缀最小值: tp_floor[k] 为前 k 层中最低的止盈价（tp_floor[0] 为 +inf）
+        # 持有 k 层时，只要收盘价 >= tp_floor[k] 就有某一层达到止盈
+        self.tp_floor = [math.inf] * 9
+
         # 记录目前已开仓层数（每加一仓，则 open_trades 自增）
         self.open_trades = 0
 
@@ -64,69 +79,67 @@ class RSIPAPTP(bt.Strategy):
             return self.position.price
         return 0.0
 
+    def _set_ladder(self, entry_price):
+        """首次入场时一次算出各层入场价和止盈价的前缀最小值"""
+        tp_ratio = 1 + self.p.profit_target_percent / 100
+        self.long_entries[0] = entry_price
+        for i in range(1, 8):
+            self.long_entries[i] = entry_price - entry_price * (self.level_offsets[i] / 100)
+
+        floor = math.inf
+        for i, price in enumerate(self.long_entries):
+            floor = min(floor, price * tp_ratio)
+            self.tp_floor[i + 1] = floor
+
     def next(self):
+        position_size = self.position.size
         # 如果已有持仓，更新当前持仓均价
-        if self.position.size > 0:
+        if position_size > 0:
             self.position_avg_price = self.calculate_position_avg_price()
 
-        # 计算入场信号：RSI指标刚从超卖区上穿，同时价格低于均线
-        entry_signal = (self.rsi[0] > self.p.oversold and 
-                        self.rsi[-1] <= self.p.oversold and 
-                        self.data.close[0] < self.ma[0])
-
         # 若无持仓且入场条件满足，首次入场
-        if entry_signal and self.position.size == 0:
-            entry_price = self.data.close[0]
-
-            # 记录各层入场价格：
-            self.long_entries[0] = entry_price
-            self.long_entries[1] = entry_price - entry_price * (self.p.ps2 / 100)
-            self.long_entries[2] = entry_price - entry_price * (self.p.ps3 / 100)
-            self.long_entries[3] = entry_price - entry_price * (self.p.ps4 / 100)
-            self.long_entries[4] = entry_price - entry_price * (self.p.ps5 / 100)
-            self.long_entries[5] = entry_price - entry_price * (self.p.ps6 / 100)
-            self.long_entries[6] = entry_price - entry_price * (self.p.ps7 / 100)
-            self.long_entries[7] = entry_price - entry_price * (self.p.ps8 / 100)
+        if position_size == 0:
+            if self.entry_signal[0]:
+                self._set_ladder(self.data.close[0])
 
-            # 重置加仓触发标记，标记第一层已触发
-            self.triggered_levels = [False] * 8
-            self.triggered_levels[0] = True
+                # 重置加仓触发标记，标记第一层已触发
+                self.triggered_levels = [False] * 8
+                self.triggered_levels[0] = True
 
-            # 初始建仓：目标仓位为 port/100
-            target_percent = self.p.port / 100.0
-            self.order_target_percent(target=target_percent)
+                # 初始建仓：目标仓位为 port/100
+                target_percent = self.p.port / 100.0
+                self.order_target_percent(target=target_percent)
 
-            self.open_trades = 1
-            self.first_entry = True
+                self.open_trades = 1
+                self.first_entry = True
 
-            self.buy_signal['Long1'] = True
+                self.buy_signal['Long1'] = True
 
         # 当已有持仓时，处理加仓及止盈
-        elif self.position.size > 0:
+        elif position_size > 0:
+            close = self.data.close[0]
             # ***********************
-            # 加仓条件：检查从第2层开始的入场价
-            for i in range(1, 8):
-                if (self.open_trades == i and 
-                    (not self.triggered_levels[i]) and 
-                    self.data.close[0] <= self.long_entries[i]):
-                    # 达到该层入场价则加仓，目标仓位更新为 (当前层数+1)*port/100
-                    new_target = (self.open_trades + 1) * (self.p.port / 100.0)
-                    self.order_target_percent(target=new_target)
-                    self.open_trades += 1
-                    self.triggered_levels[i] = True
-                    self.buy_signal[f'Long{i+1}'] = True
+            # 加仓条件：只需检查下一层（第 open_trades+1 层）的入场价；
+            # 加仓后层数加一，同一根K线上可以连续加多层
+            while (1 <= self.open_trades < 8 and
+                   not self.triggered_levels[self.open_trades] and
+                   close <= self.long_entries[self.open_trades]):
+                i = self.open_trades
+                # 达到该层入场价则加仓，目标仓位更新为 (当前层数+1)*port/100
+                new_target = (self.open_trades + 1) * (self.p.port / 100.0)
+                self.order_target_percent(target=new_target)
+                self.open_trades += 1
+                self.triggered_levels[i] = True
+                self.buy_signal[f'Long{i+1}'] = True
 
             # ***********************
-            # 止盈条件：改为每个仓位单独平仓
-            # 对于每一层（0 到 open_trades-1），计算该层的止盈价格
-            # 计算方法：该层入场价格 * (1 + profit_target_percent/100)
-            for i in range(self.open_trades):
-                individual_tp = self.long_entries[i] * (1 + self.p.profit_target_percent / 100)
-                if self.data.close[0] >= individual_tp:
-                    # 若当前价格达到这一层止盈目标，则减少一个入场层
-                    new_target = (self.open_trades - 1) * (self.p.port / 100.0)
-                    self.order_target_percent(target=new_target)
-                    self.open_trades -= 1
-                    self.sell_signal[f'TakeProfit_{i+1}'] = True
-                    # 一旦触发某层止盈，就退出止盈检查（一次只平一层）
-                    break
+            # 止盈条件：每个仓位单独平仓
+            # 每层止盈价 = 该层入场价格 * (1 + profit_target_percent/100)，
+            # 前 open_trades 层中任一层达到止盈就减少一个入场层（一次只平一层）
+            if self.open_trades > 0 and close >= self.tp_floor[self.open_trades]:
+                tp_ratio = 1 + self.p.profit_target_percent / 100
+                i = next(i for i in range(self.open_trades) if close >= self.long_entries[i] * tp_ratio)
+                new_target = (self.open_trades - 1) * (self.p.port / 100.0)
+                self.order_target_percent(target=new_target)
+                self.open_trades -= 1
+                self.sell_signal[f'TakeProfit_{i+1}'] = True
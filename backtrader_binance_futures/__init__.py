@@ -1,3 +1,8 @@
-from .binance_store import BinanceStore
+import sys
 import asyncio
-asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
\ No newline at end of file
+
+from .binance_store import BinanceStore
+
+# Windows 上 python-binance 需要 SelectorEventLoop；其他平台没有这个策略类，保持默认
+if sys.platform == 'win32':
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
@@ -0,0 +1,104 @@
+import math
+
+import backtrader as bt
+
+
+class LeanStats(object):
+    """
+    LeanScore 的统计结果，全部为标量
+
+    trades: 开仓交易数（与 TradeAnalyzer 的 total.total 相同，含未平仓的交易）
+    won / lost: 已平仓交易中盈利（含手续费后 >= 0）/ 亏损的笔数
+    pnl_net: 已平仓交易的含手续费净盈亏合计
+    rtot: 对数总收益（与 Returns 的 rtot 相同）
+    max_drawdown: 最大回撤百分比（与 DrawDown 的 max.drawdown 相同）
+    """
+    __slots__ = ('trades', 'won', 'lost', 'pnl_net', 'rtot', 'max_drawdown', 'value_start', 'value_end', 'peak')
+
+    def __init__(self):
+        self.trades = 0
+        self.won = 0
+        self.lost = 0
+        self.pnl_net = 0.0
+        self.rtot = 0.0
+        self.max_drawdown = 0.0
+        self.value_start = self.value_end = 0.0
+        self.peak = -math.inf
+
+    @property
+    def closed(self):
+        return self.won + self.lost
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"LeanStats({', '.join(f'{k}={v!r}' for k, v in self.as_dict().items())})"
+
+
+class LeanScore(bt.Analyzer):
+    """
+    优化试验用的精简分析器，代替 TradeAnalyzer + Returns（+ DrawDown）
+
+    TradeAnalyzer 每笔交易都要更新多层 AutoOrderedDict，交易多的策略上分析器开销占单次试验耗时的可观部分；
+    这里只维护几个标量（LeanStats），得分函数通过 get_analysis() 读取，例如
+    score_from_stats(stats.trades, stats.rtot)。
+
+    不支持子分析器: 直接覆盖 _notify_fund / _notify_trade，逐K线的 _next 等调用为空操作。
+    """
+
+    def create_analysis(self):
+        self.rets = LeanStats()
+
+    def start(self):
+        self.rets.value_start = self.strategy.broker.getvalue()
+
+    def stop(self):
+        stats = self.rets
+        stats.value_end = value_end = self.strategy.broker.getvalue()
+        # 与 Returns 相同: 账户价值不为正时对数收益为 -inf
+        try:
+            ratio = value_end / stats.value_start
+        except ZeroDivisionError:
+            stats.rtot = -math.inf
+        else:
+            stats.rtot = math.log(ratio) if ratio > 0.0 else -math.inf
+
+    def _notify_fund(self, cash, value, fundvalue, shares):
+        # 每根K线都会通知一次，在这里更新峰值和最大回撤，不再单独调用 broker.getvalue()
+        stats = self.rets
+        if value > stats.peak:
+            stats.peak = value
+        elif stats.peak > 0.0:
+            drawdown = 100.0 * (stats.peak - value) / stats.peak
+            if drawdown > stats.max_drawdown:
+                stats.max_drawdown = drawdown
+
+    def _notify_trade(self, trade):
+        stats = self.rets
+        if trade.justopened:
+            stats.trades += 1
+        elif trade.status == trade.Closed:
+            stats.pnl_net += trade.pnlcomm
+            if trade.pnlcomm >= 0.0:
+                stats.won += 1
+            else:
+                stats.lost += 1
+
+    def _notify_cashvalue(self, cash, value):
+        pass
+
+    def _notify_order(self, order):
+        pass
+
+    def _prenext(self):
+        pass
+
+    def _nextstart(self):
+        pass
+
+    def _next(self):
+        pass
+
+    def get_analysis(self):
+        return self.rets
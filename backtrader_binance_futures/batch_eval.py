@@ -0,0 +1,147 @@
+import logging
+import math
+
+import backtrader as bt
+import numpy as np
+
+from .target_simulator import _account_value
+
+# 配置日志
+logger = logging.getLogger('BatchEval')
+
+
+def preload_arrays(data):
+    """
+    预加载一个数据馈送（与 cerebro 相同的 reset/_start/preload 流程），返回 {line名: ndarray}
+
+    fromdate/todate 等过滤与回测时完全相同。对 NumpyData 等带 clone 的馈送应传入 clone()，避免改动原馈送的状态
+    """
+    bt.Cerebro().adddata(data)  # 馈送启动时需要所属的 cerebro 环境
+    data.reset()
+    data._start()
+    data.preload()
+    return {name: np.array(data.lines[i].array, dtype=np.float64)
+            for i, name in enumerate(data.getlinealiases())}
+
+
+def _split_columns(possize, size):
+    """按列拆分订单数量为 (平仓部分, 开仓部分)，规则同 target_simulator._split"""
+    same_side = (possize == 0) | ((possize > 0) == (size > 0))
+    closed = np.where(same_side, 0.0, np.where(np.abs(size) <= np.abs(possize), size, -possize))
+    return closed, size - closed
+
+
+class BatchPortfolio(object):
+    """
+    按列批量模拟多组参数的账户，每列一个独立账户，所有列在同一根K线上一起撮合
+
+    撮合规则与 target_simulator.TargetSimulator 逐位一致（即 backtrader 默认 BackBroker +
+    order_target_percent）：第 i 根收盘价定数量，第 i+1 根开盘价成交，提交时现金试算，百分比手续费。
+    策略的状态逻辑按K线循环、在列向量上计算，每根K线只有几次 NumPy 运算，与列数基本无关。
+    """
+
+    def __init__(self, arrays, columns, cash=10000.0, commission=0.0, slippage=0.0):
+        """
+        Args:
+            arrays: 含 open/high/low/close 数组的字典
+            columns: 列数（参数组数）
+        """
+        self.open = np.asarray(arrays['open'], dtype=np.float64)
+        self.high = np.asarray(arrays['high'], dtype=np.float64)
+        self.low = np.asarray(arrays['low'], dtype=np.float64)
+        self.close = np.asarray(arrays['close'], dtype=np.float64)
+        self.start_cash = cash
+        self.commission = commission
+        self.slippage = slippage
+
+        self.cash = np.full(columns, float(cash))
+        self.size = np.zeros(columns)
+        self.price = np.zeros(columns)  # 持仓均价
+        self.trades = np.zeros(columns, dtype=np.int64)  # 开仓次数，即 TradeAnalyzer 的 total.total
+
+        self._pending = []  # [(下单K线, 数量向量)]
+
+    def order_target_percent(self, i, target, mask):
+        """
+        第 i 根收盘时对 mask 为真的列下单，把仓位调整到账户价值的 target 比例（target 可为标量或向量）
+
+        同一根可以多次调用，订单按调用顺序撮合；数量与单个账户一样基于下单前的持仓和价值计算
+        """
+        self.settle(i)
+        price = self.close[i]
+        target_value = target * _account_value(self.cash, self.size, self.price, price)
+        position_value = self.size * price
+        size = np.where(target_value > position_value,
+                        np.trunc((target_value - position_value) // price),
+                        -np.trunc((position_value - target_value) // price))
+        size = np.where(target_value == 0, -self.size, size)
+        size = np.where(mask, size, 0.0)
+        if size.any():
+            self._pending.append((i, size))
+
+    def settle(self, i):
+        """撮合第 i 根之前下的订单（在下单后的第一根K线开盘成交）"""
+        if not self._pending or self._pending[0][0] >= i:
+            return
+        bar = self._pending[0][0] + 1
+        orders, self._pending = self._pending, []
+
+        # 提交检查: 以下单时的收盘价按顺序试算（持仓也跟着试算更新），现金为负的订单被拒绝
+        cash, possize = self.cash, self.size
+        accepted = []
+        for created, size in orders:
+            pprice = self.close[created]
+            closed, opened = _split_columns(possize, size)
+            possize = possize + size
+            cash = cash + -closed * pprice
+            cash = cash - np.abs(closed) * self.commission * pprice
+            cash = cash - opened * pprice
+            cash = cash - np.abs(opened) * self.commission * pprice
+            accepted.append(np.where(cash >= 0.0, size, 0.0))
+
+        for size in accepted:
+            self._execute(bar, size)
+
+    def _execute(self, bar, size):
+        price = self.open[bar]
+        if self.slippage:
+            price = np.where(size > 0, min(price * (1 + self.slippage), self.high[bar]),
+                             max(price * (1 - self.slippage), self.low[bar]))
+        else:
+            price = np.full(len(size), price)
+
+        # 现金的计算顺序与 TargetSimulator._execute（即 BackBroker._execute）相同，结果逐位一致
+        closed, opened = _split_columns(self.size, size)
+        pnl = -closed * (price - self.price) * 1.0
+        self.cash = (self.cash + (-closed * self.price + pnl)) - np.abs(closed) * self.commission * price
+        self.size = self.size + closed
+        self.price = np.where(self.size == 0, 0.0, self.price)
+
+        # 开仓部分现金不足时不成交
+        cash = (self.cash - opened * price) - np.abs(opened) * self.commission * price
+        ok = (opened != 0) & (cash >= 0.0)
+        opening = ok & (self.size == 0)
+        self.trades += opening
+        self.cash = np.where(ok, cash, self.cash)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            average = (self.price * self.size + price * opened) / (self.size + opened)
+        self.price = np.where(opening, price, np.where(ok, average, self.price))
+        self.size = np.where(ok, self.size + opened, self.size)
+
+    def value(self, i):
+        """第 i 根收盘时各列的账户价值"""
+        self.settle(i)
+        return _account_value(self.cash, self.size, self.price, self.close[i])
+
+    def result(self):
+        """撮合到最后一根为止，返回 {'final_value', 'num_trades', 'rtot', 'total_return'}，每项为长度等于列数的数组"""
+        final_value = self.value(len(self.close) - 1)
+        # 逐列用 math.log，与 Returns 分析器的 rtot 逐位一致（np.log 的末位可能不同）
+        rtot = np.array([math.log(v / self.start_cash) if v > 0 else -math.inf for v in final_value.tolist()])
+        return {
+            'final_value': final_value,
+            'num_trades': self.trades.copy(),
+            'rtot': rtot,
+            'total_return': (final_value / self.start_cash - 1) * 100,
+        }
+
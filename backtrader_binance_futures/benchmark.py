@@ -0,0 +1,282 @@
+import argparse
+import importlib.util
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+import backtrader as bt
+import numpy as np
+from backtrader.utils import date2num
+
+from .analyzers import LeanScore
+from .batch_eval import preload_arrays
+from .numpy_feed import NumpyData
+
+# 配置日志
+logger = logging.getLogger('Benchmark')
+
+# 仓库根目录（策略在 BacktestsOptimization/<策略目录>/<策略名>.py）
+# 只有在仓库中运行时存在，安装后的包里没有策略目录，需要用 root / --root 指定
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_STRATEGY_ROOT = REPO_ROOT / 'BacktestsOptimization'
+
+# 默认参数在合成数据上不开仓的策略改用这些参数（入场阈值按合成数据的波动调小），
+# 基准测试和等价性检查都用它们，否则测量/检查不到下单和成交的部分
+SYNTHETIC_PARAMS = {
+    'BollingerBandRSI': {'initial_percent': 0.2, 'percent_step': 0.2, 'long_tp': 0.01, 'long_sl': 0.02},
+    'MA_DCA': {'initial_percent': 1, 'percent_step': 0.5},
+}
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不统计峰值内存
+    resource = None
+
+
+def synthetic_arrays(bars, seed=0, start=datetime(2024, 1, 1), minutes=1, price=100.0, volatility=0.002):
+    """
+    生成确定性的合成 OHLCV 数组（与 bars_to_arrays 的格式相同），相同参数每次结果完全一样
+
+    收盘价为对数正态随机游走，开盘价为上一根收盘价，最高/最低价在开收盘之外随机扩展
+    """
+    rng = np.random.default_rng(seed)
+    close = price * np.exp(np.cumsum(rng.normal(0.0, volatility, bars)))
+    open_ = np.concatenate([[price], close[:-1]])
+    wick = np.abs(rng.normal(0.0, volatility / 2, (2, bars)))
+    arrays = {
+        'datetime': date2num(start) + np.arange(bars) * (minutes / 1440.0),
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + wick[0]),
+        'low': np.minimum(open_, close) * (1 - wick[1]),
+        'close': close,
+        'volume': rng.lognormal(3.0, 1.0, bars),
+    }
+    for values in arrays.values():
+        values.flags.writeable = False
+    return arrays
+
+
+def discover_strategies(root=DEFAULT_STRATEGY_ROOT):
+    """
+    查找 root 下各策略目录中的回测策略: <目录>/<名称>.py 中定义的同名 bt.Strategy 子类（不含 *_Live.py）
+
+    Returns:
+        list: [(策略名, 文件路径)]
+
+    Raises:
+        FileNotFoundError: root 不是目录（例如安装后的包中没有 BacktestsOptimization，需要指定策略目录）
+    """
+    if not Path(root).is_dir():
+        raise FileNotFoundError(f"策略目录不存在: {root}（不在仓库中运行时请用 --root 指定策略目录）")
+    found = []
+    for path in sorted(Path(root).glob('*/*.py')):
+        if path.stem.endswith('_Live'):
+            continue
+        source = path.read_text(encoding='utf-8', errors='ignore')
+        if f'class {path.stem}(' in source:
+            found.append((path.stem, str(path)))
+    return found
+
+
+def load_strategy(name, path):
+    """按文件路径导入策略模块（与回测 notebook 一样把策略目录加入 sys.path）"""
+    directory = os.path.dirname(path)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return getattr(module, name)
+
+
+def _peak_rss():
+    """本进程的峰值常驻内存（字节），不支持时为 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # Linux 单位为 KB
+
+
+def _run_trial(arrays, strategy_cls, params=None):
+    """
+    按优化器的方式跑一次试验（与 optimize_strategy 的 objective 相同的 cerebro 设置和分析器）
+
+    Returns:
+        tuple: (耗时, 平仓交易数)
+    """
+    start = time.perf_counter()
+    cerebro = bt.Cerebro(optdatas=True, optreturn=True, runonce=True, preload=True)
+    cerebro.adddata(NumpyData(dataname=arrays))
+    cerebro.addstrategy(strategy_cls, **(params or {}))
+    cerebro.addanalyzer(LeanScore, _name='score')
+    strat = cerebro.run()[0]
+    return time.perf_counter() - start, strat.analyzers.score.get_analysis().trades
+
+
+def bench_strategy(name, path, bars, seed=0, repeat=3, params=None):
+    """
+    在当前进程中测量一个策略（path 为 None 时测量空策略，即每个试验的固定开销）
+
+    params 默认取 SYNTHETIC_PARAMS 中的参数（没有则用策略默认参数），与等价性检查相同。
+
+    Returns:
+        dict: preload_s（预加载耗时）、run_s（单次试验耗时，取 repeat 次中最快的一次）、
+              run_mean_s、bars_per_sec、trades（交易数，为 0 时只测到了指标部分）、peak_rss（字节）
+    """
+    arrays = synthetic_arrays(bars, seed=seed)
+    strategy_cls = bt.Strategy if path is None else load_strategy(name, path)
+    params = SYNTHETIC_PARAMS.get(name, {}) if params is None else params
+
+    start = time.perf_counter()
+    preload_arrays(NumpyData(dataname=arrays))
+    preload_s = time.perf_counter() - start
+
+    runs, trades = zip(*[_run_trial(arrays, strategy_cls, params) for _ in range(repeat)])
+    run_s = min(runs)
+    return {
+        'bars': bars,
+        'params': params,
+        'trades': trades[0],
+        'preload_s': preload_s,
+        'run_s': run_s,
+        'run_mean_s': sum(runs) / len(runs),
+        'bars_per_sec': bars / run_s if run_s > 0 else math.inf,
+        'peak_rss': _peak_rss(),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(bars=100000, seed=0, repeat=3, names=None, root=DEFAULT_STRATEGY_ROOT):
+    """
+    逐个策略测量吞吐量，每个策略在单独的子进程中运行（峰值内存互不影响，导入的模块也不会互相缓存）
+
+    trial_overhead_s 为空策略单次试验的耗时（创建 cerebro、预加载、分析器等固定开销），
+    各策略的 strategy_s = run_s - trial_overhead_s 即策略本身（指标 + next）的耗时。
+
+    Returns:
+        dict: {'meta': {...}, 'trial_overhead_s': float, 'results': {策略名: {...}}}
+    """
+    strategies = [(name, path) for name, path in discover_strategies(root) if not names or name in names]
+    missing = set(names or ()) - {name for name, _ in strategies}
+    if missing:
+        raise ValueError(f"{root} 中没有这些策略: {sorted(missing)}")
+    context = get_context('spawn')
+
+    def isolated(name, path):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            return executor.submit(bench_strategy, name, path, bars, seed, repeat).result()
+
+    overhead = isolated('noop', None)
+    logger.info(f"空策略: 单次试验 {overhead['run_s']:.3f}s，预加载 {overhead['preload_s']:.3f}s")
+
+    results = {}
+    for name, path in strategies:
+        try:
+            result = isolated(name, path)
+        except Exception as e:
+            logger.error(f"{name} 运行失败: {e}")
+            results[name] = {'error': repr(e)}
+            continue
+        result['strategy_s'] = max(result['run_s'] - overhead['run_s'], 0.0)
+        results[name] = result
+        logger.info(f"{name}: {result['bars_per_sec']:,.0f} bars/s，单次试验 {result['run_s']:.3f}s，{result['trades']} 笔交易")
+        if not result['trades']:
+            logger.warning(f"{name} 在合成数据上没有交易，结果只反映指标计算的耗时")
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'backtrader': getattr(bt, '__version__', None),
+            'numpy': np.__version__,
+            'bars': bars,
+            'seed': seed,
+            'repeat': repeat,
+        },
+        'trial_overhead_s': overhead['run_s'],
+        'noop': overhead,
+        'results': results,
+    }
+
+
+def compare(baseline, current):
+    """对比两次结果的吞吐量，返回 {策略名: 当前 bars/sec ÷ 基准 bars/sec}（>1 表示变快）"""
+    for key in ('bars', 'seed'):
+        if baseline['meta'].get(key) != current['meta'].get(key):
+            logger.warning(f"两次结果的 {key} 不同（{baseline['meta'].get(key)} / {current['meta'].get(key)}），对比仅供参考")
+    ratios = {}
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base and 'bars_per_sec' in base and 'bars_per_sec' in result:
+            ratios[name] = result['bars_per_sec'] / base['bars_per_sec']
+    return ratios
+
+
+def format_report(report, ratios=None):
+    lines = [f"commit={report['meta']['commit']} bars={report['meta']['bars']} "
+             f"trial_overhead={report['trial_overhead_s']:.3f}s"]
+    lines.append(f"{'strategy':<20}{'bars/sec':>14}{'trades':>8}{'run_s':>10}{'preload_s':>11}{'peak_MB':>10}"
+                 + (f"{'vs base':>10}" if ratios is not None else ''))
+    for name, result in report['results'].items():
+        if 'error' in result:
+            lines.append(f"{name:<20}  error: {result['error']}")
+            continue
+        peak = result['peak_rss'] / 1024 ** 2 if result['peak_rss'] else float('nan')
+        line = f"{name:<20}{result['bars_per_sec']:>14,.0f}{result.get('trades', '-'):>8}{result['run_s']:>10.3f}{result['preload_s']:>11.3f}{peak:>10.1f}"
+        if ratios is not None:
+            line += f"{ratios[name]:>9.2f}x" if name in ratios else f"{'-':>10}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='回测吞吐量基准测试（合成数据，离线运行）')
+    parser.add_argument('--bars', type=int, default=100000, help='合成K线数量')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据的随机种子')
+    parser.add_argument('--repeat', type=int, default=3, help='每个策略重复试验次数（取最快一次）')
+    parser.add_argument('--strategies', nargs='*', help='只测量这些策略（默认全部）')
+    parser.add_argument('--root', default=str(DEFAULT_STRATEGY_ROOT),
+                        help='策略目录（默认为仓库中的 BacktestsOptimization，安装后运行时必须指定）')
+    parser.add_argument('--output', help='结果 JSON 路径（默认 benchmark_<commit>.json）')
+    parser.add_argument('--compare', help='与之前保存的结果 JSON 对比')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.root):
+        parser.error(f"策略目录不存在: {args.root}，请用 --root 指定")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    report = run_benchmarks(args.bars, args.seed, args.repeat, args.strategies, args.root)
+
+    output = args.output or f"benchmark_{report['meta']['commit'] or 'local'}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    ratios = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            ratios = compare(json.load(f), report)
+    print(format_report(report, ratios))
+    print(f"结果已保存到 {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import logging
+import os
+import sys
+
+from .benchmark import DEFAULT_STRATEGY_ROOT, SYNTHETIC_PARAMS, discover_strategies, load_strategy, synthetic_arrays
+from .target_simulator import compare_with_cerebro
+
+# 配置日志
+logger = logging.getLogger('Equivalence')
+
+DEFAULT_COMMISSIONS = (0.0, 0.0004)
+
+
+def check_strategy(name, path, arrays, commissions=DEFAULT_COMMISSIONS, params=None):
+    """
+    用 compare_with_cerebro 检查一个策略: TargetSimulator 回放其 order_target_percent 调用的结果
+    与 cerebro.run() 逐笔成交、交易数和最终账户价值完全一致
+
+    没有任何成交也算不通过（检查没有覆盖到下单逻辑）。
+
+    Returns:
+        list: 每个手续费设置一个结果字典
+    """
+    strategy_cls = load_strategy(name, path)
+    params = SYNTHETIC_PARAMS.get(name, {}) if params is None else params
+    rows = []
+    for commission in commissions:
+        report = compare_with_cerebro(strategy_cls, arrays, params=params, commission=commission)
+        rows.append({
+            'strategy': name,
+            'commission': commission,
+            'ok': report['match'] and report['fills'] > 0,
+            'fills': report['fills'],
+            'cerebro_value': report['cerebro_value'],
+            'simulated_value': report['simulated_value'],
+            'cerebro_trades': report['cerebro_trades'],
+            'simulated_trades': report['simulated_trades'],
+            'first_mismatch': report['first_mismatch'],
+        })
+    return rows
+
+
+def run_checks(bars=20000, seed=0, names=None, root=DEFAULT_STRATEGY_ROOT, commissions=DEFAULT_COMMISSIONS):
+    """在合成数据上逐个检查 root 下的回测策略，返回所有结果行"""
+    arrays = synthetic_arrays(bars, seed=seed)
+    strategies = [(name, path) for name, path in discover_strategies(root) if not names or name in names]
+    missing = set(names or ()) - {name for name, _ in strategies}
+    if missing:
+        raise ValueError(f"{root} 中没有这些策略: {sorted(missing)}")
+    rows = []
+    for name, path in strategies:
+        try:
+            rows.extend(check_strategy(name, path, arrays, commissions))
+        except Exception as e:
+            logger.error(f"{name} 运行失败: {e}")
+            rows.append({'strategy': name, 'ok': False, 'error': repr(e)})
+    return rows
+
+
+def format_report(rows):
+    lines = [f"{'strategy':<20}{'commission':>11}{'fills':>8}{'trades':>8}{'cerebro':>14}{'simulated':>14}  result"]
+    for row in rows:
+        if 'error' in row:
+            lines.append(f"{row['strategy']:<20}  error: {row['error']}")
+            continue
+        if row['ok']:
+            result = 'ok'
+        elif not row['fills']:
+            result = 'FAIL: 没有成交'
+        else:
+            result = f"FAIL: {row['first_mismatch']}"
+        lines.append(f"{row['strategy']:<20}{row['commission']:>11g}{row['fills']:>8}{row['cerebro_trades']:>8}"
+                     f"{row['cerebro_value']:>14.4f}{row['simulated_value']:>14.4f}  {result}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='目标仓位模拟器与 cerebro 的等价性检查（合成数据，离线运行）')
+    parser.add_argument('--bars', type=int, default=20000, help='合成K线数量')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据的随机种子')
+    parser.add_argument('--strategies', nargs='*', help='只检查这些策略（默认全部）')
+    parser.add_argument('--root', default=str(DEFAULT_STRATEGY_ROOT),
+                        help='策略目录（默认为仓库中的 BacktestsOptimization，安装后运行时必须指定）')
+    parser.add_argument('--commissions', type=float, nargs='*', default=list(DEFAULT_COMMISSIONS), help='手续费率')
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.root):
+        parser.error(f"策略目录不存在: {args.root}，请用 --root 指定")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    rows = run_checks(args.bars, args.seed, args.strategies, args.root, args.commissions)
+    print(format_report(rows))
+    failed = [row['strategy'] for row in rows if not row['ok']]
+    if failed:
+        print(f"不一致: {sorted(set(failed))}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
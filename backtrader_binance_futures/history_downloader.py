@@ -0,0 +1,402 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+from requests.exceptions import ConnectionError, Timeout
+
+from .history_store import HistoryStore, OHLCV_COLUMNS, csv_day_path, normalize_symbol
+from .manifest import DataManifest
+
+# 配置日志
+logger = logging.getLogger('HistoryDownloader')
+
+# 币安U本位合约 REST 地址；离线测试时可改为本地模拟K线服务的地址
+FUTURES_BASE_URL = 'https://fapi.binance.com'
+
+# 币安U本位合约默认每分钟请求权重上限（以 exchangeInfo 中的 REQUEST_WEIGHT 为准）
+DEFAULT_WEIGHT_LIMIT = 2400
+
+# 单次 klines 请求的最大根数
+MAX_KLINES_LIMIT = 1500
+
+_INTERVAL_RE = re.compile(r'^(\d+)([mhdw])$')
+_INTERVAL_UNIT_MS = {'m': 60000, 'h': 3600000, 'd': 86400000, 'w': 7 * 86400000}
+
+# 一个下载任务: 交易对（如 'BTCUSDT'）、币安周期、日期字符串、当天起始毫秒时间戳（断点续传时为缺失部分的起点）
+DownloadTask = namedtuple('DownloadTask', ['symbol', 'interval', 'date', 'start_ms'])
+
+
+def interval_ms(interval):
+    """币安周期字符串（'1m'、'15m'、'1h'、'1d'）对应的毫秒数"""
+    match = _INTERVAL_RE.match(interval)
+    if not match:
+        raise ValueError(f"不支持的周期: {interval}")
+    return int(match.group(1)) * _INTERVAL_UNIT_MS[match.group(2)]
+
+
+def klines_weight(limit):
+    """GET /fapi/v1/klines 的请求权重，随 limit 分档"""
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+class TokenBucket(object):
+    """
+    线程安全的令牌桶，按请求权重限速
+
+    容量为每分钟可用的权重，按 容量/60 每秒匀速补充。sync() 用响应头中服务器统计的已用权重校正本地估计，
+    pause() 在收到 429/418 时让所有线程暂停到 Retry-After 之后。
+    """
+
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def acquire(self, weight=1):
+        """取走 weight 个令牌，不足时阻塞等待"""
+        weight = min(weight, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                else:
+                    wait = (weight - self.tokens) / self.refill_per_second
+            time.sleep(wait)
+
+    def sync(self, used_weight):
+        """服务器统计的本分钟已用权重比本地估计多时（例如同一 IP 上还有其他程序），收紧剩余令牌"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, max(0.0, self.capacity - used_weight))
+
+    def pause(self, seconds):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._paused_until = max(self._paused_until, now + seconds)
+            self.tokens = 0.0
+
+
+class HistoryDownloader(object):
+    """
+    并发下载币安U本位合约历史K线，直接写入按日CSV目录（并登记到 manifest.sqlite）
+
+    - 以 (交易对, 周期, 日期) 为任务并发请求，所有线程共享一个按请求权重计费的令牌桶，
+      代替逐个请求之后 time.sleep(0.9)
+    - 清单中已完整的日期直接跳过；当天未结束时写入的文件在下次运行时只补下载缺失的部分
+    - 上市前、交割后的日期根据 exchangeInfo 的 onboardDate/deliveryDate 跳过
+    - 指定 store_path 时同时写入 HistoryStore 列式存储
+    - base_url 可指向本地模拟K线服务，便于离线测试
+
+    下载线程只负责请求和写CSV；清单和列式存储只在调用 run() 的线程中写入。
+    """
+
+    def __init__(self, data_path, base_url=FUTURES_BASE_URL, workers=8, weight_limit=DEFAULT_WEIGHT_LIMIT,
+                 weight_fraction=0.8, limit=MAX_KLINES_LIMIT, proxies=None, timeout=10, max_retries=5,
+                 store_path=None, store_flush_rows=500000, session=None):
+        """
+        Args:
+            weight_fraction: 只使用权重上限的这一比例，给同一 IP 上的其他程序（如实盘）留出余量
+            limit: 单次请求的K线根数，1m 数据用 1500 可以一次取完一天
+            store_flush_rows: 写入列式存储前每个交易对最多缓存的行数
+        """
+        self.data_path = data_path
+        self.base_url = base_url.rstrip('/')
+        self.workers = workers
+        self.limit = min(limit, MAX_KLINES_LIMIT)
+        self.proxies = proxies
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.store = HistoryStore(store_path) if store_path else None
+        self.store_flush_rows = store_flush_rows
+        self.session = session or requests.Session()
+        capacity = weight_limit * weight_fraction
+        self.bucket = TokenBucket(capacity, capacity / 60.0)
+        self.stop_event = threading.Event()
+        self.manifest = DataManifest.for_data_path(data_path, create=True)
+
+    def close(self):
+        self.manifest.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def stop(self):
+        """请求停止：未开始的任务取消，进行中的任务完成后退出"""
+        self.stop_event.set()
+
+    # ---------- 请求 ----------
+
+    def _get(self, path, params=None, weight=1):
+        """带限速和重试的 GET，返回解析后的 JSON"""
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire(weight)
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout, proxies=self.proxies)
+            except (ConnectionError, Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"请求 {path} 失败: {str(e)}，{2 ** attempt}秒后重试")
+                time.sleep(2 ** attempt)
+                continue
+
+            used_weight = response.headers.get('X-MBX-USED-WEIGHT-1M')
+            if used_weight is not None:
+                self.bucket.sync(int(used_weight))
+
+            if response.status_code in (418, 429):
+                # 429 超出权重限制；418 为继续超限后被临时封禁 IP，必须等到 Retry-After 之后
+                retry_after = int(response.headers.get('Retry-After', 60))
+                logger.warning(f"触发限速 ({response.status_code})，所有请求暂停 {retry_after}秒")
+                self.bucket.pause(retry_after)
+                continue
+            if response.status_code >= 500 and attempt < self.max_retries:
+                logger.warning(f"请求 {path} 返回 {response.status_code}，{2 ** attempt}秒后重试")
+                time.sleep(2 ** attempt)
+                continue
+            response.raise_for_status()
+            return response.json()
+        raise RuntimeError(f"请求 {path} 重试 {self.max_retries} 次后仍被限速")
+
+    def exchange_symbols(self):
+        """
+        全部U本位永续合约（含已下架的）的上市和交割时间
+
+        Returns:
+            dict: {symbol: (onboard_ms, delivery_ms)}，如 {'BTCUSDT': (1569398400000, 4133404800000)}
+        """
+        info = self._get('/fapi/v1/exchangeInfo', weight=1)
+        return {
+            s['symbol']: (int(s.get('onboardDate', 0)), int(s.get('deliveryDate', 0)) or None)
+            for s in info['symbols']
+            if s.get('contractType') == 'PERPETUAL' and s.get('quoteAsset') == 'USDT'
+        }
+
+    def fetch_klines(self, symbol, interval, start_ms, end_ms):
+        """
+        分页获取 [start_ms, end_ms) 的K线
+
+        Returns:
+            list: 币安原始K线数组 [开盘时间, open, high, low, close, volume, ...]
+        """
+        rows = []
+        weight = klines_weight(self.limit)
+        since = start_ms
+        while since < end_ms:
+            data = self._get('/fapi/v1/klines', {
+                'symbol': symbol,
+                'interval': interval,
+                'startTime': since,
+                'endTime': end_ms - 1,
+                'limit': self.limit,
+            }, weight=weight)
+            if not data:
+                break
+            rows.extend(data)
+            if len(data) < self.limit:
+                break
+            since = int(data[-1][0]) + 1
+        return rows
+
+    # ---------- 任务 ----------
+
+    def plan(self, symbols, start_date, end_date, intervals=('1m',), listing=None):
+        """
+        生成待下载任务：跳过清单中已完整的日期，未完整的日期从最后一根K线之后续传
+
+        Args:
+            listing: exchange_symbols() 的结果，用于跳过上市前和交割后的日期
+
+        Returns:
+            list: DownloadTask 列表（按交易对、周期、日期排序）
+        """
+        now_ms = int(time.time() * 1000)
+        days = pd.date_range(start=start_date, end=end_date, freq='D')
+        tasks = []
+        for symbol in symbols:
+            symbol = normalize_symbol(symbol)
+            onboard_ms, delivery_ms = (listing or {}).get(symbol, (0, None))
+            for interval in intervals:
+                step = interval_ms(interval)
+                for day in days:
+                    date_str = day.strftime('%Y-%m-%d')
+                    day_start = int(day.timestamp() * 1000)
+                    day_end = day_start + 86400000
+                    if day_end <= onboard_ms or day_start >= now_ms or (delivery_ms and day_start >= delivery_ms):
+                        continue
+                    start_ms = self._resume_from(symbol, interval, date_str, day_start, day_end, step)
+                    if start_ms is not None:
+                        tasks.append(DownloadTask(symbol, interval, date_str, start_ms))
+        return tasks
+
+    def _resume_from(self, symbol, interval, date_str, day_start, day_end, step):
+        """返回该日需要开始下载的时间戳，已完整时返回 None"""
+        entry = self.manifest.entry(symbol, interval, date_str)
+        if entry is None:
+            file_path = csv_day_path(self.data_path, date_str, symbol, interval)
+            if not os.path.exists(file_path):
+                return day_start
+            # 文件存在但清单中没有（旧版下载器写入的），补登记
+            self.manifest.record_file(file_path)
+            entry = self.manifest.entry(symbol, interval, date_str)
+
+        if entry['last_ts'] is None:
+            return day_start
+        last_ms = int(pd.Timestamp(entry['last_ts']).timestamp() * 1000)
+        if last_ms + step >= day_end:
+            return None
+        # 当天结束之后写入的文件即使不满（上市当天或下架），也已是完整数据
+        if entry['mtime_ns'] is not None and entry['mtime_ns'] // 1000000 >= day_end:
+            return None
+        return last_ms + step
+
+    def download(self, task):
+        """
+        执行一个任务：请求K线、与已有的部分文件合并后写入按日CSV（在下载线程中执行）
+
+        Returns:
+            tuple: (file_path, df)，当天没有数据时 df 为 None
+        """
+        day_start = int(pd.Timestamp(task.date).timestamp() * 1000)
+        rows = self.fetch_klines(task.symbol, task.interval, task.start_ms, day_start + 86400000)
+        file_path = csv_day_path(self.data_path, task.date, task.symbol, task.interval)
+        if not rows:
+            return file_path, None
+
+        df = pd.DataFrame([row[:6] for row in rows], columns=['datetime', *OHLCV_COLUMNS])
+        df['datetime'] = pd.to_datetime(df['datetime'].astype('int64'), unit='ms')
+        for col in OHLCV_COLUMNS:
+            df[col] = df[col].astype('float64')
+
+        if task.start_ms > day_start and os.path.exists(file_path):
+            existing = pd.read_csv(file_path, usecols=['datetime', *OHLCV_COLUMNS], parse_dates=['datetime'])
+            df = pd.concat([existing, df], ignore_index=True)
+        df = df.drop_duplicates(subset=['datetime'], keep='last').sort_values('datetime').reset_index(drop=True)
+        df['datetime'] = df['datetime'].dt.strftime('%Y-%m-%d %H:%M:%S')
+
+        # 先写临时文件再原子替换，中断时不会留下写了一半的文件
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, file_path)
+        return file_path, df
+
+    def run(self, symbols=None, start_date=None, end_date=None, intervals=('1m',), progress=None):
+        """
+        下载 [start_date, end_date] 内缺失的数据
+
+        Args:
+            symbols: 交易对列表（'BTCUSDT' 或 'BTC/USDT:USDT'），为 None 时下载全部U本位永续合约
+            progress: 回调 progress(task, status, rows)，每完成一个任务调用一次
+
+        Returns:
+            dict: {'downloaded': 写入文件数, 'rows': 新写入行数, 'empty': [无数据的任务], 'failed': [(任务, 错误)],
+                   'skipped': 已完整跳过的 (交易对, 周期, 日期) 数, 'interrupted': 是否被中断}
+        """
+        listing = self.exchange_symbols()
+        if symbols is None:
+            symbols = sorted(listing)
+        end_date = end_date or pd.Timestamp.now(tz='UTC').strftime('%Y-%m-%d')
+        tasks = self.plan(symbols, start_date, end_date, intervals, listing)
+        total = len(symbols) * len(intervals) * len(pd.date_range(start=start_date, end=end_date, freq='D'))
+        logger.info(f"{len(symbols)} 个交易对，待下载 {len(tasks)} 个 交易对/日期")
+        summary = self.run_tasks(tasks, progress)
+        summary['skipped'] = total - len(tasks)
+        return summary
+
+    def run_tasks(self, tasks, progress=None):
+        """并发执行下载任务（参见 run），清单和列式存储在当前线程中更新"""
+        summary = {'downloaded': 0, 'rows': 0, 'empty': [], 'failed': [], 'skipped': 0, 'interrupted': False}
+        store_buffer = {}  # {(symbol, interval): [df, ...]}
+        start = time.time()
+
+        def run_task(task):
+            if self.stop_event.is_set():
+                return None
+            return self.download(task)
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        futures = {executor.submit(run_task, task): task for task in tasks}
+        try:
+            for future in as_completed(futures):
+                task = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    summary['failed'].append((task, str(e)))
+                    logger.error(f"下载失败 {task.symbol} {task.interval} {task.date}: {str(e)}")
+                    if progress:
+                        progress(task, f"失败: {e}", 0)
+                    continue
+                if result is None:
+                    continue
+
+                file_path, df = result
+                if df is None:
+                    summary['empty'].append(task)
+                    if progress:
+                        progress(task, '无数据', 0)
+                    continue
+
+                self.manifest.record_file(file_path, df)
+                summary['downloaded'] += 1
+                summary['rows'] += len(df)
+                if self.store is not None:
+                    self._buffer_store(store_buffer, task, df)
+                if progress:
+                    progress(task, '成功', len(df))
+        except BaseException:
+            # 包括 KeyboardInterrupt：已写入的文件都已登记，剩余任务取消，下次运行时续传
+            self.stop()
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            summary['interrupted'] = self.stop_event.is_set()
+            if self.store is not None:
+                for key in list(store_buffer):
+                    self._flush_store(store_buffer, key)
+
+        logger.info(f"下载完成: {summary['downloaded']} 个文件, {summary['rows']} 行, 无数据 {len(summary['empty'])} 个, "
+                    f"失败 {len(summary['failed'])} 个, 耗时 {time.time() - start:.1f}秒")
+        return summary
+
+    def _buffer_store(self, store_buffer, task, df):
+        key = (task.symbol, task.interval)
+        store_buffer.setdefault(key, []).append(df)
+        if sum(len(frame) for frame in store_buffer[key]) >= self.store_flush_rows:
+            self._flush_store(store_buffer, key)
+
+    def _flush_store(self, store_buffer, key):
+        """按交易对批量写入列式存储，避免每天重写一次月份分区"""
+        frames = store_buffer.pop(key, None)
+        if frames:
+            symbol, interval = key
+            self.store.write(symbol, pd.concat(frames, ignore_index=True), interval=interval)
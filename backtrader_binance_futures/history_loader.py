@@ -0,0 +1,279 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from pandas.tseries.frequencies import to_offset
+from pandas.tseries.offsets import Tick
+
+from .history_store import HistoryStore, OHLCV_COLUMNS, csv_day_path, pandas_freq
+from .resample_cache import ResampleCache, fingerprint_files
+from .sqlite_feed import read_sqlite_bars
+
+# 配置日志
+logger = logging.getLogger('HistoryLoader')
+
+# 读取按日CSV的默认并发线程数（网络共享目录上主要耗时在访问延迟）
+DEFAULT_IO_WORKERS = 16
+
+
+def load_minute_bars(symbol, start_date, end_date, source_timeframe='1m', data_path=None, store_path=None,
+                     columns=None, io_workers=DEFAULT_IO_WORKERS, db_path=None):
+    """
+    读取 [start_date, end_date] 的源周期K线（日期按整日包含）
+
+    数据源优先级：
+    1. store_path: Parquet 列式存储，只读请求的列和日期范围
+    2. db_path: csv_to_sqlite 生成的 SQLite 历史库，一次索引范围查询
+    3. data_path: 按日CSV目录（并发读取，缺失的日期汇总记录到日志）
+
+    Returns:
+        DataFrame: 以 datetime 为索引（不带时区）、列为 open/high/low/close/volume 的 DataFrame
+    """
+    columns = list(columns or OHLCV_COLUMNS)
+
+    if store_path:
+        df = HistoryStore(store_path, interval=source_timeframe).load(symbol, start_date, end_date, columns=columns)
+        if not df.empty:
+            return df
+        logger.warning(f"列式存储 {store_path} 中没有 {symbol} 的数据，回退到下一个数据源")
+
+    if db_path:
+        try:
+            ts, values = read_sqlite_bars(db_path, symbol, start_date, end_date, interval=source_timeframe)
+        except ValueError as e:
+            ts = []
+            logger.warning(f"{e}，回退到按日CSV")
+        if len(ts):
+            df = pd.DataFrame(values, columns=list(OHLCV_COLUMNS),
+                              index=pd.DatetimeIndex(ts.view('datetime64[ns]'), name='datetime'))
+            return df[columns]
+        logger.warning(f"SQLite 历史库 {db_path} 中没有 {symbol} 的数据，回退到按日CSV")
+
+    if data_path is None:
+        raise ValueError(f"未找到 {symbol} 在指定日期范围内的数据")
+
+    combined_df, missing_days = read_daily_csv(symbol, start_date, end_date, source_timeframe, data_path,
+                                               columns=columns, io_workers=io_workers)
+    if missing_days:
+        logger.warning(f"{symbol} 有 {len(missing_days)} 天的数据缺失或读取失败: "
+                       f"{', '.join(item['date'] for item in missing_days[:10])}"
+                       f"{' ...' if len(missing_days) > 10 else ''}")
+    if combined_df.empty:
+        raise ValueError(f"未找到 {symbol} 在指定日期范围内的数据")
+    return combined_df
+
+
+def _read_csv_day(file_path, columns):
+    """用 pyarrow 读取单个按日CSV；datetime 先按字符串读入，合并后统一解析，与 pd.to_datetime 行为一致"""
+    table = pacsv.read_csv(
+        file_path,
+        convert_options=pacsv.ConvertOptions(
+            include_columns=['datetime', *columns],
+            column_types={'datetime': pa.string(), **{col: pa.float64() for col in columns}},
+        ),
+    )
+    return table.to_pandas()
+
+
+def read_daily_csv(symbol, start_date, end_date, source_timeframe='1m', data_path=None, columns=None,
+                   io_workers=DEFAULT_IO_WORKERS):
+    """
+    并发读取 [start_date, end_date] 的按日CSV（适合网络共享目录，每个文件都有较高的访问延迟）
+
+    Args:
+        io_workers: I/O 线程数上限
+
+    Returns:
+        tuple: (DataFrame, missing_days)
+            DataFrame 以 datetime 为索引（不带时区）、按日期顺序合并；没有任何数据时为空 DataFrame
+            missing_days 为 [{'date': 'YYYY-MM-DD', 'path': 文件路径, 'reason': 'missing'|'error', 'error': 错误信息}]
+    """
+    columns = list(columns or OHLCV_COLUMNS)
+    dates = [date.strftime('%Y-%m-%d') for date in pd.date_range(start=start_date, end=end_date, freq='D')]
+    paths = [csv_day_path(data_path, date_str, symbol, source_timeframe) for date_str in dates]
+
+    def read_one(file_path):
+        try:
+            return _read_csv_day(file_path, columns), None
+        except FileNotFoundError:
+            return None, ('missing', None)
+        except Exception as e:
+            return None, ('error', str(e))
+
+    # executor.map 按提交顺序返回结果，合并后仍保持日期顺序
+    with ThreadPoolExecutor(max_workers=max(1, min(io_workers, len(paths)))) as executor:
+        results = list(executor.map(read_one, paths))
+
+    all_data = []
+    missing_days = []
+    for date_str, file_path, (df, failure) in zip(dates, paths, results):
+        if failure is None:
+            all_data.append(df)
+        else:
+            reason, error = failure
+            missing_days.append({'date': date_str, 'path': file_path, 'reason': reason, 'error': error})
+
+    if not all_data:
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='datetime')), missing_days
+
+    # 合并、排序
+    combined_df = pd.concat(all_data, ignore_index=True)
+    combined_df['datetime'] = pd.to_datetime(combined_df['datetime'])
+    combined_df = combined_df.sort_values('datetime')
+    combined_df.set_index('datetime', inplace=True)
+    # 移除任何时区信息
+    if combined_df.index.tz is not None:
+        combined_df.index = combined_df.index.tz_localize(None)
+    return combined_df, missing_days
+
+
+def source_paths(symbol, start_date, end_date, source_timeframe='1m', data_path=None, store_path=None,
+                 db_path=None):
+    """返回 [start_date, end_date] 对应的源数据文件（列式存储分区、SQLite 库或按日CSV），用于计算数据指纹"""
+    if store_path:
+        paths = HistoryStore(store_path, interval=source_timeframe).partitions(symbol, start_date, end_date)
+        if paths:
+            return paths
+    if db_path:
+        return [db_path]
+    if data_path is None:
+        return []
+    return [csv_day_path(data_path, date.strftime('%Y-%m-%d'), symbol, source_timeframe)
+            for date in pd.date_range(start=start_date, end=end_date, freq='D')]
+
+
+def _aggregate_ohlcv(df, timeframe, origin):
+    freq = pandas_freq(timeframe)
+    # 日线及以上按自然日历划分，origin 只对分钟/小时等固定长度周期生效
+    kwargs = {'origin': origin} if isinstance(to_offset(freq), Tick) else {}
+    return df.resample(freq, **kwargs).agg({
+        'open': 'first',
+        'high': 'max',
+        'low': 'min',
+        'close': 'last',
+        'volume': 'sum'
+    }).dropna()  # 立即删除NaN值
+
+
+def _to_backtesting_df(resampled):
+    backtesting_df = pd.DataFrame({
+        'Open': resampled['open'],
+        'High': resampled['high'],
+        'Low': resampled['low'],
+        'Close': resampled['close'],
+        'Volume': resampled['volume']
+    })
+
+    # 确保所有数据都是数值类型并删除任何无效值
+    for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
+        backtesting_df[col] = pd.to_numeric(backtesting_df[col], errors='coerce')
+    return backtesting_df.dropna()
+
+
+def resample_bars(combined_df, target_timeframe, binance_aligned=False):
+    """
+    把源周期K线重采样到目标周期
+
+    Args:
+        binance_aligned: 为 True 时K线边界按 Unix 纪元（UTC）对齐，与币安K线一致
+
+    Returns:
+        DataFrame: 列为 Open/High/Low/Close/Volume、可直接传给 bt.feeds.PandasData 的 DataFrame
+    """
+    origin = 'epoch' if binance_aligned else 'start_day'
+    return _to_backtesting_df(_aggregate_ohlcv(combined_df, target_timeframe, origin))
+
+
+def resample_pyramid(combined_df, target_timeframes, binance_aligned=False):
+    """
+    一次性把源周期K线重采样到多个目标周期
+
+    按周期从细到粗依次计算，粗周期直接由能整除它的最细已算周期合成（如 15min -> 30min -> 1h），
+    而不是每个周期都重新聚合全部 1m 数据。open/high/low/close 与直接重采样完全一致，
+    volume 为分段求和，可能有浮点末位差异。非固定长度的周期（如周、月）直接由源数据计算。
+
+    Returns:
+        dict: {目标周期: 与 resample_bars 相同格式的 DataFrame}，键与 target_timeframes 中的写法一致
+    """
+    origin = 'epoch' if binance_aligned else 'start_day'
+
+    def nanos(timeframe):
+        try:
+            return to_offset(pandas_freq(timeframe)).nanos
+        except ValueError:
+            if binance_aligned:
+                raise ValueError(f"币安对齐模式不支持非固定长度的周期: {timeframe}")
+            return None
+
+    timeframes = list(dict.fromkeys(target_timeframes))
+    lengths = {tf: nanos(tf) for tf in timeframes}
+
+    built = []  # [(周期纳秒数, 已聚合的小写列K线)]，按周期升序
+    results = {}
+    for tf in sorted(timeframes, key=lambda tf: (lengths[tf] is None, lengths[tf] or 0)):
+        length = lengths[tf]
+        base = combined_df
+        if length is not None:
+            for fine_length, fine_df in reversed(built):
+                if length % fine_length == 0:
+                    base = fine_df
+                    break
+        resampled = _aggregate_ohlcv(base, tf, origin)
+        if length is not None:
+            built.append((length, resampled))
+        results[tf] = _to_backtesting_df(resampled)
+
+    return {tf: results[tf] for tf in timeframes}
+
+
+def load_resampled_pyramid(symbol, start_date, end_date, source_timeframe='1m', target_timeframes=('30min',),
+                           data_path=None, store_path=None, cache_path=None, cache_max_bytes=5 * 1024 ** 3,
+                           io_workers=DEFAULT_IO_WORKERS, binance_aligned=False, db_path=None):
+    """
+    读取一次源K线，生成所有目标周期的K线，配置了 cache_path 时使用磁盘缓存
+
+    缓存键包含源数据文件的指纹，源数据更新后会自动重新计算；
+    所有目标周期都命中缓存时完全跳过 读取-合并-重采样 步骤，否则只读取一次源数据并补齐未命中的周期。
+
+    Returns:
+        dict: {目标周期: DataFrame}
+    """
+    timeframes = list(dict.fromkeys(target_timeframes))
+    origin = 'epoch' if binance_aligned else None
+
+    results = {}
+    keys = {}
+    cache = None
+    if cache_path:
+        cache = ResampleCache(cache_path, max_bytes=cache_max_bytes)
+        fingerprint = fingerprint_files(source_paths(symbol, start_date, end_date, source_timeframe,
+                                                     data_path, store_path, db_path))
+        for tf in timeframes:
+            keys[tf] = cache.make_key(symbol, start_date, end_date, source_timeframe, tf, fingerprint, origin)
+            cached_df = cache.get(keys[tf])
+            if cached_df is not None:
+                results[tf] = cached_df
+
+    missing = [tf for tf in timeframes if tf not in results]
+    if missing:
+        combined_df = load_minute_bars(symbol, start_date, end_date, source_timeframe=source_timeframe,
+                                       data_path=data_path, store_path=store_path, io_workers=io_workers,
+                                       db_path=db_path)
+        for tf, backtesting_df in resample_pyramid(combined_df, missing, binance_aligned).items():
+            results[tf] = backtesting_df
+            if cache is not None:
+                cache.put(keys[tf], backtesting_df)
+
+    return {tf: results[tf] for tf in timeframes}
+
+
+def load_resampled_bars(symbol, start_date, end_date, source_timeframe='1m', target_timeframe='30min',
+                        data_path=None, store_path=None, cache_path=None, cache_max_bytes=5 * 1024 ** 3,
+                        io_workers=DEFAULT_IO_WORKERS, binance_aligned=False, db_path=None):
+    """读取并重采样单个目标周期的K线，参见 load_resampled_pyramid"""
+    return load_resampled_pyramid(symbol, start_date, end_date, source_timeframe, [target_timeframe],
+                                  data_path=data_path, store_path=store_path, cache_path=cache_path,
+                                  cache_max_bytes=cache_max_bytes, io_workers=io_workers,
+                                  binance_aligned=binance_aligned, db_path=db_path)[target_timeframe]
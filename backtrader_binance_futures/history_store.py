@@ -0,0 +1,227 @@
+import os
+import re
+import logging
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# 配置日志
+logger = logging.getLogger('HistoryStore')
+
+OHLCV_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+# 按日CSV文件名: {date}_{SYMBOL}_USDT_{interval}.csv
+_CSV_NAME_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})_(.+)_USDT_([0-9a-zA-Z]+)\.csv$')
+_DAY_DIR_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+def normalize_symbol(symbol):
+    """
+    统一交易对写法，与按日CSV文件名中的交易对部分一致（文件名、列式存储目录、清单和 SQLite 库都用这一写法）
+
+    'BTC'、'BTCUSDT'、'BTC/USDT:USDT' 均返回 'BTCUSDT'
+    """
+    normalized = symbol.split(':')[0].replace('/', '')
+    if not normalized.endswith('USDT'):
+        normalized = f"{normalized}USDT"
+    return normalized
+
+
+def csv_day_path(data_path, date_str, symbol, interval='1m'):
+    """按日CSV文件路径: {data_path}/{date}/{date}_{SYMBOL}_USDT_{interval}.csv"""
+    return os.path.join(data_path, date_str, f"{date_str}_{normalize_symbol(symbol)}_USDT_{interval}.csv")
+
+
+def pandas_freq(timeframe):
+    """把配置中的周期字符串转换为 pandas 频率（'1H' 等大写小时写法在新版 pandas 中已不再支持）"""
+    if timeframe.endswith('H'):
+        return timeframe[:-1] + 'h'
+    return timeframe
+
+
+def day_bounds(start_date, end_date):
+    """把日期范围转换为 [start, end) 时间戳区间，结束日期按整日包含（与按日CSV一致）"""
+    start = pd.Timestamp(start_date).normalize()
+    end = pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+    return start, end
+
+
+class HistoryStore(object):
+    """
+    按 交易对/月份 分区的 Parquet 列式K线存储
+
+    目录结构: {root}/{interval}/{SYMBOL}/{YYYY-MM}.parquet
+    每个月份文件按天切分 row group，读取时只打开覆盖日期范围的月份文件，
+    并借助 row group 统计信息跳过范围外的数据，只解码请求的列。
+    """
+    ROW_GROUP_SIZE = 1440  # 1m 数据一天一个 row group
+
+    def __init__(self, root, interval='1m', compression='zstd'):
+        self.root = root
+        self.interval = interval
+        self.compression = compression
+
+    def symbol_dir(self, symbol, interval=None):
+        return os.path.join(self.root, interval or self.interval, normalize_symbol(symbol))
+
+    def partition_path(self, symbol, month, interval=None):
+        """month 为 'YYYY-MM' 字符串"""
+        return os.path.join(self.symbol_dir(symbol, interval), f"{month}.parquet")
+
+    def symbols(self, interval=None):
+        """列出存储中已有的全部交易对"""
+        interval_dir = os.path.join(self.root, interval or self.interval)
+        if not os.path.isdir(interval_dir):
+            return []
+        return sorted(entry.name for entry in os.scandir(interval_dir) if entry.is_dir())
+
+    def months(self, symbol, interval=None):
+        """列出某交易对已有的月份分区（升序）"""
+        symbol_dir = self.symbol_dir(symbol, interval)
+        if not os.path.isdir(symbol_dir):
+            return []
+        return sorted(entry.name[:-len('.parquet')] for entry in os.scandir(symbol_dir)
+                      if entry.name.endswith('.parquet'))
+
+    def partitions(self, symbol, start_date, end_date, interval=None):
+        """返回覆盖 [start_date, end_date] 的现有分区文件路径（按月份升序）"""
+        start, end = day_bounds(start_date, end_date)
+        wanted = pd.period_range(start, end - pd.Timedelta(days=1), freq='M').strftime('%Y-%m')
+        existing = set(self.months(symbol, interval))
+        return [self.partition_path(symbol, month, interval) for month in wanted if month in existing]
+
+    def load(self, symbol, start_date, end_date, columns=None, interval=None):
+        """
+        读取 [start_date, end_date] 的K线（日期按整日包含）
+
+        Returns:
+            DataFrame: 以 datetime 为索引，只包含 columns 指定的列；无数据时返回空 DataFrame
+        """
+        columns = list(columns or OHLCV_COLUMNS)
+        paths = self.partitions(symbol, start_date, end_date, interval)
+        if not paths:
+            return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='datetime'))
+
+        start, end = day_bounds(start_date, end_date)
+        table = pq.read_table(
+            paths,
+            columns=['datetime'] + [c for c in columns if c != 'datetime'],
+            filters=[('datetime', '>=', start.to_pydatetime()), ('datetime', '<', end.to_pydatetime())],
+        )
+        df = table.to_pandas()
+        df['datetime'] = df['datetime'].astype('datetime64[ns]')
+        df.set_index('datetime', inplace=True)
+        if not df.index.is_monotonic_increasing:
+            df.sort_index(inplace=True)
+        return df
+
+    def write(self, symbol, df, interval=None):
+        """
+        写入K线数据，按月份合并到已有分区（相同时间戳以新数据为准）
+
+        Args:
+            df: 含 datetime 列（或 datetime 索引）及 open/high/low/close/volume 列的 DataFrame
+
+        Returns:
+            list: 本次写入的分区文件路径
+        """
+        if df.empty:
+            return []
+        if 'datetime' not in df.columns:
+            df = df.rename_axis('datetime').reset_index()
+        df = df[['datetime', *OHLCV_COLUMNS]].copy()
+        df['datetime'] = pd.to_datetime(df['datetime']).astype('datetime64[ns]')
+        for col in OHLCV_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+
+        written = []
+        for month, month_df in df.groupby(df['datetime'].dt.strftime('%Y-%m'), sort=True):
+            path = self.partition_path(symbol, month, interval)
+            if os.path.exists(path):
+                existing = pq.read_table(path).to_pandas()
+                existing['datetime'] = existing['datetime'].astype('datetime64[ns]')
+                month_df = pd.concat([existing, month_df], ignore_index=True)
+            month_df = month_df.drop_duplicates(subset=['datetime'], keep='last').sort_values('datetime')
+            self._write_partition(path, month_df)
+            written.append(path)
+        return written
+
+    def _write_partition(self, path, df):
+        """先写临时文件再原子替换，读者不会看到写了一半的分区"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        pq.write_table(table, tmp_path, compression=self.compression, row_group_size=self.ROW_GROUP_SIZE,
+                       coerce_timestamps='ms', allow_truncated_timestamps=True)
+        os.replace(tmp_path, path)
+
+
+def scan_csv_tree(csv_root, interval='1m', symbols=None, start_date=None, end_date=None):
+    """
+    扫描按日CSV目录树
+
+    Returns:
+        dict: {(symbol, 'YYYY-MM'): [(date_str, file_path), ...]}，日期升序
+    """
+    wanted = {normalize_symbol(s) for s in symbols} if symbols else None
+    start = pd.Timestamp(start_date).strftime('%Y-%m-%d') if start_date else None
+    end = pd.Timestamp(end_date).strftime('%Y-%m-%d') if end_date else None
+
+    groups = {}
+    for day_entry in sorted(os.scandir(csv_root), key=lambda e: e.name):
+        if not day_entry.is_dir() or not _DAY_DIR_RE.match(day_entry.name):
+            continue
+        if (start and day_entry.name < start) or (end and day_entry.name > end):
+            continue
+        for file_entry in os.scandir(day_entry.path):
+            match = _CSV_NAME_RE.match(file_entry.name)
+            if not match:
+                continue
+            date_str, symbol, file_interval = match.groups()
+            if file_interval != interval or (wanted is not None and symbol not in wanted):
+                continue
+            groups.setdefault((symbol, date_str[:7]), []).append((date_str, file_entry.path))
+    return groups
+
+
+def convert_csv_tree(csv_root, store_root, interval='1m', symbols=None, start_date=None, end_date=None,
+                     overwrite=False):
+    """
+    把按日CSV目录树转换为按 交易对/月份 分区的 Parquet 存储
+
+    已存在且比对应CSV都新的月份分区会被跳过，因此可以重复运行做增量转换。
+
+    Returns:
+        dict: {'converted': [...分区路径], 'skipped': 跳过的分区数, 'failed': [(文件, 错误)]}
+    """
+    store = HistoryStore(store_root, interval=interval)
+    groups = scan_csv_tree(csv_root, interval, symbols, start_date, end_date)
+    logger.info(f"扫描到 {len(groups)} 个 交易对/月份 分组")
+
+    summary = {'converted': [], 'skipped': 0, 'failed': []}
+    for (symbol, month), files in sorted(groups.items()):
+        path = store.partition_path(symbol, month)
+        if not overwrite and os.path.exists(path):
+            newest_csv = max(os.path.getmtime(file_path) for _, file_path in files)
+            if os.path.getmtime(path) >= newest_csv:
+                summary['skipped'] += 1
+                continue
+
+        frames = []
+        for date_str, file_path in files:
+            try:
+                frames.append(pd.read_csv(file_path, usecols=['datetime', *OHLCV_COLUMNS]))
+            except Exception as e:
+                summary['failed'].append((file_path, str(e)))
+                logger.error(f"读取文件出错 {file_path}: {str(e)}")
+        if not frames:
+            continue
+
+        month_df = pd.concat(frames, ignore_index=True)
+        if overwrite and os.path.exists(path):
+            os.remove(path)
+        summary['converted'].extend(store.write(symbol, month_df))
+        logger.info(f"已转换 {symbol} {month}: {len(files)} 个文件, {len(month_df)} 行")
+
+    return summary
@@ -0,0 +1,239 @@
+import hashlib
+import logging
+import threading
+import weakref
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+# 配置日志
+logger = logging.getLogger('IndicatorCache')
+
+# 进程内默认的缓存大小上限
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+
+# 输入数组指纹的记忆表大小（优化时同一份预加载数据在多个试验间复用，不必重复计算哈希）；
+# 记忆表只保存弱引用和指纹字符串，不占用数组内存
+_FINGERPRINT_MEMO_SIZE = 256
+
+
+class IndicatorCache(object):
+    """
+    进程内的指标数组缓存，跨试验复用
+
+    - 键为 (指标名, 参数, 输入数据指纹)，值为只读 NumPy 数组元组
+    - 按字节预算做 LRU 淘汰
+    - 优化时每个工作进程各有一份；参数空间离散，同一数据上的大量试验共用相同的指标参数
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """命中返回数组元组，未命中返回 None"""
+        with self._lock:
+            values = self._entries.get(key)
+            if values is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return values
+
+    def put(self, key, values):
+        """写入数组元组（复制为只读数组），然后按字节预算淘汰最久未使用的条目"""
+        values = tuple(np.array(v, dtype=np.float64) for v in values)
+        for v in values:
+            v.flags.writeable = False
+        size = sum(v.nbytes for v in values)
+        if size > self.max_bytes:
+            logger.debug(f"指标数组 {size} 字节超过缓存上限 {self.max_bytes}，不缓存")
+            return values
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= sum(v.nbytes for v in old)
+            self._entries[key] = values
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= sum(v.nbytes for v in evicted)
+        return values
+
+    def get_or_compute(self, key, compute):
+        """未命中时调用 compute() 计算（返回数组或数组元组）并写入缓存"""
+        values = self.get(key)
+        if values is None:
+            result = compute()
+            values = self.put(key, result if isinstance(result, tuple) else (result,))
+        return values
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {'entries': len(self._entries), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+_cache = IndicatorCache()
+_fingerprints = OrderedDict()  # {记忆键: (弱引用, 长度, 指纹)}，参见 _fingerprint_memo_key
+_fingerprints_lock = threading.Lock()
+
+
+def get_indicator_cache():
+    return _cache
+
+
+def set_indicator_cache_size(max_bytes):
+    """调整本进程缓存的大小上限（为 0 时相当于关闭缓存）"""
+    _cache.max_bytes = max_bytes
+    with _cache._lock:
+        while _cache.bytes > max_bytes and _cache._entries:
+            _, evicted = _cache._entries.popitem(last=False)
+            _cache.bytes -= sum(v.nbytes for v in evicted)
+
+
+def _owner(values):
+    """NumPy 数组（或视图）实际持有内存的对象"""
+    while isinstance(values, np.ndarray) and values.base is not None:
+        values = values.base
+    return values
+
+
+def _fingerprint_memo_key(values):
+    """
+    指纹记忆表的键和用来确认内存仍然有效的弱引用，不能记忆时返回 (None, None)
+
+    - 只读 NumPy 数组（例如 NumpyData 共享数组的切片，feed_values 的返回值）按内存地址、长度和步长记忆，
+      每个试验新建的视图对象指向同一块内存时也能命中；持有内存的对象也必须只读，内容才不会变化
+    - array.array（line 缓冲区）按对象记忆（与原来相同，长度变化时重新计算）
+    - 可写的 NumPy 数组（例如每个试验新复制的数组）不记忆，每次重新计算
+    弱引用失效（内存已释放，地址或 id 可能被新对象复用）时记录作废。
+    """
+    if isinstance(values, np.ndarray):
+        owner = _owner(values)
+        if values.flags.writeable or (isinstance(owner, np.ndarray) and owner.flags.writeable):
+            return None, None
+        key = ('ndarray', values.__array_interface__['data'][0], values.shape, values.strides, values.dtype.str)
+    else:
+        owner = values
+        key = ('object', id(values))
+    try:
+        return key, weakref.ref(owner)
+    except TypeError:
+        return None, None
+
+
+def array_fingerprint(values):
+    """
+    数组内容的指纹（array.array 或 NumPy 数组）
+
+    同一块只读内存（或同一个 array.array 对象）在长度不变时只计算一次哈希；记忆表不持有数组本身
+    """
+    memo_key, ref = _fingerprint_memo_key(values)
+    if memo_key is not None:
+        with _fingerprints_lock:
+            entry = _fingerprints.get(memo_key)
+            if entry is not None and entry[0]() is ref() and entry[1] == len(values):
+                _fingerprints.move_to_end(memo_key)
+                return entry[2]
+
+    buffer = np.ascontiguousarray(values, dtype=np.float64) if isinstance(values, np.ndarray) else values
+    digest = hashlib.sha1(memoryview(buffer).cast('B')).hexdigest()
+    fingerprint = f"{len(values)}:{digest}"
+    if memo_key is not None:
+        with _fingerprints_lock:
+            _fingerprints[memo_key] = (ref, len(values), fingerprint)
+            _fingerprints.move_to_end(memo_key)
+            while len(_fingerprints) > _FINGERPRINT_MEMO_SIZE:
+                _fingerprints.popitem(last=False)
+    return fingerprint
+
+
+def cached_call(func, *arrays, **kwargs):
+    """
+    以 (函数名, 参数, 输入数组指纹) 为键缓存函数结果，用于 TA-Lib 等纯函数
+
+    例如 cached_call(talib.RSI, close, timeperiod=14)；返回值与 func 相同（单个数组或元组），数组只读
+    """
+    key = (getattr(func, '__module__', None), func.__name__, tuple(sorted(kwargs.items())),
+           tuple(array_fingerprint(a) for a in arrays))
+    values = _cache.get_or_compute(key, lambda: func(*arrays, **kwargs))
+    return values[0] if len(values) == 1 else values
+
+
+def _input_key(source):
+    """指标输入的键：已缓存的指标直接用它自己的缓存键，其余按各条 line 的数组内容计算指纹"""
+    key = getattr(source, '_indicator_cache_key', None)
+    if key is not None:
+        return key
+    return tuple(array_fingerprint(line.array) for line in source.lines)
+
+
+def _cached_once(indicator, compute):
+    """
+    带缓存的 _once()（只作用于 runonce 模式）
+
+    此时输入都已算完，按 (指标类, 参数, 输入指纹) 查询缓存：命中时直接填入各条 line，
+    跳过指标自身及其子指标的计算；未命中时调用 compute() 正常计算并写入缓存。逐根 next() 模式不受影响。
+    """
+    indicator._indicator_cache_key = key = (
+        type(indicator).__module__, type(indicator).__name__,
+        tuple(sorted((name, repr(value)) for name, value in indicator.p._getkwargs().items())),
+        tuple(_input_key(source) for source in indicator.datas),
+    )
+    buflen = indicator._clock.buflen()
+    values = _cache.get(key)
+    if values is None or any(len(v) != buflen for v in values):
+        compute()
+        _cache.put(key, [line.array for line in indicator.lines])
+        return
+
+    for line, cached_values in zip(indicator.lines, values):
+        line.array = array('d', cached_values.tobytes())
+    indicator.home()
+    for line in indicator.lines:
+        line.oncebinding()
+
+
+_cached_classes = {}
+
+
+def cached(indicator_cls):
+    """
+    返回带缓存的指标子类（类名、参数、lines 不变），例如 cached(bt.indicators.ATR)(self.data, period=14)
+    """
+    cls = _cached_classes.get(indicator_cls)
+    if cls is None:
+        def _once(self):
+            _cached_once(self, super(cls, self)._once)
+
+        # aliased: 与 backtrader 的别名类一样不重新注册同名指标
+        cls = type(indicator_cls.__name__, (indicator_cls,), {
+            '__module__': indicator_cls.__module__,
+            '__doc__': indicator_cls.__doc__,
+            'aliased': indicator_cls.__name__,
+            '_once': _once,
+        })
+        _cached_classes[indicator_cls] = cls
+    return cls
+
+
+class _CachedTALib(object):
+    """bt.talib 的带缓存版本: ctalib.RSI(self.data.close, timeperiod=14)"""
+
+    def __getattr__(self, name):
+        import backtrader.talib as bttalib
+        return cached(getattr(bttalib, name))
+
+
+ctalib = _CachedTALib()
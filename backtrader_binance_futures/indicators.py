@@ -0,0 +1,347 @@
+import math
+from array import array
+from collections import deque
+
+import backtrader as bt
+import numpy as np
+
+
+class WarmupPeriod(bt.Indicator):
+    """不计算任何值，只用来把策略的最小周期设置为与所替代的指标一致（prenext/next 的切换点不变）"""
+    lines = ('warmup',)
+    params = (('period', 1),)
+    plotinfo = dict(plot=False)
+
+    def __init__(self):
+        self.addminperiod(self.p.period)
+
+    def next(self):
+        pass
+
+    def once(self, start, end):
+        pass
+
+
+class MonotonicWindow(object):
+    """
+    最近 period 个值（含当前）的滚动最小值/最大值，忽略 NaN（NaN 占一个位置但不参与比较）；窗口内没有值时为 NaN
+
+    用单调队列维护候选值，每次 push 均摊 O(1)，与 period 大小无关。RollingMin/RollingMax 的 next() 每根K线推入一次；
+    策略也可以只推入筛选后的序列（例如跳过无效价格），窗口按推入次数计，count 为已推入的个数。
+    """
+
+    def __init__(self, period, highest=False):
+        self.period = period
+        self.highest = highest
+        self.count = 0
+        self._window = deque()  # [(序号, 值)]，值单调
+
+    def push(self, value):
+        self.count += 1
+        window = self._window
+        if not math.isnan(value):
+            if self.highest:
+                while window and window[-1][1] <= value:
+                    window.pop()
+            else:
+                while window and window[-1][1] >= value:
+                    window.pop()
+            window.append((self.count, value))
+        while window and window[0][0] <= self.count - self.period:
+            window.popleft()
+
+    @property
+    def value(self):
+        return self._window[0][1] if self._window else float('nan')
+
+
+def rolling_extreme(values, period, reduce=np.fmin):
+    """
+    长度为 period 的滑动窗口极值（第 i 个为以第 i 项结尾的窗口，开头不足 period 项的窗口只含已有的项），忽略 NaN
+
+    van Herk / Gil-Werman 分块算法: 按 period 分块，块内前缀、后缀各做一次累积，
+    每个窗口最多跨两块，极值 = reduce(起点的块内后缀, 终点的块内前缀)。总计 O(n)，与 period 大小无关。
+
+    Args:
+        reduce: np.fmin（最小值）或 np.fmax（最大值），两者都忽略 NaN
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    # 前面补 period-1 个 NaN，以第 i 项结尾的窗口为 padded[i:i + period]；末尾补齐到 period 的整数倍
+    blocks = -(-(n + period - 1) // period)
+    padded = np.full(blocks * period, np.nan)
+    padded[period - 1:period - 1 + n] = values
+    padded = padded.reshape(blocks, period)
+    prefix = reduce.accumulate(padded, axis=1).ravel()
+    suffix = reduce.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+    return reduce(suffix[:n], prefix[period - 1:period - 1 + n])
+
+
+class _RollingExtreme(bt.Indicator):
+    """
+    最近 period 根（含当前）的滚动极值，忽略 NaN；窗口内全为 NaN 时为 NaN
+
+    partial=True 时不足 period 根也输出已有K线的极值，指标的最小周期为 1，不会推迟策略开始运行的K线
+
+    next() 用 MonotonicWindow 维护候选值，每根K线均摊 O(1)；once() 用 rolling_extreme 分块计算整个数组，O(n)。
+    两者都与 period 大小无关。
+    """
+    params = (
+        ('period', 14),
+        ('partial', False),
+    )
+    plotinfo = dict(subplot=False)
+
+    # 子类设置：_highest 为真时取最大值；_reduce 为忽略 NaN 的 ufunc
+    _highest = False
+    _reduce = None
+
+    def __init__(self):
+        if not self.p.partial:
+            self.addminperiod(self.p.period)
+        self._window = MonotonicWindow(self.p.period, highest=self._highest)
+
+    def prenext(self):
+        # 未满 period 根时也要维护队列
+        self._window.push(self.data[0])
+
+    def next(self):
+        self._window.push(self.data[0])
+        self.lines[0][0] = self._window.value
+
+    def once(self, start, end):
+        src = np.frombuffer(self.data.lines[0].array, dtype=np.float64)[:end]
+        values = rolling_extreme(src, self.p.period, self._reduce)[start:end]
+        self.lines[0].array[start:end] = array('d', values)
+
+
+class RollingMin(_RollingExtreme):
+    """最近 period 根的最小值（忽略 NaN），用于最低点判断"""
+    lines = ('rollmin',)
+    _reduce = np.fmin
+
+
+class RollingMax(_RollingExtreme):
+    """最近 period 根的最大值（忽略 NaN），用于最高点判断"""
+    lines = ('rollmax',)
+    _highest = True
+    _reduce = np.fmax
+
+
+# ---------------------------------------------------------------------------
+# runonce 模式下用 NumPy 计算的 RSI / SMA / StdDev / BBands / ATR
+#
+# 各类继承 backtrader 的同名指标：逐根 next() 模式（实盘）仍走原来的纯 Python 子指标；
+# runonce 模式下 _once() 直接在输入数组上计算各条 line，跳过子指标和线运算。
+# 计算顺序与 backtrader 相同（窗口和按 math.fsum 精确求和、平滑递推逐项相乘相加），
+# 结果与原指标逐位一致，两种模式下策略行为相同。遇到不支持的参数（例如自定义 movav）
+# 或无法精确计算的输入时退回原来的 _once()。
+#
+# 策略只需改一行导入: from backtrader_binance_futures import indicators as btind，
+# 然后照常使用 btind.RSI / btind.SMA / btind.StandardDeviation / btind.BollingerBands / btind.ATR
+# ---------------------------------------------------------------------------
+
+# 定义子类之前记下 backtrader 原来的均线类，作为各指标默认 movav 的判断依据
+_BT_SMA = bt.indicators.MovAv.Simple
+_BT_SMOOTHED = bt.indicators.MovAv.Smoothed
+
+
+def _line_values(line):
+    return np.frombuffer(line.array, dtype=np.float64)
+
+
+def _fill_lines(indicator, *values):
+    """把计算好的数组写入指标的各条 line（与 _once() 结束时的状态相同）"""
+    for line, line_values in zip(indicator.lines, values):
+        line.array = array('d', np.asarray(line_values, dtype=np.float64).tobytes())
+    indicator.home()
+    for line in indicator.lines:
+        line.oncebinding()
+
+
+def window_fsum(values, period):
+    """
+    长度为 period 的滑动窗口和，第 i 个为以第 i 项结尾的窗口（前 period-1 项为 NaN），
+    每个窗口的结果与 math.fsum 逐位一致；无法精确计算时返回 None
+
+    把所有值放大 2^k 变成整数（双精度数都是整数乘以 2 的幂），用 int64 前缀和相减得到精确的窗口和，
+    再转换回浮点数（只舍入一次，与 fsum 的正确舍入相同）。前缀和溢出不影响结果，只要窗口和本身不溢出。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    sums = np.full(n, np.nan)
+    if n < period:
+        return sums
+    if not np.isfinite(values).all():
+        return None
+
+    nonzero = values[values != 0]
+    if len(nonzero):
+        mantissa, exponent = np.frexp(nonzero)
+        digits = (mantissa * 2.0 ** 53).astype(np.int64)
+        trailing = np.log2((digits & -digits).astype(np.float64)).astype(np.int64)
+        scale = int(np.max(53 - exponent - trailing))
+        if np.max(np.abs(nonzero)) * 2.0 ** scale * period >= 2.0 ** 62:
+            return None
+    else:
+        scale = 0
+
+    digits = np.ldexp(values, scale).astype(np.int64)
+    with np.errstate(over='ignore'):
+        cumsum = np.cumsum(digits)
+        windows = cumsum[period - 1:] - np.concatenate([[0], cumsum[:n - period]])
+    sums[period - 1:] = np.ldexp(windows.astype(np.float64), -scale)
+    return sums
+
+
+def _window_mean(values, period):
+    """与 bt.indicators.Average 相同的滑动平均: fsum(窗口) / period"""
+    sums = window_fsum(values, period)
+    return None if sums is None else sums / period
+
+
+def _smoothed(values, first, period):
+    """
+    与 ExponentialSmoothing(alpha=1/period) 相同的递推: 以 values[first:first+period] 的 fsum 平均为种子，
+    之后 prev * (1 - alpha) + value * alpha；first 之前及种子之前为 NaN
+    """
+    out = [math.nan] * len(values)
+    seed = first + period - 1
+    if seed >= len(values):
+        return out
+    values = values.tolist() if isinstance(values, np.ndarray) else values
+    alpha = 1.0 / period
+    alpha1 = 1.0 - alpha
+    out[seed] = prev = math.fsum(values[first:seed + 1]) / period
+    for i in range(seed + 1, len(values)):
+        out[i] = prev = prev * alpha1 + values[i] * alpha
+    return out
+
+
+class SMA(bt.indicators.SMA):
+    """bt.indicators.SMA，runonce 模式下窗口和由 window_fsum 一次算出"""
+    alias = ('SimpleMovingAverage', 'MovingAverageSimple')
+    # 不注册到 bt.indicators.MovAv: 否则 MovAv.Simple 等会被替换成本类，
+    # 与各指标默认参数 movav（backtrader 原来的 SMA 类）不再是同一个类
+    _notregister = True
+
+    def _once(self):
+        src = _line_values(self.data.lines[0])
+        first = self._minperiod - self.p.period  # 输入的第一个有效值
+        mean = _window_mean(src[first:], self.p.period)
+        if mean is None:
+            return super(SMA, self)._once()
+        _fill_lines(self, np.concatenate([np.full(first, np.nan), mean]))
+
+
+def _pow(values, exponent):
+    """
+    逐项 value ** exponent，与 backtrader 的 pow(line, n) 相同（Python 的 ** 调用 C 库 pow）
+
+    不用 np.square / np.sqrt: C 库 pow 不保证正确舍入，少数值与 NumPy 的结果差一个 ulp，
+    在 SMA(x^2) - SMA(x)^2 的相减中会被放大
+    """
+    return np.fromiter((v ** exponent for v in values.tolist()), dtype=np.float64, count=len(values))
+
+
+def _stddev(src, mean, first, period, safepow):
+    """StandardDeviation: pow(|SMA(x^2) - mean^2|, 0.5)，mean 为同一位置的均值数组；无法计算时返回 None"""
+    meansq = _window_mean(_pow(src[first:], 2), period)
+    if meansq is None:
+        return None
+    meansq = np.concatenate([np.full(first, np.nan), meansq])
+    diff = meansq - _pow(mean, 2)
+    if safepow:
+        diff = np.abs(diff)
+    elif (diff < 0).any():
+        # 负数开方在 Python 中得到复数，交给原实现处理
+        return None
+    return _pow(diff, 0.5)
+
+
+class StandardDeviation(bt.indicators.StandardDeviation):
+    """bt.indicators.StandardDeviation，runonce 模式下用 NumPy 一次算出（只支持默认的 movav=SMA）"""
+    alias = ('StdDev',)
+
+    def _once(self):
+        if self.p.movav not in (_BT_SMA, SMA):
+            return super(StandardDeviation, self)._once()
+        src = _line_values(self.data.lines[0])
+        first = self.data._minperiod - 1
+        if len(self.datas) > 1:
+            mean = _line_values(self.data1.lines[0])
+        else:
+            mean = _window_mean(src[first:], self.p.period)
+            mean = None if mean is None else np.concatenate([np.full(first, np.nan), mean])
+        with np.errstate(invalid='ignore'):
+            stddev = None if mean is None else _stddev(src, mean, first, self.p.period, self.p.safepow)
+        if stddev is None:
+            return super(StandardDeviation, self)._once()
+        stddev[:self._minperiod - 1] = np.nan
+        _fill_lines(self, stddev)
+
+
+class BollingerBands(bt.indicators.BollingerBands):
+    """bt.indicators.BollingerBands，runonce 模式下用 NumPy 一次算出 mid/top/bot（只支持默认的 movav=SMA）"""
+    alias = ('BBands',)
+
+    def _once(self):
+        if self.p.movav not in (_BT_SMA, SMA):
+            return super(BollingerBands, self)._once()
+        src = _line_values(self.data.lines[0])
+        first = self._minperiod - self.p.period
+        mid = _window_mean(src[first:], self.p.period)
+        if mid is not None:
+            mid = np.concatenate([np.full(first, np.nan), mid])
+            with np.errstate(invalid='ignore'):
+                stddev = _stddev(src, mid, first, self.p.period, True)
+        if mid is None or stddev is None:
+            return super(BollingerBands, self)._once()
+        dev = self.p.devfactor * stddev
+        _fill_lines(self, mid, mid + dev, mid - dev)
+
+
+class RSI(bt.indicators.RSI):
+    """bt.indicators.RSI，runonce 模式下涨跌幅用 NumPy、两条 Wilder 平滑在一个循环里算出（只支持默认的 movav）"""
+
+    def _once(self):
+        if self.p.movav is not _BT_SMOOTHED:
+            return super(RSI, self)._once()
+        src = _line_values(self.data.lines[0])
+        lookback, period = self.p.lookback, self.p.period
+        first = self._minperiod - period  # 第一个有效的涨跌幅
+
+        upday = np.full(len(src), np.nan)
+        downday = np.full(len(src), np.nan)
+        upday[lookback:] = np.maximum(src[lookback:] - src[:-lookback], 0.0)
+        downday[lookback:] = np.maximum(src[:-lookback] - src[lookback:], 0.0)
+        maup = np.array(_smoothed(upday, first, period))
+        madown = np.array(_smoothed(downday, first, period))
+
+        valid = slice(self._minperiod - 1, None)
+        if not self.p.safediv and (madown[valid] == 0).any():
+            # 原指标此时会抛出 ZeroDivisionError，交给原实现处理
+            return super(RSI, self)._once()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = maup / madown
+        if self.p.safediv:
+            zero = madown == 0
+            rs = np.where(zero & (maup == 0), self._rscalc(self.p.safelow),
+                          np.where(zero, self._rscalc(self.p.safehigh), rs))
+        _fill_lines(self, 100.0 - 100.0 / (1.0 + rs))
+
+
+class ATR(bt.indicators.ATR):
+    """bt.indicators.ATR，runonce 模式下真实波幅用 NumPy、Wilder 平滑用一个循环算出（只支持默认的 movav）"""
+    alias = ('AverageTrueRange',)
+
+    def _once(self):
+        if self.p.movav is not _BT_SMOOTHED:
+            return super(ATR, self)._once()
+        high = _line_values(self.data.high)
+        low = _line_values(self.data.low)
+        close = _line_values(self.data.close)
+
+        prev_close = np.concatenate([[np.nan], close[:-1]])
+        truerange = np.maximum(high, prev_close) - np.minimum(low, prev_close)
+        _fill_lines(self, _smoothed(truerange, self._minperiod - self.p.period, self.p.period))
@@ -0,0 +1,276 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+import pandas as pd
+
+# 配置日志
+logger = logging.getLogger('JobScheduler')
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# 已领取的作业: args 为传给作业函数的位置参数列表
+Job = namedtuple('Job', 'id key args attempts')
+
+
+def _to_json(value):
+    # NumPy 整数、时间戳等 json 不支持的类型
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class JobQueue(object):
+    """
+    持久化的作业队列（SQLite），记录每个作业的状态 pending/running/done/failed 及其结果
+
+    - 同一个 key 只入队一次，重复运行批量优化时已有的作业保持原状态
+    - 作业完成时结果与 done 状态在同一个事务中写入；导出到结果文件后再标记 exported，
+      崩溃后由 export_pending 补写尚未导出的结果
+    - 只由调度进程读写（工作进程不访问），不需要跨进程加锁
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT UNIQUE,
+            args TEXT,
+            state TEXT,
+            attempts INTEGER DEFAULT 0,
+            error TEXT,
+            result TEXT,
+            exported INTEGER DEFAULT 0,
+            created REAL,
+            started REAL,
+            finished REAL
+        )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, id)")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def add(self, key, args):
+        """入队一个作业（args 为可 JSON 序列化的位置参数列表），key 已存在时不变，返回是否新增"""
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO jobs (key, args, state, created) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(list(args), ensure_ascii=False), PENDING, time.time()))
+        return cursor.rowcount > 0
+
+    def recover(self):
+        """把上次运行中断时仍为 running 的作业放回 pending，返回数量"""
+        with self.conn:
+            cursor = self.conn.execute("UPDATE jobs SET state = ? WHERE state = ?", (PENDING, RUNNING))
+        return cursor.rowcount
+
+    def retry_failed(self):
+        """把失败的作业放回 pending，返回数量"""
+        with self.conn:
+            cursor = self.conn.execute("UPDATE jobs SET state = ?, error = NULL WHERE state = ?", (PENDING, FAILED))
+        return cursor.rowcount
+
+    def claim(self):
+        """按入队顺序领取一个 pending 作业并标记为 running，没有时返回 None"""
+        with self.conn:
+            row = self.conn.execute(
+                "SELECT id, key, args, attempts FROM jobs WHERE state = ? ORDER BY id LIMIT 1", (PENDING,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE jobs SET state = ?, attempts = attempts + 1, started = ? WHERE id = ?",
+                              (RUNNING, time.time(), row[0]))
+        return Job(row[0], row[1], json.loads(row[2]), row[3] + 1)
+
+    def release(self, job):
+        """把已领取但未能提交执行的作业放回 pending"""
+        with self.conn:
+            self.conn.execute("UPDATE jobs SET state = ?, attempts = attempts - 1 WHERE id = ?", (PENDING, job.id))
+
+    def finish(self, job, rows):
+        """记录作业结果（字典列表）并标记为 done"""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = NULL, exported = 0, finished = ? WHERE id = ?",
+                (DONE, json.dumps(rows, ensure_ascii=False, default=_to_json), time.time(), job.id))
+
+    def fail(self, job, error):
+        with self.conn:
+            self.conn.execute("UPDATE jobs SET state = ?, error = ?, finished = ? WHERE id = ?",
+                              (FAILED, error, time.time(), job.id))
+
+    def unexported(self):
+        """已完成但结果尚未导出的作业: [(id, key, rows)]"""
+        rows = self.conn.execute(
+            "SELECT id, key, result FROM jobs WHERE state = ? AND exported = 0 ORDER BY finished", (DONE,)).fetchall()
+        return [(job_id, key, json.loads(result)) for job_id, key, result in rows]
+
+    def mark_exported(self, job_id):
+        with self.conn:
+            self.conn.execute("UPDATE jobs SET exported = 1 WHERE id = ?", (job_id,))
+
+    def counts(self):
+        """各状态的作业数"""
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update(self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return counts
+
+    def failures(self):
+        """失败的作业: [(key, error)]"""
+        return self.conn.execute("SELECT key, error FROM jobs WHERE state = ? ORDER BY id", (FAILED,)).fetchall()
+
+
+def append_rows(path, rows):
+    """
+    把结果行追加到 CSV 文件末尾，不读取已有内容（只读表头以保持列顺序）
+
+    新文件以第一批结果的列为表头；之后缺少的列留空，表头中没有的列丢弃并给出警告
+    """
+    if not rows:
+        return
+    df = pd.DataFrame(rows)
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        header = pd.read_csv(path, nrows=0).columns.tolist()
+        extra = [column for column in df.columns if column not in header]
+        if extra:
+            logger.warning(f"{path} 的表头中没有这些列，已丢弃: {extra}")
+        df.reindex(columns=header).to_csv(path, mode='a', header=False, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def export_pending(queue, results_path):
+    """把已完成但尚未导出的作业结果追加到结果文件（上次运行在两步之间中断时补写）"""
+    for job_id, key, rows in queue.unexported():
+        if results_path:
+            append_rows(results_path, rows)
+        queue.mark_exported(job_id)
+
+
+def _record(queue, job, rows, results_path):
+    queue.finish(job, rows or [])
+    if results_path:
+        append_rows(results_path, rows or [])
+    queue.mark_exported(job.id)
+
+
+def _run_alone(queue, job, func, extra_args, results_path):
+    """
+    在单独的新工作进程中重新执行进程池损坏时正在运行的作业
+
+    进程池损坏时所有在运行的作业都会收到 BrokenProcessPool，分不出是哪个作业导致的；
+    单独执行时仍然崩溃的才记为 failed，其他作业正常完成。返回是否完成
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+        try:
+            rows = executor.submit(func, *job.args, *extra_args).result()
+        except BrokenProcessPool as e:
+            queue.fail(job, repr(e))
+            logger.error(f"作业 {job.key} 导致工作进程异常退出")
+            return False
+        except Exception as e:
+            queue.fail(job, repr(e))
+            logger.error(f"作业 {job.key} 失败: {e}")
+            return False
+    _record(queue, job, rows, results_path)
+    return True
+
+
+def run_jobs(queue, func, n_workers=None, extra_args=(), results_path=None):
+    """
+    用多个工作进程并行执行队列中的作业，直到没有 pending 作业
+
+    每个作业调用 func(*job.args, *extra_args)，返回结果字典列表；完成一个就记录到队列并追加到 results_path。
+    抛出异常的作业记为 failed（需要时用 queue.retry_failed() 重试），不影响其他作业。
+    工作进程被杀死（例如内存不足）时进程池损坏，当时在运行的作业逐个单独重新执行，
+    只有单独执行仍然崩溃的作业记为 failed，然后新建进程池继续执行剩余作业。
+    中断后再次调用即可继续: 上次仍为 running 的作业重新执行，已完成的不再执行。
+
+    Args:
+        queue: JobQueue
+        func: 可 pickle 的模块级函数（工作进程以 spawn 方式启动）
+        n_workers: 工作进程数，默认 CPU 核数
+        extra_args: 追加在每个作业参数之后的公共参数（例如配置字典）
+        results_path: 结果 CSV 路径，为 None 时只保存在队列中
+
+    Returns:
+        dict: 各状态的作业数
+    """
+    n_workers = n_workers if n_workers and n_workers > 0 else os.cpu_count()
+    recovered = queue.recover()
+    if recovered:
+        logger.info(f"{recovered} 个上次中断的作业重新排队")
+    export_pending(queue, results_path)
+
+    counts = queue.counts()
+    total = counts[PENDING]
+    logger.info(f"待执行作业 {total} 个，已完成 {counts[DONE]} 个，失败 {counts[FAILED]} 个")
+    finished = 0
+
+    while True:
+        broken = False
+        # 进程池损坏时正在运行的作业，保持 running 状态，稍后逐个单独执行
+        suspects = []
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=get_context('spawn')) as executor:
+            running = {}
+            while True:
+                while not broken and len(running) < n_workers:
+                    job = queue.claim()
+                    if job is None:
+                        break
+                    try:
+                        future = executor.submit(func, *job.args, *extra_args)
+                    except BrokenProcessPool:
+                        queue.release(job)
+                        broken = True
+                        break
+                    running[future] = job
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        rows = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        suspects.append(job)
+                        continue
+                    except Exception as e:
+                        finished += 1
+                        queue.fail(job, repr(e))
+                        logger.error(f"作业 {job.key} 失败: {e}")
+                    else:
+                        finished += 1
+                        _record(queue, job, rows, results_path)
+                        logger.info(f"作业 {job.key} 完成（{finished}/{total}）")
+
+        if not broken:
+            break
+        if not suspects:
+            # 没有作业在运行时进程池就已损坏，无法判断原因，剩余作业留到下次运行
+            logger.error("进程池已损坏，未执行的作业保留为 pending，重新运行即可继续")
+            break
+        logger.warning(f"工作进程异常退出，{len(suspects)} 个当时在运行的作业逐个单独重新执行")
+        for job in suspects:
+            finished += 1
+            if _run_alone(queue, job, func, extra_args, results_path):
+                logger.info(f"作业 {job.key} 完成（{finished}/{total}）")
+
+    return queue.counts()
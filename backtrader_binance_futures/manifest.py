@@ -0,0 +1,269 @@
+import os
+import hashlib
+import logging
+import sqlite3
+
+import pandas as pd
+
+from .history_store import _CSV_NAME_RE, _DAY_DIR_RE, csv_day_path, normalize_symbol
+
+# 配置日志
+logger = logging.getLogger('DataManifest')
+
+MANIFEST_NAME = 'manifest.sqlite'
+
+
+def file_checksum(file_path, chunk_size=1024 * 1024):
+    """文件内容的 sha1"""
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DataManifest(object):
+    """
+    按日CSV数据目录的清单索引（SQLite）
+
+    每个文件一条记录: (symbol, interval, date, rows, first_ts, last_ts, checksum, size, mtime_ns)。
+    下载器每保存一个文件就增量更新一条记录；完整性检查和交易对列表直接查询索引，
+    不再逐个 os.path.exists / glob / os.walk 网络共享目录。
+
+    默认存放在数据根目录下的 manifest.sqlite。网络文件系统不支持 WAL，这里使用默认的回滚日志模式。
+    """
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                symbol TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                date TEXT NOT NULL,
+                rows INTEGER,
+                first_ts TEXT,
+                last_ts TEXT,
+                checksum TEXT,
+                size INTEGER,
+                mtime_ns INTEGER,
+                PRIMARY KEY (symbol, interval, date)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_files_interval_date ON files (interval, date)")
+        self.conn.commit()
+
+    @classmethod
+    def for_data_path(cls, data_path, create=False):
+        """
+        打开数据目录下的清单；清单不存在且 create=False 时返回 None，调用方回退到扫描文件系统
+        """
+        path = os.path.join(data_path, MANIFEST_NAME)
+        if not create and not os.path.exists(path):
+            return None
+        os.makedirs(data_path, exist_ok=True)
+        return cls(path)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # ---------- 写入 ----------
+
+    def record(self, symbol, interval, date, rows, first_ts, last_ts, checksum=None, size=None, mtime_ns=None,
+               commit=True):
+        """写入（或覆盖）一条文件记录"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (normalize_symbol(symbol), interval, date, int(rows),
+             None if first_ts is None else str(first_ts), None if last_ts is None else str(last_ts),
+             checksum, size, mtime_ns)
+        )
+        if commit:
+            self.conn.commit()
+
+    def record_file(self, file_path, df=None, commit=True):
+        """
+        登记一个按日CSV文件
+
+        Args:
+            df: 刚写入该文件的 DataFrame（含 datetime 列），提供时不再读回文件统计行数和首尾时间
+        """
+        match = _CSV_NAME_RE.match(os.path.basename(file_path))
+        if not match:
+            raise ValueError(f"无法识别的文件名: {file_path}")
+        date_str, symbol, interval = match.groups()
+
+        if df is None:
+            df = pd.read_csv(file_path, usecols=['datetime'])
+        st = os.stat(file_path)
+        first_ts = df['datetime'].iloc[0] if len(df) else None
+        last_ts = df['datetime'].iloc[-1] if len(df) else None
+        self.record(symbol, interval, date_str, len(df), first_ts, last_ts,
+                    checksum=file_checksum(file_path), size=st.st_size, mtime_ns=st.st_mtime_ns, commit=commit)
+
+    def remove(self, symbol, interval, date, commit=True):
+        self.conn.execute("DELETE FROM files WHERE symbol = ? AND interval = ? AND date = ?",
+                          (normalize_symbol(symbol), interval, date))
+        if commit:
+            self.conn.commit()
+
+    def commit(self):
+        self.conn.commit()
+
+    def rebuild(self, data_path, intervals=None):
+        """
+        扫描数据目录，补登记清单中没有或大小/修改时间已变化的文件，并删除已不存在的文件记录
+
+        只在首次建立清单或怀疑清单与文件不一致时需要运行，日常由下载器增量维护。
+
+        Returns:
+            dict: {'added': 新登记/更新的文件数, 'removed': 删除的记录数, 'failed': [(文件, 错误)]}
+        """
+        known = {(symbol, interval, date): (size, mtime_ns) for symbol, interval, date, size, mtime_ns in
+                 self.conn.execute("SELECT symbol, interval, date, size, mtime_ns FROM files")}
+        seen = set()
+        summary = {'added': 0, 'removed': 0, 'failed': []}
+
+        for day_entry in sorted(os.scandir(data_path), key=lambda e: e.name):
+            if not day_entry.is_dir() or not _DAY_DIR_RE.match(day_entry.name):
+                continue
+            for file_entry in os.scandir(day_entry.path):
+                match = _CSV_NAME_RE.match(file_entry.name)
+                if not match:
+                    continue
+                date_str, symbol, interval = match.groups()
+                if intervals and interval not in intervals:
+                    continue
+                key = (symbol, interval, date_str)
+                seen.add(key)
+                st = file_entry.stat()
+                if known.get(key) == (st.st_size, st.st_mtime_ns):
+                    continue
+                try:
+                    self.record_file(file_entry.path, commit=False)
+                    summary['added'] += 1
+                except Exception as e:
+                    summary['failed'].append((file_entry.path, str(e)))
+                    logger.error(f"登记文件出错 {file_entry.path}: {str(e)}")
+            self.conn.commit()
+
+        for key in set(known) - seen:
+            if intervals and key[1] not in intervals:
+                continue
+            self.conn.execute("DELETE FROM files WHERE symbol = ? AND interval = ? AND date = ?", key)
+            summary['removed'] += 1
+        self.conn.commit()
+        logger.info(f"清单已更新: 新增/更新 {summary['added']}，删除 {summary['removed']}")
+        return summary
+
+    # ---------- 查询 ----------
+
+    def has(self, symbol, interval, date):
+        row = self.conn.execute("SELECT 1 FROM files WHERE symbol = ? AND interval = ? AND date = ?",
+                                (normalize_symbol(symbol), interval, date)).fetchone()
+        return row is not None
+
+    def entries(self, interval=None):
+        """全部 (symbol, interval, date) 记录"""
+        if interval is None:
+            return self.conn.execute("SELECT symbol, interval, date FROM files").fetchall()
+        return self.conn.execute("SELECT symbol, interval, date FROM files WHERE interval = ?", (interval,)).fetchall()
+
+    def entry(self, symbol, interval, date):
+        """返回一条记录的 dict，不存在时返回 None"""
+        cursor = self.conn.execute("SELECT * FROM files WHERE symbol = ? AND interval = ? AND date = ?",
+                                   (normalize_symbol(symbol), interval, date))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([c[0] for c in cursor.description], row))
+
+    def dates(self, symbol, interval='1m', start_date=None, end_date=None):
+        """某交易对已有数据的日期（升序）"""
+        sql = "SELECT date FROM files WHERE symbol = ? AND interval = ?"
+        args = [normalize_symbol(symbol), interval]
+        if start_date is not None:
+            sql += " AND date >= ?"
+            args.append(pd.Timestamp(start_date).strftime('%Y-%m-%d'))
+        if end_date is not None:
+            sql += " AND date <= ?"
+            args.append(pd.Timestamp(end_date).strftime('%Y-%m-%d'))
+        return [row[0] for row in self.conn.execute(sql + " ORDER BY date", args)]
+
+    def missing_dates(self, symbol, start_date, end_date, interval='1m'):
+        """[start_date, end_date] 内清单中没有记录的日期"""
+        existing = set(self.dates(symbol, interval, start_date, end_date))
+        return [date for date in pd.date_range(start=start_date, end=end_date, freq='D').strftime('%Y-%m-%d')
+                if date not in existing]
+
+    def is_complete(self, symbol, start_date, end_date, interval='1m'):
+        return not self.missing_dates(symbol, start_date, end_date, interval)
+
+    def symbols(self, interval='1m', date=None):
+        """清单中的交易对（升序）；指定 date 时只返回当天有数据的交易对"""
+        if date is None:
+            rows = self.conn.execute("SELECT DISTINCT symbol FROM files WHERE interval = ? ORDER BY symbol",
+                                     (interval,))
+        else:
+            rows = self.conn.execute(
+                "SELECT DISTINCT symbol FROM files WHERE interval = ? AND date = ? ORDER BY symbol",
+                (interval, pd.Timestamp(date).strftime('%Y-%m-%d')))
+        return [row[0] for row in rows]
+
+    def availability(self, interval='1m'):
+        """
+        数据可用性矩阵: 行为交易对、列为日期，有数据为 1、无数据为 0
+        """
+        df = pd.read_sql_query("SELECT symbol, date FROM files WHERE interval = ?", self.conn, params=(interval,))
+        if df.empty:
+            return pd.DataFrame()
+        df['value'] = 1
+        return df.pivot(index='symbol', columns='date', values='value').fillna(0).astype(int)
+
+
+def list_symbols(data_path, date_str, interval='1m'):
+    """
+    获取指定日期有数据的所有交易对
+
+    数据目录下有清单时直接查询索引，否则回退到扫描当天的目录
+    """
+    manifest = DataManifest.for_data_path(data_path)
+    if manifest is not None:
+        with manifest:
+            return manifest.symbols(interval, date_str)
+
+    daily_path = os.path.join(data_path, date_str)
+    if not os.path.exists(daily_path):
+        return []
+    symbols = set()  # 使用 set 进行去重
+    for entry in os.scandir(daily_path):
+        match = _CSV_NAME_RE.match(entry.name)
+        if match and match.group(1) == date_str and match.group(3) == interval:
+            symbols.add(match.group(2))
+    return sorted(symbols)
+
+
+def find_missing_days(symbol, start_date, end_date, data_path, interval='1m', stop_at_first=False):
+    """
+    返回 [start_date, end_date] 内缺失按日CSV的日期列表
+
+    数据目录下有清单时直接查询索引，否则回退到逐日检查文件是否存在（stop_at_first 时发现第一个缺失即返回）
+    """
+    manifest = DataManifest.for_data_path(data_path)
+    if manifest is not None:
+        with manifest:
+            return manifest.missing_dates(symbol, start_date, end_date, interval)
+
+    missing = []
+    for date_str in pd.date_range(start=start_date, end=end_date, freq='D').strftime('%Y-%m-%d'):
+        if not os.path.exists(csv_day_path(data_path, date_str, symbol, interval)):
+            missing.append(date_str)
+            if stop_at_first:
+                break
+    return missing
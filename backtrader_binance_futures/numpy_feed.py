@@ -0,0 +1,134 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from backtrader.feed import DataBase
+from backtrader.linebuffer import LineBuffer
+from backtrader.utils import date2num
+
+# 配置日志
+logger = logging.getLogger('NumpyData')
+
+# bars_to_arrays 默认的 DataFrame 列名映射（与 resample_bars 输出一致）
+DEFAULT_COLUMNS = {
+    'open': 'Open',
+    'high': 'High',
+    'low': 'Low',
+    'close': 'Close',
+    'volume': 'Volume',
+    'openinterest': None,
+}
+
+
+def bars_to_arrays(df, columns=None):
+    """
+    把以 datetime 为索引的 OHLCV DataFrame 转换为只读 NumPy 数组字典
+
+    datetime 使用 backtrader 的 date2num 逐个转换为浮点天数，保证与 PandasData 完全一致；
+    转换只在缓存数据时做一次，之后所有试验共享这些数组。
+
+    Args:
+        columns: {line名: DataFrame列名}，列名为 None 表示该 line 不存在（填充 NaN）
+
+    Returns:
+        dict: {'datetime': ndarray, 'open': ndarray, ...}，均为 float64、C 连续、只读
+    """
+    mapping = dict(DEFAULT_COLUMNS)
+    mapping.update(columns or {})
+
+    index = pd.DatetimeIndex(df.index)
+    if not index.is_monotonic_increasing:
+        raise ValueError("数据必须按时间升序排列")
+
+    arrays = {'datetime': np.fromiter((date2num(dt) for dt in index.to_pydatetime()),
+                                      dtype=np.float64, count=len(index))}
+    for line, column in mapping.items():
+        if column is None:
+            continue
+        arrays[line] = np.ascontiguousarray(df[column].to_numpy(dtype=np.float64))
+
+    for values in arrays.values():
+        values.flags.writeable = False
+    return arrays
+
+
+class NumpyData(DataBase):
+    """
+    基于 NumPy 数组的数据馈送
+
+    dataname 为 bars_to_arrays 返回的数组字典。多个实例可以共享同一份只读数组，
+    不再像 PandasData 那样每个试验拷贝一次 DataFrame 并逐行预加载：
+    preload 时按 fromdate/todate 二分定位区间，然后把每条 line 的缓冲区整块填充。
+
+    配置了过滤器、输入时区或 exactbars 内存节省模式时，回退到 backtrader 的逐行加载。
+    """
+
+    def start(self):
+        super(NumpyData, self).start()
+        self._arrays = self._get_arrays()
+        self._pos = -1
+        self._shared_views = {}
+
+    def _get_arrays(self):
+        """返回 bars_to_arrays 格式的数组字典，子类可覆盖以从其他数据源加载"""
+        return self.p.dataname
+
+    def _can_bulk_load(self):
+        if self._filters or self._ffilters or self._tzinput is not None or len(self):
+            return False
+        return all(line.mode == LineBuffer.UnBounded and not line.bindings for line in self.lines)
+
+    def preload(self):
+        if not self._can_bulk_load():
+            logger.debug("不满足整块填充条件，回退到逐行预加载")
+            super(NumpyData, self).preload()
+            return
+
+        dt = self._arrays['datetime']
+        # 与 load() 相同的语义：丢弃 fromdate 之前的K线，遇到第一根晚于 todate 的K线停止
+        lo = int(np.searchsorted(dt, self.fromdate, side='left'))
+        hi = max(lo, int(np.searchsorted(dt, self.todate, side='right')))
+        size = hi - lo
+
+        # 各条 line 对应的共享数组切片（只读视图），供 feed_values 返回
+        self._shared_views = {}
+        for i, name in enumerate(self.getlinealiases()):
+            line = self.lines[i]
+            values = self._arrays.get(name)
+            if values is None:
+                line.array.frombytes(np.full(size, np.nan).data.cast('B'))
+            else:
+                view = values[lo:hi]
+                line.array.frombytes(view.data.cast('B'))
+                self._shared_views[name] = view
+            line.lencount = size
+            line.idx = size - 1
+
+        self._pos = hi - 1
+        self._last()
+        self.home()
+
+    def _load(self):
+        self._pos += 1
+        if self._pos >= len(self._arrays['datetime']):
+            return False
+
+        for i, name in enumerate(self.getlinealiases()):
+            values = self._arrays.get(name)
+            self.lines[i][0] = np.nan if values is None else values[self._pos]
+        return True
+
+
+def feed_values(data, name):
+    """
+    数据馈送某条 line 已加载的全部值，NumPy 数组，不复制
+
+    NumpyData 整块预加载时返回共享数组的只读切片: 同一份数据上的各个试验得到同一块内存，
+    indicator_cache 的指纹记忆可以跨试验命中；其他情况返回 line 缓冲区本身的视图（每次预加载都是新的缓冲区）。
+    """
+    line = getattr(data.lines, name)
+    view = getattr(data, '_shared_views', {}).get(name)
+    if view is not None and len(view) == len(line.array):
+        return view
+    return np.frombuffer(line.array, dtype=np.float64)
@@ -0,0 +1,132 @@
+import logging
+import math
+import os
+import time
+from multiprocessing import get_context
+
+import optuna
+
+from .shared_data import SharedDataPlane, attach_feed, detach_all
+
+# 配置日志
+logger = logging.getLogger('ProcessOptimizer')
+
+
+def make_storage(storage):
+    """
+    创建多进程共享的 Optuna 存储
+
+    - 含 '://' 的字符串按数据库 URL 处理（如 sqlite:///optuna.db）
+    - 其余按本地日志文件路径处理，使用 JournalStorage（文件锁，多进程同时读写安全）
+    """
+    if '://' in storage:
+        return optuna.storages.RDBStorage(storage)
+    try:
+        from optuna.storages.journal import JournalFileBackend
+    except ImportError:  # optuna < 4.0
+        from optuna.storages import JournalFileStorage as JournalFileBackend
+    return optuna.storages.JournalStorage(JournalFileBackend(storage))
+
+
+def _feed_kwargs(data):
+    """NumpyData 除 dataname 外的参数（timeframe/compression/fromdate/todate 等），用于在工作进程中重建馈送"""
+    return {name: value for name, value in data.p._getkwargs().items() if name != 'dataname'}
+
+
+def _claim(counter, n_trials):
+    """领取一个试验名额，名额用完返回 False"""
+    with counter.get_lock():
+        if counter.value >= n_trials:
+            return False
+        counter.value += 1
+        return True
+
+
+def _worker(study_name, storage, objective, handle, feed_kwargs, sampler, pruner, n_trials, counter, deadline):
+    """
+    工作进程: 挂载共享内存中的K线，从存储中加载研究，循环 ask -> objective -> tell
+
+    每个进程各自持有数据馈送和策略类（随 objective 所在模块导入），互不共享解释器，不受 GIL 限制
+    """
+    if sampler is not None:
+        sampler.reseed_rng()  # 各进程的采样器从同一份 pickle 恢复，需要不同的随机状态
+    # 剪枝器不保存在存储中，每个进程加载研究时都要传入
+    study = optuna.load_study(study_name=study_name, storage=make_storage(storage), sampler=sampler, pruner=pruner)
+
+    def make_feed():
+        return attach_feed(handle, **feed_kwargs)
+
+    data = make_feed()
+    data.clone = make_feed
+
+    try:
+        while (deadline is None or time.time() < deadline) and _claim(counter, n_trials):
+            trial = study.ask()
+            try:
+                value = objective(trial, data)
+            except optuna.TrialPruned:
+                study.tell(trial, state=optuna.trial.TrialState.PRUNED)
+            except Exception as e:
+                logger.error(f"试验 {trial.number} 失败: {e}")
+                study.tell(trial, state=optuna.trial.TrialState.FAIL)
+            else:
+                if value is None or (isinstance(value, float) and math.isnan(value)):
+                    study.tell(trial, state=optuna.trial.TrialState.FAIL)
+                else:
+                    study.tell(trial, value)
+    finally:
+        del data
+        detach_all()
+
+
+def optimize_in_processes(study_name, objective, data, storage, n_trials, n_jobs=None, timeout=None,
+                          direction='maximize', sampler=None, pruner=None):
+    """
+    用多个进程并行优化，代替 study.optimize(n_jobs=...) 的线程并行
+
+    Optuna 的 n_jobs 使用线程，backtrader 的纯 Python 事件循环被 GIL 串行化；这里每个工作进程
+    各自挂载同一份共享内存K线（SharedDataPlane，零拷贝），通过 storage 中的研究按 ask/tell 领取试验。
+
+    Args:
+        study_name: 研究名，存储中已有同名研究时继续追加试验
+        objective: objective(trial, data) -> float，必须是可 pickle 的模块级函数（工作进程以 spawn 方式启动）；
+            data 为 NumpyData，带有 clone() 方法
+        data: 主进程中的 NumpyData（例如 load_and_resample_data 的返回值）
+        storage: 本地日志文件路径（JournalStorage）或数据库 URL，见 make_storage
+        n_trials: 所有进程合计的试验数
+        n_jobs: 工作进程数，默认 CPU 核数
+        timeout: 秒，超过后不再开始新的试验
+        sampler: 采样器（每个进程重新设置随机种子），默认使用 Optuna 默认采样器
+        pruner: 剪枝器（见 pruning.make_pruner），objective 中抛出 optuna.TrialPruned 的试验记为 PRUNED
+
+    Returns:
+        optuna.Study: 从存储加载的研究，包含所有进程的试验
+    """
+    n_jobs = n_jobs if n_jobs and n_jobs > 0 else os.cpu_count()
+    n_jobs = max(1, min(n_jobs, n_trials))
+    optuna.create_study(study_name=study_name, storage=make_storage(storage), direction=direction,
+                        load_if_exists=True)
+
+    context = get_context('spawn')
+    counter = context.Value('i', 0)
+    deadline = time.time() + timeout if timeout else None
+
+    with SharedDataPlane(prefix='opt') as plane:
+        handle = plane.publish(study_name, data.p.dataname)
+        args = (study_name, storage, objective, handle, _feed_kwargs(data), sampler, pruner, n_trials,
+                counter, deadline)
+        workers = [context.Process(target=_worker, args=args, daemon=True) for _ in range(n_jobs)]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+
+    failed = [worker.exitcode for worker in workers if worker.exitcode]
+    if failed:
+        logger.warning(f"{len(failed)} 个工作进程异常退出: {failed}")
+    return optuna.load_study(study_name=study_name, storage=make_storage(storage))
@@ -0,0 +1,149 @@
+import logging
+import math
+from collections import namedtuple
+
+import backtrader as bt
+import optuna
+
+# 配置日志
+logger = logging.getLogger('Pruning')
+
+# 检查点上的阶段统计: step 为检查点序号（1 起），fraction 为已回测K线占比，
+# total_return 为对数收益（与 Returns 分析器的 rtot 相同），max_drawdown 为最大回撤百分比，trades 为已开仓交易数
+PartialStats = namedtuple('PartialStats', 'step fraction total_return max_drawdown trades')
+
+
+def partial_score(stats, min_trades=0):
+    """
+    默认的阶段得分: 与优化目标相同的 rtot * 100 * 交易次数惩罚，最少交易次数按已回测K线占比折算
+
+    与最终得分同一量纲，剪枝器在同一检查点上比较各试验时才有意义
+    """
+    required = min_trades * stats.fraction
+    trade_penalty = 1.0 if required <= 0 or stats.trades >= required else (stats.trades / required) ** 2
+    return stats.total_return * 100 * trade_penalty
+
+
+class PruningAnalyzer(bt.Analyzer):
+    """
+    在均匀分布的K线检查点上把阶段得分报告给 Optuna 试验（trial.report），
+    剪枝器判定应当剪枝时调用 cerebro.runstop() 提前结束回测，并把 pruned 置为 True
+
+    回测结束后由调用方检查 pruned 并抛出 optuna.TrialPruned（见 raise_if_pruned），
+    直接在 next() 中抛出会中断 cerebro 的 stop() 流程。
+
+    Params:
+        trial: optuna.Trial
+        checkpoints: 把回测区间等分为多少段，在前 checkpoints - 1 个分段点上报告（最后一段即最终得分）
+        min_trades: 默认得分函数使用的最少交易次数
+        score: score(PartialStats) -> float，为 None 时使用 partial_score
+    """
+    params = (
+        ('trial', None),
+        ('checkpoints', 10),
+        ('min_trades', 0),
+        ('score', None),
+    )
+
+    def start(self):
+        self.pruned = False
+        self.history = []
+        self._value_start = self._peak = self.strategy.broker.getvalue()
+        self._max_drawdown = 0.0
+        self._trades = 0
+
+        # 预加载后 buflen 即全部K线数；非预加载模式下只能按已有的K线划分
+        total = self.data.buflen()
+        self._total = total
+        self._marks = sorted({total * k // self.p.checkpoints for k in range(1, self.p.checkpoints)} - {0})
+        self._next_mark = 0
+
+    def notify_trade(self, trade):
+        if trade.justopened:
+            self._trades += 1
+
+    def next(self):
+        value = self.strategy.broker.getvalue()
+        if value > self._peak:
+            self._peak = value
+        elif self._peak > 0:
+            self._max_drawdown = max(self._max_drawdown, 100.0 * (self._peak - value) / self._peak)
+
+        if self.p.trial is None or self._next_mark >= len(self._marks):
+            return
+        bar = len(self.data)
+        if bar < self._marks[self._next_mark]:
+            return
+        # 策略最小周期之前的检查点没有 next 调用，在第一个到达的K线上补报最后一个
+        while self._next_mark < len(self._marks) and self._marks[self._next_mark] <= bar:
+            self._next_mark += 1
+        self._report(self._next_mark, bar, value)
+
+    def _report(self, step, bar, value):
+        total_return = math.log(value / self._value_start) if value > 0 and self._value_start > 0 else -math.inf
+        stats = PartialStats(step, bar / self._total, total_return, self._max_drawdown, self._trades)
+        score = self.p.score(stats) if self.p.score is not None else partial_score(stats, self.p.min_trades)
+        self.history.append((stats, score))
+
+        self.p.trial.report(score, step)
+        if self.p.trial.should_prune():
+            logger.debug(f"试验 {self.p.trial.number} 在检查点 {step}（第 {bar} 根K线）剪枝，阶段得分 {score:.4f}")
+            self.pruned = True
+            self.strategy.env.runstop()
+
+    def get_analysis(self):
+        return {'pruned': self.pruned, 'history': self.history}
+
+
+def make_pruner(settings):
+    """
+    由 CONFIG['optimization_settings']['pruner'] 创建剪枝器，settings 为空时返回 None（Optuna 默认的中位数剪枝器
+    不会被触发，因为没有 PruningAnalyzer 报告阶段得分）
+
+    settings 示例:
+        {'type': 'median', 'n_startup_trials': 5, 'n_warmup_steps': 2, 'checkpoints': 10}
+        {'type': 'percentile', 'percentile': 25.0, 'n_startup_trials': 5, 'n_warmup_steps': 2}
+        {'type': 'halving', 'min_resource': 1, 'reduction_factor': 3}
+        {'type': 'hyperband', 'reduction_factor': 3}
+    """
+    if not settings or settings.get('type', 'none') == 'none':
+        return None
+    kind = settings['type']
+    if kind == 'median':
+        return optuna.pruners.MedianPruner(
+            n_startup_trials=settings.get('n_startup_trials', 5),
+            n_warmup_steps=settings.get('n_warmup_steps', 0),
+        )
+    if kind == 'percentile':
+        return optuna.pruners.PercentilePruner(
+            settings.get('percentile', 25.0),
+            n_startup_trials=settings.get('n_startup_trials', 5),
+            n_warmup_steps=settings.get('n_warmup_steps', 0),
+        )
+    if kind == 'halving':
+        return optuna.pruners.SuccessiveHalvingPruner(
+            min_resource=settings.get('min_resource', 1),
+            reduction_factor=settings.get('reduction_factor', 3),
+        )
+    if kind == 'hyperband':
+        return optuna.pruners.HyperbandPruner(
+            min_resource=1,
+            max_resource=settings.get('checkpoints', 10) - 1,
+            reduction_factor=settings.get('reduction_factor', 3),
+        )
+    raise ValueError(f"未知的剪枝器类型: {kind}")
+
+
+def add_pruning(cerebro, trial, settings, min_trades=0, score=None):
+    """按 pruner 设置给 cerebro 添加 PruningAnalyzer（_name='pruning'），settings 为空时不添加"""
+    if not settings or settings.get('type', 'none') == 'none':
+        return
+    cerebro.addanalyzer(PruningAnalyzer, _name='pruning', trial=trial,
+                        checkpoints=settings.get('checkpoints', 10), min_trades=min_trades, score=score)
+
+
+def raise_if_pruned(strat):
+    """回测结束后调用: 试验在检查点上被剪枝时抛出 optuna.TrialPruned"""
+    analyzer = getattr(strat.analyzers, 'pruning', None)
+    if analyzer is not None and analyzer.pruned:
+        raise optuna.TrialPruned(f"在检查点 {len(analyzer.history)} 剪枝")
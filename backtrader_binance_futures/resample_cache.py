@@ -0,0 +1,124 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+
+import pandas as pd
+
+# 配置日志
+logger = logging.getLogger('ResampleCache')
+
+# 重采样逻辑或文件格式变化时递增，使旧缓存自动失效
+CACHE_VERSION = 1
+
+
+def fingerprint_files(paths):
+    """
+    根据源文件的路径、大小和修改时间计算内容指纹
+
+    不存在的文件也参与计算，这样补齐缺失数据后指纹会变化
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        try:
+            st = os.stat(path)
+            digest.update(f"{path}|{st.st_size}|{st.st_mtime_ns}\n".encode('utf-8'))
+        except FileNotFoundError:
+            digest.update(f"{path}|missing\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ResampleCache(object):
+    """
+    重采样结果的磁盘缓存，跨进程、跨会话共享
+
+    - 键由 (交易对, 日期范围, 源/目标周期, 源数据指纹, K线对齐方式) 计算，源分区变化后自动失效
+    - 先写临时文件再 os.replace 原子替换，并发读者只会看到完整的文件
+    - 总大小超过 max_bytes 时按最近使用时间（文件 mtime）淘汰
+    """
+
+    def __init__(self, root, max_bytes=5 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def make_key(self, symbol, start_date, end_date, source_timeframe, target_timeframe, fingerprint, origin=None):
+        raw = f"{CACHE_VERSION}|{symbol}|{start_date}|{end_date}|{source_timeframe}|{target_timeframe}|{fingerprint}"
+        if origin:
+            # 非默认的K线边界对齐方式
+            raw += f"|{origin}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, f"{key}.parquet")
+
+    def get(self, key):
+        """命中返回 DataFrame，未命中返回 None"""
+        path = self.path(key)
+        try:
+            df = pd.read_parquet(path)
+        except (FileNotFoundError, PermissionError):
+            return None
+        except Exception as e:
+            logger.warning(f"读取缓存文件出错 {path}: {str(e)}")
+            return None
+        # 更新 mtime 记录最近使用时间，用于 LRU 淘汰
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return df
+
+    def put(self, key, df):
+        """原子写入缓存，然后按字节预算淘汰最久未使用的文件"""
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"写入缓存文件出错 {path}: {str(e)}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def evict(self, stale_tmp_seconds=3600):
+        """淘汰最久未使用的缓存文件直到总大小不超过 max_bytes，并清理残留的临时文件"""
+        entries = []
+        total = 0
+        now = time.time()
+        for entry in os.scandir(self.root):
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith('.tmp'):
+                # 崩溃残留的临时文件
+                if now - st.st_mtime > stale_tmp_seconds:
+                    self._remove(entry.path)
+                continue
+            if entry.name.endswith('.parquet'):
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                total -= size
+                logger.info(f"淘汰缓存文件: {os.path.basename(path)}")
+
+    @staticmethod
+    def _remove(path):
+        # 其他进程可能已删除，或在 Windows 上文件正被读取
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
@@ -0,0 +1,147 @@
+import os
+import atexit
+import hashlib
+import logging
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .numpy_feed import NumpyData, bars_to_arrays
+
+# 配置日志
+logger = logging.getLogger('SharedData')
+
+# 发布到共享内存的K线描述，可直接 pickle 传给工作进程
+# key: 注册名（如 (symbol, timeframe)），shm_name: 共享内存块名，length: K线根数，fields: 数组顺序
+SharedBarsHandle = namedtuple('SharedBarsHandle', ['key', 'shm_name', 'length', 'fields'])
+
+# 工作进程中已挂载的共享内存块 {shm_name: (SharedMemory, arrays)}
+_attached = {}
+
+
+def _open_shared_memory(name):
+    """挂载已有的共享内存块；Python 3.13+ 关闭 resource_tracker 跟踪，避免工作进程退出时误删"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedDataPlane(object):
+    """
+    基于 multiprocessing.shared_memory 的K线数据平面（由主进程持有）
+
+    publish() 把 bars_to_arrays 格式的数组字典按列连续写入一个共享内存块，返回可 pickle 的
+    SharedBarsHandle；工作进程用 attach_arrays()/attach_feed() 按名字挂载，直接在共享缓冲区上
+    构造只读 NumPy 视图，不再为每个 交易对/周期 pickle 一份 DataFrame。
+
+    批次结束时调用 close()（或使用 with 语句）释放并删除所有共享内存块；
+    进程正常退出时也会通过 atexit 兜底清理。
+    """
+
+    def __init__(self, prefix='bbf'):
+        # 共享内存名在 POSIX 上有长度限制，并需要在同一台机器上唯一
+        self.prefix = f"{prefix}_{os.getpid()}"
+        self._blocks = {}  # {key: (SharedMemory, SharedBarsHandle)}
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, key):
+        return key in self._blocks
+
+    def _shm_name(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:12]
+        return f"{self.prefix}_{digest}"
+
+    def publish(self, key, arrays):
+        """
+        发布数组字典，同一个 key 重复发布时替换旧数据
+
+        Args:
+            key: 注册名，须可 repr 且可 pickle，如 (symbol, timeframe)
+            arrays: bars_to_arrays 返回的 {line名: float64 数组}，长度一致
+
+        Returns:
+            SharedBarsHandle
+        """
+        if key in self._blocks:
+            self.release(key)
+
+        fields = tuple(arrays)
+        length = len(arrays['datetime'])
+        shm = shared_memory.SharedMemory(name=self._shm_name(key), create=True,
+                                         size=max(1, len(fields) * length * 8))
+        table = np.ndarray((len(fields), length), dtype=np.float64, buffer=shm.buf)
+        for i, field in enumerate(fields):
+            table[i] = arrays[field]
+        del table  # 不保留对共享缓冲区的引用，否则 close() 时无法释放
+
+        handle = SharedBarsHandle(key, shm.name, length, fields)
+        self._blocks[key] = (shm, handle)
+        logger.debug(f"已发布 {key}: {length} 根K线 -> {shm.name}")
+        return handle
+
+    def publish_df(self, key, df, columns=None):
+        """发布以 datetime 为索引的 OHLCV DataFrame，参见 bars_to_arrays"""
+        return self.publish(key, bars_to_arrays(df, columns))
+
+    def handle(self, key):
+        return self._blocks[key][1]
+
+    def handles(self):
+        """全部已发布数据的 {key: SharedBarsHandle}，用于传给工作进程"""
+        return {key: handle for key, (_, handle) in self._blocks.items()}
+
+    def release(self, key):
+        """释放并删除一个共享内存块"""
+        shm, _ = self._blocks.pop(key)
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """释放并删除所有共享内存块（可重复调用）"""
+        for key in list(self._blocks):
+            self.release(key)
+
+
+def attach_arrays(handle):
+    """
+    在工作进程中按 handle 挂载共享内存，返回只读的 {line名: 数组视图}（零拷贝）
+
+    同一进程内重复挂载同一块时直接复用。
+    """
+    if handle.shm_name in _attached:
+        return _attached[handle.shm_name][1]
+
+    shm = _open_shared_memory(handle.shm_name)
+    table = np.ndarray((len(handle.fields), handle.length), dtype=np.float64, buffer=shm.buf)
+    table.flags.writeable = False
+    arrays = {field: table[i] for i, field in enumerate(handle.fields)}
+    _attached[handle.shm_name] = (shm, arrays)
+    return arrays
+
+
+def attach_feed(handle, **kwargs):
+    """在共享内存上构造 NumpyData 数据馈送，kwargs 传给 NumpyData（timeframe/compression/fromdate/todate 等）"""
+    return NumpyData(dataname=attach_arrays(handle), **kwargs)
+
+
+def detach_all():
+    """工作进程退出前解除所有挂载（不会删除共享内存块，删除由发布方负责）"""
+    for name in list(_attached):
+        shm, arrays = _attached.pop(name)
+        arrays.clear()
+        try:
+            shm.close()
+        except BufferError:
+            # 仍有数据馈送引用该缓冲区，交给进程退出时释放
+            logger.debug(f"共享内存 {name} 仍被引用，跳过关闭")
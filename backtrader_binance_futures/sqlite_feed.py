@@ -0,0 +1,160 @@
+import logging
+import sqlite3
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from .history_store import day_bounds, normalize_symbol, pandas_freq
+from .numpy_feed import NumpyData, bars_to_arrays
+
+# 配置日志
+logger = logging.getLogger('BinanceSQLiteData')
+
+# csv_to_sqlite 生成的 price_data 表中 datetime 为 'YYYY-MM-DD HH:MM:SS' 文本，按字典序即按时间排序
+_TS_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# symbols 表的 id 唯一对应 (symbol, quote_asset, timeframe)，
+# 因此 (symbol_id, datetime) 复合索引即 (交易对, 周期, 时间) 索引
+PRICE_INDEX_NAME = 'idx_price_data_symbol_datetime'
+
+
+def ensure_price_index(conn):
+    """确保 price_data 上存在 (symbol_id, datetime) 复合索引，范围查询依赖它"""
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {PRICE_INDEX_NAME} ON price_data (symbol_id, datetime)")
+    conn.commit()
+
+
+def get_symbol_id(conn, symbol, interval='1m', quote_asset='USDT'):
+    row = conn.execute("SELECT id FROM symbols WHERE symbol = ? AND quote_asset = ? AND timeframe = ?",
+                       (normalize_symbol(symbol), quote_asset, interval)).fetchone()
+    if row is None:
+        raise ValueError(f"数据库中没有 {symbol} {interval} 的数据")
+    return row[0]
+
+
+def query_price_arrays(conn, symbol_id, start, end, chunk_size=50000):
+    """
+    用一次索引范围查询读取 [start, end) 的K线，fetchmany 分批写入预分配的数组
+
+    Returns:
+        tuple: (ts, values) ts 为 int64 纳秒时间戳，values 为 (n, 5) 的 float64 open/high/low/close/volume
+    """
+    args = (symbol_id, start.strftime(_TS_FORMAT), end.strftime(_TS_FORMAT))
+    # 行数只走索引，不读表数据，用来一次性分配数组
+    count = conn.execute("SELECT COUNT(*) FROM price_data WHERE symbol_id = ? AND datetime >= ? AND datetime < ?",
+                         args).fetchone()[0]
+
+    ts_text = np.empty(count, dtype=object)
+    values = np.empty((count, 5), dtype=np.float64)
+    cursor = conn.execute(
+        "SELECT datetime, open, high, low, close, volume FROM price_data "
+        "WHERE symbol_id = ? AND datetime >= ? AND datetime < ? ORDER BY datetime",
+        args
+    )
+    filled = 0
+    while filled < count:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunk = np.array(rows, dtype=object)
+        n = min(len(chunk), count - filled)
+        ts_text[filled:filled + n] = chunk[:n, 0]
+        values[filled:filled + n] = chunk[:n, 1:].astype(np.float64)
+        filled += n
+    cursor.close()
+
+    ts = pd.to_datetime(ts_text[:filled]).values.astype('datetime64[ns]').view(np.int64)
+    values = values[:filled]
+
+    # 同一文件重复导入会产生重复行，保留最后一条；含 NULL 的行直接丢弃
+    keep = np.r_[ts[1:] != ts[:-1], True] & ~np.isnan(values).any(axis=1)
+    return ts[keep], values[keep]
+
+
+def resample_arrays(ts, values, timeframe):
+    """
+    用 NumPy 把有序K线数组重采样到固定长度的目标周期（边界按 UTC 纪元对齐，与币安一致）
+
+    Returns:
+        tuple: (ts, values)，格式同输入
+    """
+    step = to_offset(pandas_freq(timeframe)).nanos
+    if len(ts) == 0:
+        return ts, values
+
+    buckets = ts // step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+
+    resampled = np.empty((len(starts), 5), dtype=np.float64)
+    resampled[:, 0] = values[starts, 0]
+    resampled[:, 1] = np.maximum.reduceat(values[:, 1], starts)
+    resampled[:, 2] = np.minimum.reduceat(values[:, 2], starts)
+    resampled[:, 3] = values[ends, 3]
+    resampled[:, 4] = np.add.reduceat(values[:, 4], starts)
+    return buckets[starts] * step, resampled
+
+
+def read_sqlite_bars(db_path, symbol, start_date, end_date, interval='1m', quote_asset='USDT', chunk_size=50000):
+    """
+    从 csv_to_sqlite 生成的数据库读取 [start_date, end_date] 的源周期K线数组（日期按整日包含）
+
+    Returns:
+        tuple: (ts, values)，参见 query_price_arrays
+    """
+    start, end = day_bounds(start_date, end_date)
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_price_index(conn)
+        symbol_id = get_symbol_id(conn, symbol, interval, quote_asset)
+        return query_price_arrays(conn, symbol_id, start, end, chunk_size)
+    finally:
+        conn.close()
+
+
+def load_sqlite_bars(db_path, symbol, start_date, end_date, interval='1m', target_timeframe=None,
+                     quote_asset='USDT', chunk_size=50000):
+    """
+    从 SQLite 历史库读取 [start_date, end_date] 的K线（日期按整日包含），可选用 NumPy 重采样
+
+    Returns:
+        DataFrame: 以 datetime 为索引、列为 Open/High/Low/Close/Volume，格式与 resample_bars 一致
+    """
+    ts, values = read_sqlite_bars(db_path, symbol, start_date, end_date, interval, quote_asset, chunk_size)
+    if len(ts) == 0:
+        raise ValueError(f"未找到 {symbol} 在指定日期范围内的数据")
+    if target_timeframe and target_timeframe != interval:
+        ts, values = resample_arrays(ts, values, target_timeframe)
+
+    return pd.DataFrame(values, columns=['Open', 'High', 'Low', 'Close', 'Volume'],
+                        index=pd.DatetimeIndex(ts.view('datetime64[ns]'), name='datetime'))
+
+
+class BinanceSQLiteData(NumpyData):
+    """
+    从 SQLite 历史库读取K线的数据馈送，适用于回测和实盘启动前的指标预热
+
+    dataname 为交易对（如 'BTCUSDT' 或 'BTC/USDT:USDT'），必须指定 fromdate/todate，
+    数据库只读取这两个日期覆盖的整日范围，再由 backtrader 按 fromdate/todate 过滤。
+    """
+    params = (
+        ('db_path', 'binance_futures_data.db'),
+        ('interval', '1m'),             # 库中的源周期
+        ('target_timeframe', None),     # 重采样目标周期，如 '15min'；为 None 时直接使用源周期
+        ('quote_asset', 'USDT'),
+        ('chunk_size', 50000),
+    )
+
+    def _get_arrays(self):
+        # 优化时同一个数据馈送会被多次 start，只查询一次数据库
+        if getattr(self, '_sqlite_arrays', None) is None:
+            symbol = self.p.dataname
+            if self.p.fromdate is None or self.p.todate is None:
+                raise ValueError("BinanceSQLiteData 需要指定 fromdate 和 todate")
+            df = load_sqlite_bars(self.p.db_path, symbol, self.p.fromdate, self.p.todate,
+                                  interval=self.p.interval, target_timeframe=self.p.target_timeframe,
+                                  quote_asset=self.p.quote_asset, chunk_size=self.p.chunk_size)
+            logger.info(f"从 {self.p.db_path} 读取 {symbol}: {len(df)} 根K线")
+            self._sqlite_arrays = bars_to_arrays(df)
+        return self._sqlite_arrays
@@ -0,0 +1,282 @@
+import os
+import re
+import queue
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from .history_store import OHLCV_COLUMNS
+from .sqlite_feed import PRICE_INDEX_NAME
+
+# 配置日志
+logger = logging.getLogger('SQLiteImport')
+
+# 与 csv_to_sqlite 中 extract_file_info 相同的文件名规则: {date}_{symbol}_{quote}_{timeframe}.csv
+_FILE_RE = re.compile(r'(\d{4}-\d{2}-\d{2})_(.+)_([A-Z]+)_([a-zA-Z0-9]+)\.csv')
+
+# 导入期间写入端使用的 PRAGMA（只有一个写连接，不需要锁等待和重试）
+WRITER_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -512000,  # 约 500MB
+    'temp_store': 'MEMORY',
+}
+
+_SENTINEL = object()
+
+
+def create_schema(conn):
+    """与 csv_to_sqlite 相同的表结构（已存在时不变）"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS price_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symbol_id INTEGER,
+        datetime TEXT,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        file_path TEXT,
+        FOREIGN KEY (symbol_id) REFERENCES symbols(id)
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS symbols (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symbol TEXT,
+        quote_asset TEXT,
+        timeframe TEXT,
+        UNIQUE(symbol, quote_asset, timeframe)
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS processed_files (
+        file_path TEXT PRIMARY KEY,
+        processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_symbols_symbol ON symbols (symbol)')
+    conn.commit()
+
+
+def has_unique_price_index(conn):
+    """price_data 上是否已有 (symbol_id, datetime) 唯一索引"""
+    for _, name, unique, *_ in conn.execute("PRAGMA index_list(price_data)"):
+        if name == PRICE_INDEX_NAME:
+            return bool(unique)
+    return False
+
+
+def finalize_indexes(conn):
+    """
+    批量导入结束后去重并建立 (symbol_id, datetime) 唯一索引
+
+    重复行（旧版导入或重复导入产生）保留 id 最大的一条
+    """
+    start = time.time()
+    conn.execute('''
+    DELETE FROM price_data WHERE id NOT IN (
+        SELECT MAX(id) FROM price_data GROUP BY symbol_id, datetime
+    )
+    ''')
+    removed = conn.execute("SELECT changes()").fetchone()[0]
+    conn.execute(f"DROP INDEX IF EXISTS {PRICE_INDEX_NAME}")
+    conn.execute(f"CREATE UNIQUE INDEX {PRICE_INDEX_NAME} ON price_data (symbol_id, datetime)")
+    conn.commit()
+    conn.execute("PRAGMA optimize")
+    logger.info(f"已删除 {removed} 条重复记录并建立唯一索引，耗时 {time.time() - start:.1f}秒")
+    return removed
+
+
+def list_csv_files(data_root):
+    """列出 {data_root}/{日期目录}/*.csv 中符合命名规则的文件（按路径排序）"""
+    files = []
+    for day_entry in os.scandir(data_root):
+        if not day_entry.is_dir():
+            continue
+        for file_entry in os.scandir(day_entry.path):
+            if _FILE_RE.match(file_entry.name):
+                files.append(file_entry.path)
+    return sorted(files)
+
+
+def parse_csv_file(file_path):
+    """
+    解析一个按日CSV为待插入的行（在解析线程中执行，不接触数据库）
+
+    Returns:
+        tuple: ((symbol, quote_asset, timeframe), rows)，rows 为 (datetime, open, high, low, close, volume) 元组列表
+    """
+    _, symbol, quote_asset, timeframe = _FILE_RE.match(os.path.basename(file_path)).groups()
+    table = pacsv.read_csv(
+        file_path,
+        convert_options=pacsv.ConvertOptions(
+            include_columns=['datetime', *OHLCV_COLUMNS],
+            column_types={'datetime': pa.string(), **{col: pa.float64() for col in OHLCV_COLUMNS}},
+        ),
+    )
+    columns = [table.column(name).to_pylist() for name in ('datetime', *OHLCV_COLUMNS)]
+    return (symbol, quote_asset, timeframe), list(zip(*columns))
+
+
+class SQLiteImporter(object):
+    """
+    按日CSV -> SQLite 的批量导入流水线：多个解析线程 + 单个写入线程
+
+    - 解析线程只读文件，结果经有界队列交给唯一的写连接，数据库上不存在锁竞争，也不需要重试
+    - 写入端把多个文件的数据合并为一个大事务（executemany + INSERT OR IGNORE）提交
+    - 文件的数据与它在 processed_files 中的记录在同一事务中提交，中断后重新运行会从断点继续
+    - 首次导入（或旧库尚无唯一索引）时先不建 price_data 索引，全部导入后再去重并建立唯一索引；
+      已有唯一索引时为增量导入，INSERT OR IGNORE 直接跳过重复行
+    - price_data.file_path 不再逐行写入（为 NULL），去重改由唯一索引和 processed_files 保证
+    """
+
+    def __init__(self, db_path, workers=8, queue_size=64, batch_rows=500000):
+        self.db_path = db_path
+        self.workers = workers
+        self.queue_size = queue_size
+        self.batch_rows = batch_rows
+        self.stop_event = threading.Event()
+        self._symbol_ids = {}
+
+    def stop(self):
+        """请求停止：解析线程不再领取新文件，写入端提交已收到的数据后退出"""
+        self.stop_event.set()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        for setting, value in WRITER_PRAGMAS.items():
+            conn.execute(f"PRAGMA {setting} = {value}")
+        return conn
+
+    def _symbol_id(self, conn, key):
+        if key not in self._symbol_ids:
+            conn.execute("INSERT OR IGNORE INTO symbols (symbol, quote_asset, timeframe) VALUES (?, ?, ?)", key)
+            self._symbol_ids[key] = conn.execute(
+                "SELECT id FROM symbols WHERE symbol = ? AND quote_asset = ? AND timeframe = ?", key).fetchone()[0]
+        return self._symbol_ids[key]
+
+    def _produce(self, files, out_queue):
+        """解析线程池：按顺序提交文件，解析结果放入有界队列（队列满时阻塞，控制内存占用）"""
+        def parse(file_path):
+            if self.stop_event.is_set():
+                return
+            try:
+                out_queue.put((file_path, parse_csv_file(file_path), None))
+            except Exception as e:
+                out_queue.put((file_path, None, str(e)))
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                # map 会一次性提交全部任务，这里分块提交，避免停止后还有大量排队任务
+                chunk = self.workers * 4
+                for i in range(0, len(files), chunk):
+                    if self.stop_event.is_set():
+                        break
+                    list(executor.map(parse, files[i:i + chunk]))
+        finally:
+            out_queue.put(_SENTINEL)
+
+    def run(self, data_root, files=None, progress=None):
+        """
+        导入数据目录下尚未处理的全部文件
+
+        Args:
+            files: 指定要导入的文件列表，为 None 时扫描 data_root
+            progress: 回调 progress(file_path, status, rows)，每处理完一个文件调用一次
+
+        Returns:
+            dict: {'files': 成功文件数, 'rows': 提交行数（含被忽略的重复行）, 'skipped': 已处理跳过数, 'failed': [(文件, 错误)],
+                   'interrupted': 是否被中断}
+        """
+        conn = self._connect()
+        create_schema(conn)
+        bulk_mode = not has_unique_price_index(conn)
+        if bulk_mode:
+            # 导入期间不维护 price_data 上的索引，结束后统一建立
+            conn.execute(f"DROP INDEX IF EXISTS {PRICE_INDEX_NAME}")
+            conn.execute("DROP INDEX IF EXISTS idx_price_data_file_path")
+            conn.commit()
+
+        processed = {row[0] for row in conn.execute("SELECT file_path FROM processed_files")}
+        all_files = list_csv_files(data_root) if files is None else list(files)
+        todo = [f for f in all_files if f not in processed]
+        summary = {'files': 0, 'rows': 0, 'skipped': len(all_files) - len(todo), 'failed': [],
+                   'interrupted': False}
+        logger.info(f"共 {len(all_files)} 个文件，已处理 {summary['skipped']} 个，待导入 {len(todo)} 个"
+                    f"（{'批量模式' if bulk_mode else '增量模式'}）")
+
+        work_queue = queue.Queue(maxsize=self.queue_size)
+        producer = threading.Thread(target=self._produce, args=(todo, work_queue), daemon=True)
+        producer.start()
+
+        batch_rows = []
+        batch_files = []
+        start = time.time()
+
+        def flush():
+            if not batch_files:
+                return
+            # sqlite3 在第一条写语句处隐式开启事务，整批数据（含新交易对和处理记录）一次提交
+            conn.executemany(
+                "INSERT OR IGNORE INTO price_data (symbol_id, datetime, open, high, low, close, volume) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                batch_rows
+            )
+            conn.executemany("INSERT OR REPLACE INTO processed_files (file_path) VALUES (?)",
+                             [(f,) for f in batch_files])
+            conn.commit()
+            summary['files'] += len(batch_files)
+            summary['rows'] += len(batch_rows)
+            batch_rows.clear()
+            batch_files.clear()
+
+        try:
+            while True:
+                item = work_queue.get()
+                if item is _SENTINEL:
+                    break
+                file_path, parsed, error = item
+                if error is not None:
+                    summary['failed'].append((file_path, error))
+                    if progress:
+                        progress(file_path, f"失败: {error}", 0)
+                    continue
+
+                key, rows = parsed
+                symbol_id = self._symbol_id(conn, key)
+                batch_rows.extend((symbol_id, *row) for row in rows)
+                batch_files.append(file_path)
+                if progress:
+                    progress(file_path, '成功', len(rows))
+                if len(batch_rows) >= self.batch_rows:
+                    flush()
+            flush()
+        except BaseException:
+            # 包括 KeyboardInterrupt：未提交的批次回滚，对应文件下次重新导入
+            self.stop()
+            conn.rollback()
+            summary['interrupted'] = True
+            raise
+        finally:
+            # 出错退出时解析线程可能阻塞在已满的队列上，先排空队列再等待它结束
+            while producer.is_alive():
+                try:
+                    work_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            summary['interrupted'] = summary['interrupted'] or self.stop_event.is_set()
+            if bulk_mode and not summary['interrupted']:
+                finalize_indexes(conn)
+            conn.close()
+
+        elapsed = time.time() - start
+        logger.info(f"导入完成: {summary['files']} 个文件, {summary['rows']} 行, "
+                    f"失败 {len(summary['failed'])} 个, 耗时 {elapsed:.1f}秒")
+        return summary
@@ -0,0 +1,354 @@
+import logging
+import math
+from collections import namedtuple
+
+import backtrader as bt
+import numpy as np
+
+from .numpy_feed import NumpyData
+
+# 配置日志
+logger = logging.getLogger('TargetSimulator')
+
+# 成交记录: 第几根K线成交、带符号数量、成交价、手续费
+Fill = namedtuple('Fill', ['bar', 'size', 'price', 'commission'])
+
+# 交易记录（仓位从 0 到再次归 0 为一笔，反手时拆成两笔）；未平仓时 exit_bar/exit_price 为 None
+SimTrade = namedtuple('SimTrade', ['direction', 'entry_bar', 'exit_bar', 'entry_price', 'exit_price',
+                                   'pnl', 'pnlcomm'])
+
+
+def _split(possize, size):
+    """按 backtrader Position.update 的规则把订单数量拆成 (平仓部分, 开仓部分)，两者与 size 同号"""
+    if not possize or (possize > 0) == (size > 0):
+        return 0, size
+    if abs(size) <= abs(possize):
+        return size, 0
+    return -possize, size + possize
+
+
+def _account_value(cash, size, price, close):
+    """
+    账户价值，与 BackBroker._get_value 的计算顺序相同（多头先扣除再加回浮动盈亏），
+    使结果与 broker.getvalue() 逐位一致；参数可以是标量或 NumPy 数组
+    """
+    value = size * close
+    unrealized = size * (close - price) * 1.0
+    if isinstance(size, np.ndarray):
+        return cash + np.where(size > 0, (value - unrealized) + unrealized, value)
+    return cash + ((value - unrealized) + unrealized if size > 0 else value)
+
+
+class SimulationResult(object):
+    """
+    模拟结果
+
+    - equity: 每根K线收盘时的账户价值（现金 + 持仓数量 × 收盘价）
+    - returns: 每根K线的收益率，第一根相对于初始资金
+    - fills / trades: 成交和交易列表
+    """
+
+    def __init__(self, cash, equity, fills, trades):
+        self.cash = cash
+        self.equity = equity
+        self.fills = fills
+        self.trades = trades
+        self.returns = np.diff(equity, prepend=cash) / np.concatenate([[cash], equity[:-1]])
+
+    @property
+    def final_value(self):
+        return float(self.equity[-1]) if len(self.equity) else self.cash
+
+    @property
+    def rtot(self):
+        """对数总收益，与 bt.analyzers.Returns 的 rtot 一致"""
+        return math.log(self.final_value / self.cash) if self.final_value > 0 else float('-inf')
+
+    @property
+    def total_return(self):
+        """总收益率（百分比）"""
+        return (self.final_value / self.cash - 1) * 100
+
+    @property
+    def num_trades(self):
+        """交易数（含未平仓），与 TradeAnalyzer 的 total.total 一致"""
+        return len(self.trades)
+
+    @property
+    def closed_trades(self):
+        return [t for t in self.trades if t.exit_bar is not None]
+
+    @property
+    def max_drawdown(self):
+        """最大回撤（百分比）"""
+        if not len(self.equity):
+            return 0.0
+        peak = np.maximum.accumulate(np.concatenate([[self.cash], self.equity]))
+        return float(np.max(1 - np.concatenate([[self.cash], self.equity]) / peak) * 100)
+
+
+class TargetSimulator(object):
+    """
+    只按目标仓位比例交易的轻量回测器，用于在完整 cerebro.run() 之前快速筛选大量参数
+
+    复现 backtrader 默认 BackBroker + order_target_percent 的撮合规则：
+    - 第 i 根收盘时按账户价值 × 目标比例计算目标市值，差额除以收盘价向下取整得到下单数量；目标为 0 时全部平仓
+    - 市价单在第 i+1 根开盘价成交，滑点按 set_slippage_perc 的规则（不超出当根最高/最低价）
+    - 提交时按第 i 根收盘价试算，现金不足则整单拒绝；成交时开仓部分现金不足则只成交平仓部分
+    - 百分比手续费，做空资金按 shortcash 计入现金
+
+    策略逻辑可以逐根调用 order_target_percent(i, target)（同一根可以多次调用），
+    也可以直接用 simulate_targets() 回放一整个目标比例数组。
+    """
+
+    def __init__(self, arrays, cash=10000.0, commission=0.0, slippage=0.0):
+        """
+        Args:
+            arrays: 含 open/high/low/close 数组的字典（例如 bars_to_arrays 的返回值）
+            cash: 初始资金
+            commission: 百分比手续费（0.0004 即 0.04%）
+            slippage: 百分比滑点，对应 broker.set_slippage_perc
+        """
+        self.open = np.asarray(arrays['open'], dtype=np.float64).tolist()
+        self.high = np.asarray(arrays['high'], dtype=np.float64).tolist()
+        self.low = np.asarray(arrays['low'], dtype=np.float64).tolist()
+        self.close_prices = np.asarray(arrays['close'], dtype=np.float64)
+        self.close = self.close_prices.tolist()
+        self.start_cash = cash
+        self.commission = commission
+        self.slippage = slippage
+
+        self.cash = cash
+        self.size = 0
+        self.price = 0.0  # 持仓均价
+        self.fills = []
+        self.trades = []
+
+        self._pending = []  # [(下单K线, 数量)]
+        self._changes = []  # [(K线, 成交后现金, 成交后持仓)]
+        self._trade = None  # 当前未平仓交易: [方向, 开仓K线, 开仓均价, 毛盈亏, 手续费]
+
+    def value(self, i):
+        """第 i 根收盘时的账户价值（先撮合之前下的单）"""
+        self._settle(i)
+        return _account_value(self.cash, self.size, self.price, self.close[i])
+
+    def position(self, i):
+        """第 i 根收盘时的 (持仓数量, 持仓均价)"""
+        self._settle(i)
+        return self.size, self.price
+
+    def order_target_percent(self, i, target):
+        """第 i 根收盘时下单，把仓位调整到账户价值的 target 比例，返回下单数量（0 表示没有下单）"""
+        self._settle(i)
+        price = self.close[i]
+        target_value = target * _account_value(self.cash, self.size, self.price, price)
+
+        if not target_value:
+            size = -self.size
+        else:
+            position_value = self.size * price
+            if target_value > position_value:
+                size = int((target_value - position_value) // price)
+            elif target_value < position_value:
+                size = -int((position_value - target_value) // price)
+            else:
+                size = 0
+
+        if size:
+            self._pending.append((i, size))
+        return size
+
+    def _settle(self, i):
+        """撮合第 i 根之前下的订单（在下单后的第一根K线开盘成交）"""
+        if not self._pending or self._pending[0][0] >= i:
+            return
+        bar = self._pending[0][0] + 1
+        orders, self._pending = self._pending, []
+
+        # 提交检查: 以下单时的收盘价按顺序试算（持仓也跟着试算更新），现金为负的订单被拒绝
+        cash, possize = self.cash, self.size
+        accepted = []
+        for created, size in orders:
+            pprice = self.close[created]
+            closed, opened = _split(possize, size)
+            possize += size
+            cash += -closed * pprice
+            cash -= abs(closed) * self.commission * pprice
+            cash -= opened * pprice
+            cash -= abs(opened) * self.commission * pprice
+            if cash >= 0.0:
+                accepted.append(size)
+
+        for size in accepted:
+            self._execute(bar, size)
+        self._changes.append((bar, self.cash, self.size, self.price))
+
+    def _fill_price(self, bar, size):
+        price = self.open[bar]
+        if not self.slippage:
+            return price
+        if size > 0:
+            return min(price * (1 + self.slippage), self.high[bar])
+        return max(price * (1 - self.slippage), self.low[bar])
+
+    def _execute(self, bar, size):
+        price = self._fill_price(bar, size)
+        closed, opened = _split(self.size, size)
+
+        # 现金的计算顺序与 BackBroker._execute 相同，结果逐位一致
+        if closed:
+            comm = abs(closed) * self.commission * price
+            pnl = -closed * (price - self.price) * 1.0
+            self.cash += -closed * self.price + pnl
+            self.cash -= comm
+            self._trade[3] += pnl
+            self._trade[4] += comm
+            self.size += closed
+            if not self.size:
+                self._close_trade(bar, price)
+
+        if opened:
+            comm = abs(opened) * self.commission * price
+            cash = self.cash - opened * price
+            cash -= comm
+            if cash < 0.0:
+                opened = 0  # 开仓部分现金不足，不成交
+            else:
+                self.cash = cash
+                if not self.size:
+                    self._trade = [1 if opened > 0 else -1, bar, price, 0.0, 0.0]
+                    self.price = price
+                else:
+                    self.price = (self.price * self.size + price * opened) / (self.size + opened)
+                    self._trade[2] = self.price
+                self._trade[4] += comm
+                self.size += opened
+
+        if closed or opened:
+            self.fills.append(Fill(bar, closed + opened, price,
+                                   abs(closed) * self.commission * price + abs(opened) * self.commission * price))
+
+    def _close_trade(self, bar, price):
+        direction, entry_bar, entry_price, pnl, comm = self._trade
+        self.trades.append(SimTrade(direction, entry_bar, bar, entry_price, price, pnl, pnl - comm))
+        self._trade = None
+        self.price = 0.0
+
+    def result(self):
+        """撮合到最后一根为止（最后一根下的单不会成交），返回 SimulationResult"""
+        n = len(self.close)
+        if n:
+            self._settle(n - 1)
+
+        # 现金和持仓只在成交的K线变化，按成交K线向后填充
+        changes = np.array([(-1, self.start_cash, 0, 0.0)] + self._changes, dtype=np.float64)
+        index = np.searchsorted(changes[:, 0], np.arange(n), side='right') - 1
+        equity = _account_value(changes[index, 1], changes[index, 2], changes[index, 3], self.close_prices)
+
+        trades = list(self.trades)
+        if self._trade is not None:
+            direction, entry_bar, entry_price, pnl, comm = self._trade
+            trades.append(SimTrade(direction, entry_bar, None, entry_price, None, pnl, pnl - comm))
+        return SimulationResult(self.start_cash, equity, list(self.fills), trades)
+
+
+def simulate_targets(targets, arrays, cash=10000.0, commission=0.0, slippage=0.0):
+    """
+    回放目标比例数组: targets[i] 为第 i 根收盘时调用 order_target_percent 的目标，NaN 表示该根不下单
+
+    只遍历有下单的K线，其余K线的账户价值用数组一次算出
+    """
+    simulator = TargetSimulator(arrays, cash=cash, commission=commission, slippage=slippage)
+    targets = np.asarray(targets, dtype=np.float64)
+    bars = np.flatnonzero(~np.isnan(targets))
+    for i, target in zip(bars.tolist(), targets[bars].tolist()):
+        simulator.order_target_percent(i, target)
+    return simulator.result()
+
+
+def record_targets(strategy_cls):
+    """
+    返回记录 order_target_percent 调用的策略子类: 每次调用追加 (K线序号, 目标比例) 到 self.target_calls
+    """
+    class TargetRecorder(strategy_cls):
+        def __init__(self):
+            self.target_calls = []
+            super(TargetRecorder, self).__init__()
+
+        def order_target_percent(self, data=None, target=0.0, **kwargs):
+            self.target_calls.append((len(self.data) - 1, target))
+            return super(TargetRecorder, self).order_target_percent(data=data, target=target, **kwargs)
+
+    TargetRecorder.__name__ = strategy_cls.__name__
+    return TargetRecorder
+
+
+class _FillRecorder(bt.Analyzer):
+    def start(self):
+        self.fills = []
+
+    def notify_order(self, order):
+        if order.status in (order.Partial, order.Completed):
+            # executed.price 是按成交量重新平均出来的，取最后一次成交记录上的原始价格
+            bit = order.executed.exbits[-1]
+            self.fills.append(Fill(len(order.data) - 1, bit.size, bit.price, bit.closedcomm + bit.openedcomm))
+
+    def get_analysis(self):
+        return self.fills
+
+
+def compare_with_cerebro(strategy_cls, arrays, params=None, cash=10000.0, commission=0.0, slippage=0.0,
+                         rel_tol=0.0):
+    """
+    等价性检查: 用 cerebro.run() 跑一次策略并记录其 order_target_percent 调用，
+    再用 TargetSimulator 回放同样的调用，逐笔比较成交、交易数和最终账户价值
+
+    Args:
+        arrays: bars_to_arrays 格式的数组字典（需要 datetime/open/high/low/close）
+
+    Returns:
+        dict: cerebro 与模拟器各自的 final_value、num_trades，fills_match 以及第一处不一致的成交
+    """
+    cerebro = bt.Cerebro(optdatas=True, optreturn=True, runonce=True, preload=True)
+    cerebro.adddata(NumpyData(dataname=arrays))
+    cerebro.addstrategy(record_targets(strategy_cls), **(params or {}))
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(commission=commission)
+    if slippage:
+        cerebro.broker.set_slippage_perc(perc=slippage)
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trades')
+    cerebro.addanalyzer(_FillRecorder, _name='fills')
+    strat = cerebro.run()[0]
+
+    simulator = TargetSimulator(arrays, cash=cash, commission=commission, slippage=slippage)
+    for i, target in strat.target_calls:
+        simulator.order_target_percent(i, target)
+    result = simulator.result()
+
+    def same(a, b):
+        return a.bar == b.bar and a.size == b.size and math.isclose(a.price, b.price, rel_tol=rel_tol) and \
+            math.isclose(a.commission, b.commission, rel_tol=rel_tol)
+
+    expected = strat.analyzers.fills.get_analysis()
+    mismatch = next(((a, b) for a, b in zip(expected, result.fills) if not same(a, b)), None)
+    if mismatch is None and len(expected) != len(result.fills):
+        n = min(len(expected), len(result.fills))
+        mismatch = (expected[n] if n < len(expected) else None, result.fills[n] if n < len(result.fills) else None)
+
+    trades = strat.analyzers.trades.get_analysis()
+    report = {
+        'cerebro_value': cerebro.broker.getvalue(),
+        'simulated_value': result.final_value,
+        'cerebro_trades': trades.get('total', {}).get('total', 0),
+        'simulated_trades': result.num_trades,
+        'fills': len(expected),
+        'fills_match': mismatch is None,
+        'first_mismatch': mismatch,
+        'result': result,
+    }
+    report['match'] = report['fills_match'] and report['cerebro_trades'] == report['simulated_trades'] and \
+        math.isclose(report['cerebro_value'], report['simulated_value'], rel_tol=rel_tol)
+    if not report['match']:
+        logger.warning(f"{strategy_cls.__name__} 模拟结果与 cerebro 不一致: {mismatch}")
+    return report
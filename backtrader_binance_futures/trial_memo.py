@@ -0,0 +1,244 @@
+import hashlib
+import inspect
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import backtrader as bt
+import numpy as np
+
+from .batch_eval import preload_arrays
+
+# 配置日志
+logger = logging.getLogger('TrialMemo')
+
+# 键的组成或得分的存储格式变化时递增，使旧记录自动失效
+MEMO_VERSION = 2
+
+_fingerprint_lock = threading.Lock()
+_strategy_fingerprints = {}
+_package_fingerprint = None
+
+
+def arrays_fingerprint(arrays, timeframe=None, compression=None):
+    """预加载后的K线数组（preload_arrays 的返回值）加上周期设置的指纹"""
+    digest = hashlib.sha1(f"{timeframe}|{compression}".encode('utf-8'))
+    for name in sorted(arrays):
+        values = np.ascontiguousarray(arrays[name], dtype=np.float64)
+        digest.update(f"|{name}:{len(values)}|".encode('utf-8'))
+        digest.update(memoryview(values).cast('B'))
+    return digest.hexdigest()
+
+
+def data_fingerprint(data):
+    """
+    数据馈送实际送入回测的K线的指纹（按 fromdate/todate 过滤之后），同一个馈送对象只计算一次
+
+    按内容而不是按文件或日期参数计算: 批量优化和 walk-forward 在同一区间上加载的数据指纹相同，
+    数据补齐或重采样方式变化后指纹随之变化。data 需要有 clone()（NumpyData 的 load_and_resample_data 返回值）。
+    """
+    fingerprint = getattr(data, '_memo_fingerprint', None)
+    if fingerprint is None:
+        with _fingerprint_lock:
+            fingerprint = getattr(data, '_memo_fingerprint', None)
+            if fingerprint is None:
+                arrays = preload_arrays(data.clone())
+                fingerprint = arrays_fingerprint(arrays, data.p.timeframe, data.p.compression)
+                data._memo_fingerprint = fingerprint
+    return fingerprint
+
+
+def package_fingerprint():
+    """
+    本包全部模块源码加上 backtrader、NumPy、TA-Lib 版本的指纹
+
+    策略通过本包的指标、缓存、分析器等计算得分，这些代码或依赖版本变化后旧的得分同样失效
+    """
+    global _package_fingerprint
+    if _package_fingerprint is None:
+        try:
+            import talib
+            talib_version = talib.__version__
+        except ImportError:
+            talib_version = None
+        digest = hashlib.sha1(f"{bt.__version__}|{np.__version__}|{talib_version}".encode('utf-8'))
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.py'):
+                digest.update(f"|{name}|".encode('utf-8'))
+                with open(os.path.join(directory, name), 'rb') as f:
+                    digest.update(f.read())
+        _package_fingerprint = digest.hexdigest()
+    return _package_fingerprint
+
+
+def strategy_fingerprint(strategy_cls):
+    """策略类名、所在源文件内容和本包指纹（package_fingerprint）合成的指纹，代码修改后旧的得分自动失效"""
+    fingerprint = _strategy_fingerprints.get(strategy_cls)
+    if fingerprint is None:
+        digest = hashlib.sha1(f"{strategy_cls.__module__}.{strategy_cls.__qualname__}".encode('utf-8'))
+        digest.update(package_fingerprint().encode('utf-8'))
+        try:
+            with open(inspect.getsourcefile(strategy_cls), 'rb') as f:
+                digest.update(f.read())
+        except (TypeError, OSError):
+            logger.warning(f"读取不到 {strategy_cls.__name__} 的源文件，只按类名区分")
+        fingerprint = _strategy_fingerprints[strategy_cls] = digest.hexdigest()
+    return fingerprint
+
+
+def _setting(value):
+    # 整数和浮点数写法不同的同一个值（setcash(10000) 与 setcash(10000.0)）得到相同的键
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def broker_context(broker):
+    """
+    broker 中影响得分的设置: broker 参数（初始资金、滑点、cheat-on-close/open 等）和各品种的手续费设置
+
+    在 setcash / setcommission 等调用之后取值；没有 cerebro 的批量评估可以按同样的设置构造一个 BackBroker
+    """
+    params = {name: _setting(value) for name, value in broker.p._getkwargs().items()
+              if not isinstance(value, bt.CommInfoBase)}
+    comminfo = {str(name): {key: _setting(value) for key, value in info.p._getkwargs().items()}
+                for name, info in broker.comminfo.items()}
+    return {'broker': type(broker).__name__, 'params': params, 'comminfo': comminfo}
+
+
+def _plain(value):
+    # NumPy 标量（如 batch 模式下的参数）转为 Python 内置类型，range/tuple 按列表处理
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (tuple, range)):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    return value
+
+
+def canonical_json(values):
+    """键排序、类型规范化后的 JSON，相同参数的不同写法（顺序、NumPy 整数）得到同一个字符串"""
+    return json.dumps(_plain(dict(values or {})), sort_keys=True, separators=(',', ':'), default=repr)
+
+
+class TrialMemo(object):
+    """
+    优化试验得分的持久化记忆表（SQLite），跨重启、跨进程共享
+
+    - 键为 (策略及本包代码, 数据指纹, 规范化参数, broker 设置, 上下文)；broker 设置包括初始资金、手续费、滑点等，
+      上下文是其他影响得分但不在参数中的设置，例如最少交易次数和评分方式，设置不同的优化不会互相命中
+    - 离散参数空间中 TPE 经常重复提出已经评估过的参数组合，命中时直接返回得分，省去一次回测
+    - 每个线程一个连接，WAL 模式，多个进程可同时读写同一个文件
+    - path 为 None 时不记忆（make_key 返回 None，get 总是未命中，put 不写入）
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            conn = self._connect()
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS trial_scores (
+                key TEXT PRIMARY KEY,
+                strategy TEXT,
+                params TEXT,
+                context TEXT,
+                score REAL,
+                created REAL
+            )
+            ''')
+            conn.commit()
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def make_key(self, strategy_cls, data, params, context=None, broker=None):
+        """
+        记忆表的键
+
+        Args:
+            strategy_cls: 策略类
+            data: 数据馈送（按 data_fingerprint 计算指纹）或已经算好的数据指纹字符串
+            params: 策略参数字典
+            context: 影响得分的其他设置（字典），例如 {'min_trades': 20, 'score': 'rtot_trade_penalty'}
+            broker: 回测使用的 broker（设置好初始资金、手续费之后），按 broker_context 计入键
+        """
+        if not self.enabled:
+            return None
+        fingerprint = data if isinstance(data, str) else data_fingerprint(data)
+        settings = broker_context(broker) if broker is not None else None
+        raw = (f"{MEMO_VERSION}|{strategy_fingerprint(strategy_cls)}|{fingerprint}|"
+               f"{canonical_json(params)}|{canonical_json(settings)}|{canonical_json(context)}")
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """命中返回得分，未命中（或未启用）返回 None"""
+        if key is None:
+            return None
+        try:
+            row = self._connect().execute("SELECT score FROM trial_scores WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"读取试验记忆表出错 {self.path}: {str(e)}")
+            row = None
+        if row is None or row[0] is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, score, strategy_cls=None, params=None, context=None):
+        """
+        写入一次完整回测的得分；NaN 不记录（SQLite 会存为 NULL）
+
+        被剪枝或出错的试验没有完整得分，调用方不应写入
+        """
+        if key is None or score is None or (isinstance(score, float) and math.isnan(score)):
+            return
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO trial_scores (key, strategy, params, context, score, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, getattr(strategy_cls, '__name__', None), canonical_json(params), canonical_json(context),
+                 float(score), time.time()))
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"写入试验记忆表出错 {self.path}: {str(e)}")
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+_memos = {}
+_memos_lock = threading.Lock()
+
+
+def open_memo(path):
+    """本进程中 path 对应的 TrialMemo（同一路径只打开一次），path 为 None 时返回不记忆的实例"""
+    key = os.path.abspath(path) if path else None
+    with _memos_lock:
+        memo = _memos.get(key)
+        if memo is None:
+            memo = _memos[key] = TrialMemo(path)
+        return memo
@@ -23,7 +23,8 @@ setup(name='backtrader_binance_futures',
       long_description_content_type='text/markdown',
       url='https://github.com/alimohyudin/backtrader_binance_futures',
       packages=find_packages(exclude=['docs', 'examples', 'ConfigBinance']),
-      install_requires=['python-binance', 'backtrader', 'pandas', 'matplotlib'],
+      install_requires=['python-binance', 'backtrader', 'pandas', 'matplotlib', 'pyarrow', 'optuna'],
+      extras_require={'talib': ['TA-Lib']},  # strategies in BacktestsOptimization; needs the TA-Lib C library
       classifiers=[
           # How mature is this project? Common values are
           #   3 - Alpha
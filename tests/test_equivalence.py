@@ -0,0 +1,21 @@
+import pytest
+
+from backtrader_binance_futures.benchmark import discover_strategies, synthetic_arrays
+from backtrader_binance_futures.equivalence import check_strategy
+
+ARRAYS = synthetic_arrays(10000, seed=0)
+
+EXPECTED_STRATEGIES = {'BollingerBandRSI', 'Combo_EMA20_ADXR', 'ConnorsReversal', 'MA_DCA', 'MeanReverter',
+                       'PMaxExplorer', 'RSIPAPTP'}
+
+
+def test_discovers_all_strategies():
+    # 下面的参数化用例来自 discover_strategies()，找不到策略时不能变成 0 个用例而"通过"
+    assert {name for name, _ in discover_strategies()} >= EXPECTED_STRATEGIES
+
+
+@pytest.mark.parametrize('name, path', discover_strategies(), ids=lambda value: str(value).rsplit('/', 1)[-1])
+def test_simulator_matches_cerebro(name, path):
+    for row in check_strategy(name, path, ARRAYS):
+        assert row['fills'] > 0, f"{name} 在合成数据上没有成交"
+        assert row['ok'], row
@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+
+from backtrader_binance_futures.history_downloader import DownloadTask, HistoryDownloader
+from backtrader_binance_futures.history_store import csv_day_path
+
+DAY_MS = 86400000
+MINUTE_MS = 60000
+
+
+def _kline(open_ms):
+    # 由开盘时间确定的K线，便于检查写入的数据
+    price = 100.0 + (open_ms // MINUTE_MS) % 50
+    return [open_ms, str(price), str(price + 1), str(price - 1), str(price + 0.5), '10.0',
+            open_ms + MINUTE_MS - 1, '1000.0', 5, '5.0', '500.0', '0']
+
+
+class KlineStub(object):
+    """
+    本地模拟的币安 klines 接口: 按 startTime/endTime/limit 返回 1m K线，记录每次请求，
+    可以让前几次 klines 请求返回指定的错误状态码
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.failures = []  # 依次返回的错误状态码，例如 [500, 429]
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if url.path == '/fapi/v1/exchangeInfo':
+                    return self._json({'symbols': [
+                        {'symbol': 'BTCUSDT', 'contractType': 'PERPETUAL', 'quoteAsset': 'USDT',
+                         'onboardDate': 1569398400000, 'deliveryDate': 4133404800000}]})
+                with stub.lock:
+                    stub.requests.append(query)
+                    status = stub.failures.pop(0) if stub.failures else None
+                if status is not None:
+                    self.send_response(status)
+                    self.send_header('Retry-After', '0')
+                    self.end_headers()
+                    return
+                start, end, limit = int(query['startTime']), int(query['endTime']), int(query['limit'])
+                first = -(-start // MINUTE_MS) * MINUTE_MS
+                rows = [_kline(t) for t in range(first, end + 1, MINUTE_MS)][:limit]
+                self._json(rows)
+
+            def _json(self, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('X-MBX-USED-WEIGHT-1M', '1')
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = KlineStub()
+    yield server
+    server.close()
+
+
+def _downloader(tmp_path, stub):
+    return HistoryDownloader(str(tmp_path / 'futures'), base_url=stub.base_url, workers=2, limit=500)
+
+
+def test_download_paginates_and_retries(tmp_path, stub):
+    # 第一次 klines 请求返回 500，第二次返回 429，之后正常
+    stub.failures = [500, 429]
+    with _downloader(tmp_path, stub) as downloader:
+        summary = downloader.run(['BTC/USDT:USDT'], '2024-01-01', '2024-01-02')
+
+    assert summary['downloaded'] == 2 and not summary['failed']
+    assert summary['rows'] == 2 * 1440
+    # 每天 1440 根，limit=500 分 3 页；加上两次出错后重试的请求
+    assert len(stub.requests) == 2 * 3 + 2
+
+    df = pd.read_csv(csv_day_path(str(tmp_path / 'futures'), '2024-01-02', 'BTCUSDT'))
+    assert len(df) == 1440
+    assert df['datetime'].iloc[0] == '2024-01-02 00:00:00'
+    assert df['datetime'].iloc[-1] == '2024-01-02 23:59:00'
+    assert df['datetime'].is_unique
+
+    # 再次运行: 清单中已完整的日期全部跳过，不再请求K线
+    stub.requests.clear()
+    with _downloader(tmp_path, stub) as downloader:
+        summary = downloader.run(['BTCUSDT'], '2024-01-01', '2024-01-02')
+    assert summary['skipped'] == 2 and summary['downloaded'] == 0
+    assert not stub.requests
+
+
+def test_resume_partial_day(tmp_path, stub):
+    data_path = str(tmp_path / 'futures')
+    day_start = int(pd.Timestamp('2024-01-03').timestamp() * 1000)
+
+    # 当天未结束时写入的部分文件: 只有前 100 根，修改时间在当天之内
+    with _downloader(tmp_path, stub) as downloader:
+        file_path, _ = downloader.download(DownloadTask('BTCUSDT', '1m', '2024-01-03', day_start))
+        partial = pd.read_csv(file_path).iloc[:100]
+        partial.to_csv(file_path, index=False)
+        mtime = (day_start + 101 * MINUTE_MS) / 1000
+        os.utime(file_path, (mtime, mtime))
+        downloader.manifest.record_file(file_path)
+
+        stub.requests.clear()
+        tasks = downloader.plan(['BTCUSDT'], '2024-01-03', '2024-01-03')
+        assert tasks == [DownloadTask('BTCUSDT', '1m', '2024-01-03', day_start + 100 * MINUTE_MS)]
+        summary = downloader.run_tasks(tasks)
+
+    assert summary['downloaded'] == 1
+    # 只请求缺失的部分: 从第 101 根开始，1340 根分 3 页
+    assert int(stub.requests[0]['startTime']) == day_start + 100 * MINUTE_MS
+    assert len(stub.requests) == 3
+
+    df = pd.read_csv(file_path)
+    assert len(df) == 1440 and df['datetime'].is_unique
+    pd.testing.assert_frame_equal(df.iloc[:100], partial)
@@ -0,0 +1,18 @@
+import os
+
+import pytest
+
+from backtrader_binance_futures import manifest
+from backtrader_binance_futures.history_store import HistoryStore, csv_day_path, normalize_symbol
+
+
+@pytest.mark.parametrize('symbol', ['BTC', 'BTCUSDT', 'BTC/USDT:USDT', 'BTC/USDT'])
+def test_symbol_spellings_share_one_name(symbol, tmp_path):
+    assert normalize_symbol(symbol) == 'BTCUSDT'
+    # 文件名、列式存储目录都用同一个写法
+    assert os.path.basename(csv_day_path(str(tmp_path), '2024-01-01', symbol)) == '2024-01-01_BTCUSDT_USDT_1m.csv'
+    assert os.path.basename(HistoryStore(str(tmp_path)).symbol_dir(symbol)) == 'BTCUSDT'
+
+
+def test_manifest_uses_the_same_helper():
+    assert manifest.normalize_symbol is normalize_symbol
@@ -0,0 +1,77 @@
+import gc
+import hashlib
+import types
+import weakref
+
+import backtrader as bt
+import numpy as np
+import pytest
+
+from backtrader_binance_futures import indicator_cache
+from backtrader_binance_futures.benchmark import synthetic_arrays
+from backtrader_binance_futures.indicator_cache import IndicatorCache, cached_call
+from backtrader_binance_futures.numpy_feed import NumpyData, feed_values
+
+ARRAYS = synthetic_arrays(5000, seed=1)
+
+
+def _double(values, factor=2.0):
+    return values * factor
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    cache = IndicatorCache(max_bytes=64 * 1024)
+    monkeypatch.setattr(indicator_cache, '_cache', cache)
+    monkeypatch.setattr(indicator_cache, '_fingerprints', type(indicator_cache._fingerprints)())
+    return cache
+
+
+@pytest.fixture
+def sha1_calls(monkeypatch):
+    calls = []
+
+    def sha1(data):
+        calls.append(1)
+        return hashlib.sha1(data)
+
+    monkeypatch.setattr(indicator_cache, 'hashlib', types.SimpleNamespace(sha1=sha1))
+    return calls
+
+
+def test_fresh_arrays_are_not_retained(fresh_cache):
+    # 每个试验新复制的输入数组: 调用结束后可以被回收，记忆表不增长，缓存不超过字节预算
+    refs = []
+    for factor in range(300):
+        values = np.array(ARRAYS['close'])
+        refs.append(weakref.ref(values))
+        cached_call(_double, values, factor=float(factor))
+        del values
+    gc.collect()
+
+    assert all(ref() is None for ref in refs)
+    assert len(indicator_cache._fingerprints) == 0
+    assert fresh_cache.bytes <= fresh_cache.max_bytes
+
+
+def test_shared_buffer_hits_across_trials(fresh_cache, sha1_calls):
+    class Trial(bt.Strategy):
+        def __init__(self):
+            self.close = feed_values(self.data, 'close')
+            self.result = cached_call(_double, self.close)
+
+    results = []
+    for _ in range(3):
+        cerebro = bt.Cerebro(stdstats=False)
+        cerebro.adddata(NumpyData(dataname=ARRAYS))
+        cerebro.addstrategy(Trial)
+        results.append(cerebro.run()[0])
+
+    # 各试验拿到同一块共享内存的只读视图（不复制），内容与 line 缓冲区相同
+    for strat in results:
+        assert not strat.close.flags.writeable
+        assert np.shares_memory(strat.close, ARRAYS['close'])
+        np.testing.assert_array_equal(strat.close, np.frombuffer(strat.data.close.array))
+    # 只在第一次计算指纹，之后命中记忆表和缓存
+    assert len(sha1_calls) == 1
+    assert fresh_cache.hits == 2
@@ -0,0 +1,108 @@
+import backtrader as bt
+import numpy as np
+import pytest
+
+from backtrader_binance_futures import indicators as btind
+from backtrader_binance_futures.benchmark import synthetic_arrays
+from backtrader_binance_futures.numpy_feed import NumpyData
+
+ARRAYS = synthetic_arrays(3000, seed=7)
+
+# (名称, 本包指标, backtrader 原指标, 参数)
+CASES = [
+    ('sma', btind.SMA, bt.indicators.SMA, dict(period=20)),
+    ('stddev', btind.StandardDeviation, bt.indicators.StandardDeviation, dict(period=20)),
+    ('bbands', btind.BollingerBands, bt.indicators.BollingerBands, dict(period=20, devfactor=2.0)),
+    ('rsi', btind.RSI, bt.indicators.RSI, dict(period=14)),
+    ('atr', btind.ATR, bt.indicators.ATR, dict(period=14)),
+]
+
+
+class _Both(bt.Strategy):
+    def __init__(self):
+        self.pairs = {}
+        for name, fast_cls, stock_cls, kwargs in CASES:
+            data = self.data if name == 'atr' else self.data.close
+            self.pairs[name] = (fast_cls(data, **kwargs), stock_cls(data, **kwargs))
+
+
+def _run(runonce):
+    cerebro = bt.Cerebro(runonce=runonce, preload=True, stdstats=False)
+    cerebro.adddata(NumpyData(dataname=ARRAYS))
+    cerebro.addstrategy(_Both)
+    return cerebro.run()[0]
+
+
+def test_movav_registry_untouched():
+    # 导入本模块不能替换 MovAv 中的均线类，否则各指标默认的 movav 永远判断为“自定义”
+    assert bt.indicators.MovAv.Simple is bt.indicators.sma.MovingAverageSimple
+    assert bt.indicators.StandardDeviation.params.movav is bt.indicators.MovAv.Simple
+
+
+@pytest.mark.parametrize('runonce', [True, False])
+def test_matches_stock_backtrader(runonce, monkeypatch):
+    filled = []
+    fill_lines = btind._fill_lines
+    monkeypatch.setattr(btind, '_fill_lines', lambda ind, *values: (filled.append(type(ind)), fill_lines(ind, *values)))
+
+    strat = _run(runonce)
+
+    for name, (fast, stock) in strat.pairs.items():
+        for fast_line, stock_line in zip(fast.lines, stock.lines):
+            got = np.array(fast_line.array)
+            expected = np.array(stock_line.array)
+            np.testing.assert_array_equal(got, expected, err_msg=name)
+
+    if runonce:
+        # 每个指标都走了 NumPy 快速路径（_fill_lines），没有退回 backtrader 的 _once()
+        assert {fast_cls for _, fast_cls, _, _ in CASES} <= set(filled)
+    else:
+        assert not filled
+
+
+@pytest.mark.parametrize('highest', [False, True])
+def test_monotonic_window_matches_brute_force(highest):
+    rng = np.random.default_rng(3)
+    values = rng.integers(0, 20, 500).astype(float)
+    values[rng.choice(500, 40, replace=False)] = np.nan
+    window = btind.MonotonicWindow(7, highest=highest)
+    reduce = np.fmax if highest else np.fmin
+    for i, value in enumerate(values):
+        window.push(value)
+        recent = values[max(0, i - 6):i + 1]
+        expected = reduce.reduce(recent) if not np.isnan(recent).all() else np.nan
+        np.testing.assert_equal(window.value, expected)
+    assert window.count == len(values)
+
+
+class _Extremes(bt.Strategy):
+    params = (('period', 50), ('partial', False))
+
+    def __init__(self):
+        self.rollmin = btind.RollingMin(self.data.close, period=self.p.period, partial=self.p.partial)
+        self.rollmax = btind.RollingMax(self.data.close, period=self.p.period, partial=self.p.partial)
+
+
+@pytest.mark.parametrize('partial', [False, True])
+def test_rolling_extreme_once_matches_next(partial):
+    # 含 NaN 的收盘价（连续缺失超过一个窗口时结果为 NaN）
+    arrays = dict(ARRAYS)
+    close = np.array(arrays['close'])
+    rng = np.random.default_rng(5)
+    close[rng.choice(len(close), 200, replace=False)] = np.nan
+    close[1000:1080] = np.nan
+    arrays['close'] = close
+
+    results = {}
+    for runonce in (True, False):
+        cerebro = bt.Cerebro(runonce=runonce, preload=True, stdstats=False)
+        cerebro.adddata(NumpyData(dataname=arrays))
+        cerebro.addstrategy(_Extremes, partial=partial)
+        strat = cerebro.run()[0]
+        results[runonce] = [np.array(strat.rollmin.array), np.array(strat.rollmax.array)]
+
+    for got, expected in zip(results[True], results[False]):
+        np.testing.assert_array_equal(got, expected)
+    # 与直接逐窗口归约一致
+    expected = [np.fmin.reduce(close[max(0, i - 49):i + 1]) for i in range(len(close))]
+    np.testing.assert_array_equal(btind.rolling_extreme(close, 50, np.fmin), expected)
@@ -0,0 +1,49 @@
+import os
+import time
+
+import pandas as pd
+
+from backtrader_binance_futures.job_scheduler import DONE, FAILED, PENDING, JobQueue, run_jobs
+
+
+def _square(n, crash_on):
+    # 模块级函数，spawn 启动的工作进程可以导入
+    if n == crash_on:
+        # 模拟工作进程被杀死（例如内存不足），慢一点让其他作业同时在运行
+        time.sleep(0.5)
+        os._exit(1)
+    time.sleep(0.2)
+    return [{'n': n, 'square': n * n}]
+
+
+def test_run_jobs(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'))
+    for n in range(6):
+        assert queue.add(f"n{n}", [n])
+    assert not queue.add('n0', [0])
+
+    results = str(tmp_path / 'results.csv')
+    counts = run_jobs(queue, _square, n_workers=3, extra_args=(None,), results_path=results)
+
+    assert counts == {PENDING: 0, 'running': 0, DONE: 6, FAILED: 0}
+    df = pd.read_csv(results).sort_values('n')
+    assert df['square'].tolist() == [n * n for n in range(6)]
+
+    # 再次运行时已完成的作业不再执行
+    assert run_jobs(queue, _square, n_workers=3, extra_args=(None,), results_path=results)[DONE] == 6
+    assert len(pd.read_csv(results)) == 6
+
+
+def test_crashed_worker_fails_only_its_job(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'))
+    for n in range(6):
+        queue.add(f"n{n}", [n])
+
+    results = str(tmp_path / 'results.csv')
+    counts = run_jobs(queue, _square, n_workers=3, extra_args=(1,), results_path=results)
+
+    # 进程池损坏时同时在运行的其他作业单独重新执行后完成，只有导致崩溃的作业失败
+    assert counts[DONE] == 5
+    assert counts[FAILED] == 1
+    assert [key for key, _ in queue.failures()] == ['n1']
+    assert sorted(pd.read_csv(results)['n']) == [0, 2, 3, 4, 5]
@@ -0,0 +1,38 @@
+import backtrader as bt
+
+from backtrader_binance_futures import trial_memo
+from backtrader_binance_futures.trial_memo import TrialMemo
+
+
+def _broker(cash=10000, commission=0.0004):
+    broker = bt.brokers.BackBroker()
+    broker.setcash(cash)
+    broker.setcommission(commission=commission)
+    return broker
+
+
+def test_key_includes_broker_settings(tmp_path):
+    memo = TrialMemo(str(tmp_path / 'memo.sqlite'))
+    params = {'period': 20}
+
+    def key(broker):
+        return memo.make_key(bt.Strategy, 'data', params, {'min_trades': 10}, broker=broker)
+
+    assert key(_broker()) == key(_broker(cash=10000.0))
+    assert key(_broker()) != key(_broker(cash=20000))
+    assert key(_broker()) != key(_broker(commission=0.0))
+    assert key(_broker()) != key(None)
+
+    memo.put(key(_broker()), 1.5)
+    assert memo.get(key(_broker())) == 1.5
+    assert memo.get(key(_broker(commission=0.0))) is None
+
+
+def test_key_changes_with_package_code(tmp_path, monkeypatch):
+    memo = TrialMemo(str(tmp_path / 'memo.sqlite'))
+    before = memo.make_key(bt.Strategy, 'data', {}, broker=_broker())
+
+    # 本包代码变化（例如指标实现修改）后旧的得分不再命中
+    monkeypatch.setattr(trial_memo, '_package_fingerprint', 'changed')
+    monkeypatch.setattr(trial_memo, '_strategy_fingerprints', {})
+    assert memo.make_key(bt.Strategy, 'data', {}, broker=_broker()) != before